@@ -13,13 +13,21 @@ setuptools.setup(
     long_description_content_type = 'text/markdown',
     url = "https://github.com/limabrena/uavnoma",
     packages = ['uavnoma'],
-    install_requires = ['numpy', 'pandas', 'tabulate', 'matplotlib'],
+    install_requires = ['numpy', 'tabulate', 'matplotlib'],
     python_requires = '>=3.8',
     entry_points = {
         'console_scripts': ['uavnoma=uavnoma.command_line:main'],
     },
     extras_require = {
+        'parquet' : ['pyarrow'],
+        'hdf5' : ['h5py'],
+        'yaml' : ['pyyaml'],
+        'pandas' : ['pandas'],
         'dev' : [
+            'pandas',
+            'pyarrow',
+            'h5py',
+            'pyyaml',
             'pytest',
             'pytest-cov',
             'pytest-console-scripts',
@@ -0,0 +1,125 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+import pytest
+import uavnoma.batch
+from uavnoma.batch import load_scenarios, run_batch, consolidate
+from uavnoma.simulation import SimulationConfig, run_simulation
+
+# Test that the scenarios are read from CSV, JSON and YAML files with the same parameters
+def test_load_scenarios(tmp_path):
+    (tmp_path / 'scenarios.csv').write_text(
+        'scenario,--rician-factor,path_loss,seed,antithetic\n'
+        'los,18,2.0,1,true\n'
+        'nlos,10,3,,\n')
+    rows = [{'scenario': 'los', 'rician_factor': 18, 'path_loss': 2.0, 'seed': 1, 'antithetic': True},
+            {'scenario': 'nlos', 'rician_factor': 10, 'path_loss': 3}]
+    (tmp_path / 'scenarios.json').write_text(json.dumps(rows))
+    (tmp_path / 'mapping.json').write_text(json.dumps({row.pop('scenario'): row for row in rows}))
+    files = ['scenarios.csv', 'scenarios.json', 'mapping.json']
+    try:
+        import yaml
+        (tmp_path / 'scenarios.yaml').write_text(yaml.safe_dump(rows))
+        files.append('scenarios.yaml')
+    except ImportError:
+        pass
+
+    expected = {'los': SimulationConfig(rician_factor=18, path_loss=2.0, seed=1, antithetic=True),
+                'nlos': SimulationConfig(rician_factor=10, path_loss=3)}
+    for filename in files:
+        scenarios = load_scenarios(str(tmp_path / filename))
+        if filename == 'scenarios.yaml':
+            assert list(scenarios) == ['1', '2']
+            scenarios = dict(zip(expected, scenarios.values()))
+        assert scenarios == expected
+
+# Test that all the invalid scenarios are reported before running any
+def test_load_scenarios_invalid(tmp_path):
+    (tmp_path / 'scenarios.csv').write_text(
+        'scenario,rician_factor,path_loss,monte_carlo_samples,unknown\n'
+        'a,25,2.0,,\n'
+        'b,12,x,,\n'
+        'c,12,2.0,100.5,\n'
+        'd,12,2.0,,1\n'
+        'e,12,2.0,,\n'
+        'e,12,2.0,,\n')
+    with pytest.raises(ValueError) as e:
+        load_scenarios(str(tmp_path / 'scenarios.csv'))
+    assert [line.split(':')[0] for line in str(e.value).splitlines()] == \
+        ['scenario a', 'scenario b', 'scenario c', 'scenario d', 'scenario e']
+
+    with pytest.raises(ValueError):
+        load_scenarios(str(tmp_path / 'scenarios.txt'))
+
+# Test that the batch results are those of each scenario run on its own, consolidated in a table
+@pytest.mark.parametrize('workers', [1, 2])
+def test_run_batch(workers):
+    scenarios = {'a': SimulationConfig(seed=1, snr_samples=5, monte_carlo_samples=300),
+                 'b': SimulationConfig(seed=2, snr_samples=3, rician_factor=10),
+                 'c': SimulationConfig(seed=3, snr_samples=4, sampler='sobol', monte_carlo_samples=512)}
+    finished = []
+    results, failures = run_batch(scenarios, workers, callback=lambda *args: finished.append(args[0]))
+    assert failures == {} and list(results) == ['a', 'b', 'c']
+    # The longest scenario is scheduled first
+    assert workers > 1 or finished == ['b', 'a', 'c']
+
+    columns = consolidate(results)
+    assert list(columns['scenario']) == ['a'] * 5 + ['b'] * 3 + ['c'] * 4
+    for scenario, config in scenarios.items():
+        expected = run_simulation(config)
+        for name, values in expected.columns().items():
+            np.testing.assert_array_equal(columns[name][columns['scenario'] == scenario], values)
+
+# Test that scenarios without a seed draw different values in each worker
+def test_run_batch_unseeded():
+    results, _ = run_batch({'a': SimulationConfig(), 'b': SimulationConfig()}, workers=2)
+    assert not np.array_equal(results['a'].avg_arate_usr1, results['b'].avg_arate_usr1)
+
+# Test that failed scenarios are retried, and reported if they keep failing
+def test_run_batch_retries(monkeypatch):
+    attempts = []
+    def flaky_simulation(config):
+        attempts.append(config.seed)
+        if config.seed == 2 or attempts.count(config.seed) == 1:
+            raise MemoryError("out of memory")
+        return run_simulation(config)
+    monkeypatch.setattr(uavnoma.batch, 'run_simulation', flaky_simulation)
+
+    scenarios = {'a': SimulationConfig(seed=1), 'b': SimulationConfig(seed=2)}
+    results, failures = run_batch(scenarios, workers=1, retries=2)
+    assert list(results) == ['a']
+    assert failures == {'b': 'MemoryError: out of memory'}
+    assert attempts.count(1) == 2 and attempts.count(2) == 3
+
+# Simulation whose worker process dies on the first attempt of the scenario with seed 2, or on
+# every attempt if the marker file is None
+crash_marker = None
+
+def crashing_simulation(config):
+    if config.seed == 2 and (crash_marker is None or not os.path.exists(crash_marker)):
+        if crash_marker is not None:
+            open(crash_marker, 'w').close()
+        time.sleep(1)  # The other scenario finishes first
+        os._exit(1)
+    return run_simulation(config)
+
+# Test that the pool is replaced when a worker dies, keeping the finished results and retrying
+# the pending scenarios, and that those which keep killing their workers are reported
+def test_run_batch_broken_pool(monkeypatch, tmp_path):
+    monkeypatch.setattr(uavnoma.batch, 'run_simulation', crashing_simulation)
+    scenarios = {'a': SimulationConfig(seed=1, monte_carlo_samples=100),
+                 'b': SimulationConfig(seed=2)}
+    monkeypatch.setattr(sys.modules[__name__], 'crash_marker', str(tmp_path / 'crashed'))
+    results, failures = run_batch(scenarios, workers=2, retries=1)
+    assert failures == {} and list(results) == ['a', 'b']
+    np.testing.assert_array_equal(results['b'].avg_arate_sys, run_simulation(scenarios['b']).avg_arate_sys)
+
+    monkeypatch.setattr(sys.modules[__name__], 'crash_marker', None)
+    finished = []
+    results, failures = run_batch(scenarios, workers=2, retries=1,
+                                  callback=lambda *args: finished.append(args[0]))
+    assert list(results) == ['a'] and list(failures) == ['b']
+    assert failures['b'].startswith('BrokenProcessPool')
+    assert sorted(finished) == ['a', 'b']
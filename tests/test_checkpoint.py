@@ -0,0 +1,78 @@
+import pytest
+import numpy as np
+from uavnoma.checkpoint import *
+
+# Test that a saved checkpoint is loaded back unchanged
+def test_checkpoint_roundtrip(tmp_path):
+    np.random.seed(123)
+    np.random.normal()  # Leave a cached gaussian in the generator state
+    state = {
+        'params': {'monte_carlo_samples': 1000, 'seed': 123, 'snr_min': 10.0},
+        'samples_done': 400,
+        'snr_dB': np.linspace(10, 60, 26),
+        'sums': {'p_outage_sys': np.arange(26.0), 'avg_arate_usr1': np.ones(26) / 3},
+        'rng_state': np.random.get_state(),
+    }
+    filename = str(tmp_path / 'checkpoint.npz')
+    save_checkpoint(filename, state)
+    loaded = load_checkpoint(filename)
+
+    assert loaded['params'] == state['params']
+    assert loaded['samples_done'] == state['samples_done']
+    np.testing.assert_array_equal(loaded['snr_dB'], state['snr_dB'])
+    assert loaded['sums'].keys() == state['sums'].keys()
+    for name in state['sums']:
+        np.testing.assert_array_equal(loaded['sums'][name], state['sums'][name])
+
+    # The restored generator must continue the same stream
+    expected = np.random.normal(size=5)
+    np.random.set_state(loaded['rng_state'])
+    np.testing.assert_array_equal(np.random.normal(size=5), expected)
+
+# Test that loading a missing checkpoint raises an error
+def test_checkpoint_missing(tmp_path):
+    with pytest.raises(OSError):
+        load_checkpoint(str(tmp_path / 'missing.npz'))
+
+# Test that stored channel gains are saved only for the samples already done
+def test_checkpoint_gains(tmp_path):
+    state = {
+        'params': {},
+        'samples_done': 3,
+        'snr_dB': np.array([10.0]),
+        'sums': {'p_outage_sys': np.zeros(1)},
+        'rng_state': np.random.get_state(),
+        'gains_primary': np.array([1.0, 2.0, 3.0, 0.0]),
+        'gains_secondary': np.array([4.0, 5.0, 6.0, 0.0]),
+    }
+    filename = str(tmp_path / 'checkpoint.npz')
+    save_checkpoint(filename, state)
+    loaded = load_checkpoint(filename)
+    np.testing.assert_array_equal(loaded['gains_primary'], [1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(loaded['gains_secondary'], [4.0, 5.0, 6.0])
+
+    # Without stored gains they are loaded as None
+    del state['gains_primary'], state['gains_secondary']
+    save_checkpoint(filename, state)
+    loaded = load_checkpoint(filename)
+    assert loaded['gains_primary'] is None and loaded['gains_secondary'] is None
+
+# Test that the sums of each block of samples are saved and loaded
+def test_checkpoint_block_sums(tmp_path):
+    state = {
+        'params': {'shard': '1/4'},
+        'samples_done': 250,
+        'snr_dB': np.array([10.0, 20.0]),
+        'sums': {'p_outage_sys': np.zeros(2)},
+        'rng_state': np.random.get_state(),
+        'block_sums': {'p_outage_sys': np.arange(6.0).reshape(3, 2)},
+    }
+    filename = str(tmp_path / 'checkpoint.npz')
+    save_checkpoint(filename, state)
+    loaded = load_checkpoint(filename)
+    np.testing.assert_array_equal(loaded['block_sums']['p_outage_sys'], state['block_sums']['p_outage_sys'])
+
+    # Without blocks they are loaded as None
+    state['block_sums'] = None
+    save_checkpoint(filename, state)
+    assert load_checkpoint(filename)['block_sums'] is None
@@ -5,7 +5,13 @@ import pytest
 import numpy as np
 import tempfile
 import os
+import json
+import subprocess
+import sys
 from unittest.mock import patch
+import uavnoma.command_line
+import uavnoma.simulation
+import uavnoma.output
 
 # Script name
 script_name = 'uavnoma'
@@ -155,13 +161,24 @@ def test_file_creation(script_runner):
         assert len(result.stderr) == 0 # No output in error output stream
 
 # Test successful run when generating plots (the plots themselves are not tested)
-@patch("uavnoma.command_line.plt.show") # Avoid getting stuck when calling plot.show()
+@patch("matplotlib.pyplot.show") # Avoid getting stuck when calling plot.show()
 def test_success_plot(show, script_runner):
     result = script_runner.run(script_name, '--plot')
     assert result.success          # Successful run
     assert result.returncode == 0  # Code 0 means successful run
     assert len(result.stderr) == 0 # No output in error output stream
 
+# Test that the subsystems of the options and commands are only imported when used
+def test_lazy_imports():
+    lazy = ['uavnoma.geometry', 'uavnoma.parallel', 'uavnoma.pipeline', 'uavnoma.threads',
+            'uavnoma.planner', 'uavnoma.server', 'uavnoma.batch', 'uavnoma.plotting',
+            'multiprocessing.shared_memory', 'matplotlib.pyplot']
+    code = (f"import sys; sys.argv = ['uavnoma', '-s', '100', '--no-print']; "
+            f"from uavnoma.command_line import main; main(); "
+            f"assert not [name for name in {lazy!r} if name in sys.modules]; "
+            f"import uavnoma; uavnoma.plan; assert 'uavnoma.planner' in sys.modules")
+    assert subprocess.run([sys.executable, '-c', code]).returncode == 0
+
 # Regression test using default parameters and seed = 123
 def test_default_results(request, tmp_path, script_runner):
 
@@ -189,3 +206,432 @@ def test_default_results(request, tmp_path, script_runner):
     # Check that the canonical file contents are similar to the output file
     # contents
     np.testing.assert_allclose(output_contents, canonical_contents)
+
+# Test that a run interrupted after its first checkpoint and then resumed gives the
+# same results as an uninterrupted run
+def test_checkpoint_resume(tmp_path, script_runner):
+
+    checkpoint_fp = str(tmp_path / 'checkpoint.npz')
+    interrupted_fp = str(tmp_path / 'interrupted.csv')
+    uninterrupted_fp = str(tmp_path / 'uninterrupted.csv')
+
+    # Save a checkpoint and then simulate the process being killed
+    real_save_checkpoint = uavnoma.simulation.save_checkpoint
+    def save_and_stop(*args):
+        real_save_checkpoint(*args)
+        raise KeyboardInterrupt
+
+    with patch("uavnoma.simulation.save_checkpoint", side_effect=save_and_stop):
+        with pytest.raises(KeyboardInterrupt):
+            with patch("sys.argv", [script_name, '--seed', '123', '--checkpoint', checkpoint_fp,
+                                    '--checkpoint-every', '300', '--no-print']):
+                uavnoma.command_line.main()
+    assert os.path.exists(checkpoint_fp)
+
+    # Resume the interrupted run
+    result = script_runner.run(script_name, '--resume', checkpoint_fp, '-o', interrupted_fp)
+    assert result.success
+    assert len(result.stderr) == 0
+
+    # Perform the same run without interruptions
+    result = script_runner.run(script_name, '--seed', '123', '-o', uninterrupted_fp)
+    assert result.success
+
+    np.testing.assert_array_equal(np.loadtxt(interrupted_fp, delimiter=",", skiprows=1),
+                                  np.loadtxt(uninterrupted_fp, delimiter=",", skiprows=1))
+
+# Test that resuming from a missing checkpoint fails
+def test_resume_missing_checkpoint(tmp_path, script_runner):
+    result = script_runner.run(script_name, '--resume', str(tmp_path / 'missing.npz'))
+    assert not result.success
+    assert result.returncode == 1
+    assert len(result.stderr) > 0
+
+# Test that extending a stored simulation with more samples and more SNR values gives the
+# same results as a single run with the total number of samples and all SNR values
+def test_extend(tmp_path, script_runner):
+
+    state_fp = str(tmp_path / 'state.npz')
+    extended_fp = str(tmp_path / 'extended.csv')
+    full_fp = str(tmp_path / 'full.csv')
+
+    result = script_runner.run(script_name, '--seed', '123', '-s', '400', '--store-gains',
+                               '--checkpoint', state_fp, '--no-print')
+    assert result.success
+
+    result = script_runner.run(script_name, 'extend', state_fp, '-s', '300',
+                               '--snr-points', '62', '64', '66', '-o', extended_fp)
+    assert result.success
+    assert len(result.stdout) > 0
+    assert len(result.stderr) == 0
+
+    result = script_runner.run(script_name, '--seed', '123', '-s', '700', '--snr-max', '66',
+                               '--snr-samples', '29', '-o', full_fp, '--no-print')
+    assert result.success
+
+    np.testing.assert_array_equal(np.loadtxt(extended_fp, delimiter=",", skiprows=1),
+                                  np.loadtxt(full_fp, delimiter=",", skiprows=1))
+
+# Test that new SNR values can't be added if the channel gains were not stored
+def test_extend_without_gains(tmp_path, script_runner):
+    state_fp = str(tmp_path / 'state.npz')
+    result = script_runner.run(script_name, '--seed', '123', '--checkpoint', state_fp, '--no-print')
+    assert result.success
+
+    result = script_runner.run(script_name, 'extend', state_fp, '--snr-points', '62')
+    assert not result.success
+    assert result.returncode == 1
+    assert len(result.stderr) > 0
+
+# Test that results and raw data can be saved in a binary format, and that the averages of
+# the raw rates match the results
+def test_binary_raw_output(tmp_path, script_runner):
+    output_fp = str(tmp_path / 'results.npz')
+    raw_fp = str(tmp_path / 'raw.npz')
+    result = script_runner.run(script_name, '--seed', '123', '--format', 'npz', '-o', output_fp,
+                               '--raw-output', raw_fp, '--no-print')
+    assert result.success
+    assert len(result.stderr) == 0
+
+    with np.load(output_fp) as results, np.load(raw_fp) as raw:
+        assert raw['raw'].shape == (1000,)
+        np.testing.assert_allclose(raw['raw']['rate_usr1'].mean(axis=0), results['avg_arate_usr1'])
+        np.testing.assert_allclose(raw['raw']['rate_usr2'].mean(axis=0), results['avg_arate_usr2'])
+
+# Test that the shards of a simulation, run in separate processes standing in for separate
+# machines, merge into exactly the same results as the simulation run as a single shard
+def test_shard_merge(tmp_path, script_runner):
+    num_shards = 3
+    shard_fps = [str(tmp_path / f'shard{i}.npz') for i in range(num_shards)]
+    merged_fp = str(tmp_path / 'merged.csv')
+    single_fp = str(tmp_path / 'single.csv')
+    params = ['--seed', '123', '-s', '1100', '--block-size', '200', '--no-print']
+
+    processes = [
+        subprocess.Popen([sys.executable, '-c', 'from uavnoma.command_line import main; main()',
+                          '--shard', f'{i}/{num_shards}', '--checkpoint', shard_fps[i]] + params)
+        for i in range(num_shards)
+    ]
+    assert all(process.wait() == 0 for process in processes)
+
+    # Merge the shards in any order
+    result = script_runner.run(script_name, 'merge', *reversed(shard_fps), '-o', merged_fp)
+    assert result.success
+    assert len(result.stdout) > 0
+    assert len(result.stderr) == 0
+
+    result = script_runner.run(script_name, '--shard', '0/1', '--checkpoint',
+                               str(tmp_path / 'single.npz'), '-o', single_fp, *params)
+    assert result.success
+
+    np.testing.assert_array_equal(np.loadtxt(merged_fp, delimiter=",", skiprows=1),
+                                  np.loadtxt(single_fp, delimiter=",", skiprows=1))
+
+# Test that a simulation performed by several workers gives the results of a single shard
+def test_workers(tmp_path, script_runner):
+    params = ['--seed', '123', '-s', '1100', '--block-size', '200', '--no-print']
+    result = script_runner.run(script_name, '--workers', '3', '-o', str(tmp_path / 'parallel.csv'),
+                               '--checkpoint', str(tmp_path / 'parallel.npz'), *params)
+    assert result.success
+    assert len(result.stderr) == 0
+    assert os.path.exists(tmp_path / 'parallel.npz')
+
+    result = script_runner.run(script_name, '--shard', '0/1', '--checkpoint', str(tmp_path / 'single.npz'),
+                               '-o', str(tmp_path / 'single.csv'), *params)
+    assert result.success
+    np.testing.assert_allclose(np.loadtxt(tmp_path / 'parallel.csv', delimiter=",", skiprows=1),
+                               np.loadtxt(tmp_path / 'single.csv', delimiter=",", skiprows=1), rtol=1e-12)
+
+    for invalid in [['--workers', '0'], ['--workers', '2', '--shard', '0/2'],
+                    ['--workers', '2', '--progress'], ['--workers', '2', '--sampler', 'sobol']]:
+        result = script_runner.run(script_name, *invalid, '--checkpoint', str(tmp_path / 'invalid.npz'))
+        assert result.returncode == 1
+        assert 'Error Detected!' in result.stderr
+
+# Test that a pipelined simulation shows the throughput of its stages
+def test_pipeline(tmp_path, script_runner):
+    output_fp = str(tmp_path / 'output.csv')
+    result = script_runner.run(script_name, '--pipeline', '--seed', '1', '-s', '2000', '-o', output_fp)
+    assert result.success
+    assert 'Samples per second' in result.stdout
+    assert len(result.stderr) == 0
+    assert np.loadtxt(output_fp, delimiter=",", skiprows=1).shape == (26, 7)
+
+    for invalid in [['--checkpoint', str(tmp_path / 'state.npz')], ['--workers', '2'], ['--antithetic']]:
+        result = script_runner.run(script_name, '--pipeline', *invalid)
+        assert result.returncode == 1
+        assert 'Error Detected!' in result.stderr
+
+# Test that a threaded simulation gives the same results for the same seed and threads
+def test_threads(tmp_path, script_runner):
+    outputs = []
+    for i in range(2):
+        outputs.append(str(tmp_path / f'output{i}.csv'))
+        result = script_runner.run(script_name, '--threads', '2', '--seed', '1', '-s', '2000', '-o', outputs[-1])
+        assert result.success
+        assert len(result.stderr) == 0
+    np.testing.assert_array_equal(np.loadtxt(outputs[0], delimiter=",", skiprows=1),
+                                  np.loadtxt(outputs[1], delimiter=",", skiprows=1))
+
+    for invalid in [['--threads', '0'], ['--threads', '2', '--pipeline'], ['--threads', '2', '--progress'],
+                    ['--threads', '2', '--sampler', 'sobol']]:
+        result = script_runner.run(script_name, *invalid)
+        assert result.returncode == 1
+        assert 'Error Detected!' in result.stderr
+
+# Test that the running estimates are streamed, stopping when they converge
+def test_stream_output(tmp_path, script_runner):
+    stream_fp = str(tmp_path / 'stream.jsonl')
+    result = script_runner.run(script_name, '--seed', '1', '-s', '20000', '--snr-samples', '3',
+                               '--snr-max', '30', '--progress-every', '1000', '--no-print',
+                               '--stream-output', stream_fp, '--stream-format', 'jsonl',
+                               '--tolerance', '0.05')
+    assert result.success
+    assert len(result.stderr) == 0
+    with open(stream_fp) as fh:
+        rows = [json.loads(line) for line in fh]
+    assert sum(row['final'] for row in rows) == 3
+    assert rows[-1]['samples'] < 20000
+
+    result = script_runner.run(script_name, '--tolerance', '0.05')
+    assert result.returncode == 1
+    assert 'Error Detected!' in result.stderr
+
+# Test that merging fails when a shard is missing
+def test_merge_missing_shard(tmp_path, script_runner):
+    shard_fp = str(tmp_path / 'shard0.npz')
+    result = script_runner.run(script_name, '--seed', '123', '--shard', '0/2',
+                               '--checkpoint', shard_fp, '--no-print')
+    assert result.success
+
+    result = script_runner.run(script_name, 'merge', shard_fp)
+    assert not result.success
+    assert result.returncode == 1
+    assert len(result.stderr) > 0
+
+# Test that a shard without any block of samples saves its state, so that it can be merged
+def test_shard_empty(tmp_path, script_runner):
+    shard_fps = [str(tmp_path / f'shard{i}.npz') for i in range(2)]
+    for i in range(2):
+        result = script_runner.run(script_name, '--seed', '1', '--shard', f'{i}/2',
+                                   '--checkpoint', shard_fps[i])
+        assert result.success
+        assert len(result.stderr) == 0
+    assert os.path.exists(shard_fps[0])
+
+    merged_fp = str(tmp_path / 'merged.csv')
+    single_fp = str(tmp_path / 'single.csv')
+    result = script_runner.run(script_name, 'merge', *shard_fps, '-o', merged_fp, '--no-print')
+    assert result.success
+    result = script_runner.run(script_name, '--seed', '1', '--shard', '0/1', '--checkpoint',
+                               str(tmp_path / 'single.npz'), '-o', single_fp, '--no-print')
+    assert result.success
+    np.testing.assert_array_equal(np.loadtxt(merged_fp, delimiter=",", skiprows=1),
+                                  np.loadtxt(single_fp, delimiter=",", skiprows=1))
+
+# Test that sharded simulations require a seed and a checkpoint file
+@pytest.mark.parametrize('params', [
+    ['--shard', '0/2', '--checkpoint', 'shard.npz'],
+    ['--shard', '0/2', '--seed', '123'],
+    ['--shard', '2/2', '--seed', '123', '--checkpoint', 'shard.npz'],
+    ['--shard', 'one', '--seed', '123', '--checkpoint', 'shard.npz'],
+])
+def test_shard_invalid(script_runner, params):
+    result = script_runner.run(script_name, *params)
+    assert not result.success
+    assert result.returncode == 1
+    assert len(result.stderr) > 0
+
+# Test that rate percentiles and distributions are saved, and that they are the same when
+# computed from several shards or from a single one
+def test_percentiles_distribution(tmp_path, script_runner):
+    params = ['--seed', '123', '-s', '600', '--block-size', '200', '--no-print',
+              '--percentiles', '5', '50']
+
+    # Single shard
+    result = script_runner.run(script_name, '--shard', '0/1', '--checkpoint', str(tmp_path / 'single.npz'), *params)
+    assert result.success
+    result = script_runner.run(script_name, 'merge', str(tmp_path / 'single.npz'),
+                               '--checkpoint', str(tmp_path / 'single_merged.npz'), '--no-print')
+    assert result.success
+
+    # Two shards, merged
+    for i in range(2):
+        result = script_runner.run(script_name, '--shard', f'{i}/2', '--checkpoint',
+                                   str(tmp_path / f'shard{i}.npz'), *params)
+        assert result.success
+    result = script_runner.run(script_name, 'merge', str(tmp_path / 'shard0.npz'),
+                               str(tmp_path / 'shard1.npz'), '--percentiles', '5', '50',
+                               '-o', str(tmp_path / 'merged.csv'),
+                               '--distribution-output', str(tmp_path / 'merged_cdf.csv'))
+    assert result.success
+    assert len(result.stderr) == 0
+
+    result = script_runner.run(script_name, '--resume', str(tmp_path / 'single_merged.npz'),
+                               '--percentiles', '5', '50', '--no-print',
+                               '-o', str(tmp_path / 'single.csv'),
+                               '--distribution-output', str(tmp_path / 'single_cdf.csv'))
+    assert result.success
+
+    for name in ['', '_cdf']:
+        merged = np.loadtxt(str(tmp_path / f'merged{name}.csv'), delimiter=",", skiprows=1)
+        single = np.loadtxt(str(tmp_path / f'single{name}.csv'), delimiter=",", skiprows=1)
+        np.testing.assert_array_equal(merged, single)
+
+    # Percentiles are increasing and bounded by the rates' range
+    merged = np.loadtxt(str(tmp_path / 'merged.csv'), delimiter=",", skiprows=1)
+    assert merged.shape[1] == 7 + 4
+    assert np.all(merged[:, 7] <= merged[:, 9]) and np.all(merged[:, 8] <= merged[:, 10])
+
+# Test that percentiles can't be requested for simulations run without sketches
+def test_percentiles_without_sketches(tmp_path, script_runner):
+    state_fp = str(tmp_path / 'state.npz')
+    result = script_runner.run(script_name, '--seed', '123', '--checkpoint', state_fp, '--no-print')
+    assert result.success
+
+    result = script_runner.run(script_name, '--resume', state_fp, '--percentiles', '5')
+    assert not result.success
+    assert result.returncode == 1
+    assert len(result.stderr) > 0
+
+# Test that a dry run only shows the plan, and that the memory budget is enforced
+def test_dry_run(tmp_path, script_runner):
+    output_fp = str(tmp_path / 'output.csv')
+    result = script_runner.run(script_name, '--dry-run', '-o', output_fp)
+    assert result.success
+    assert 'Estimated peak memory' in result.stdout
+    assert not os.path.exists(output_fp)
+
+    params = ['-s', '100000', '--snr-samples', '100', '--control-variates', '--memory-budget', '10']
+    result = script_runner.run(script_name, '--dry-run', *params)
+    assert result.returncode == 1
+    assert 'exceeds the budget' in result.stderr
+    result = script_runner.run(script_name, *params, '-o', output_fp)
+    assert result.returncode == 1
+    assert not os.path.exists(output_fp)
+
+    result = script_runner.run(script_name, '--memory-budget', '0')
+    assert result.returncode == 1
+
+    # The buffers of the engines are included in the estimate
+    params = ['-s', '100000', '--snr-samples', '100', '--block-size', '10000', '--seed', '1',
+              '--percentiles', '50', '--memory-budget', '64']
+    assert script_runner.run(script_name, '--dry-run', *params).success
+    result = script_runner.run(script_name, '--dry-run', *params, '--threads', '4')
+    assert result.returncode == 1
+    assert 'exceeds the budget' in result.stderr
+
+    # Simulations with too many replicates for a short calibration run
+    result = script_runner.run(script_name, '--dry-run', '--sampler', 'sobol', '--replicates', '100000', '-s', '100000')
+    assert result.success
+    assert 'Estimated peak memory' in result.stdout
+
+# Test that the progress is shown and written as JSON lines
+def test_progress(tmp_path, script_runner):
+    progress_fp = str(tmp_path / 'progress.jsonl')
+    result = script_runner.run(script_name, '-s', '500', '--progress', '--progress-every', '200',
+                               '--progress-output', progress_fp, '--no-print')
+    assert result.success
+    assert '500/500 samples (100%)' in result.stderr
+    with open(progress_fp) as f:
+        records = [json.loads(line) for line in f]
+    assert [record['samples_done'] for record in records] == [200, 400, 500]
+
+    result = script_runner.run(script_name, '--progress', '--progress-every', '0')
+    assert result.returncode == 1
+
+# Test that the scenarios of a batch are saved in a single output file, and that invalid
+# scenarios are rejected before running any
+def test_batch(tmp_path, script_runner):
+    scenarios_fp = str(tmp_path / 'scenarios.csv')
+    output_fp = str(tmp_path / 'results.npz')
+    with open(scenarios_fp, 'w') as f:
+        f.write('scenario,rician_factor,seed,snr_samples\nlos,18,1,4\nnlos,10,1,3\n')
+    result = script_runner.run(script_name, 'batch', scenarios_fp, '-o', output_fp,
+                               '--format', 'npz', '--workers', '2')
+    assert result.success
+    assert 'nlos' in result.stdout
+    columns, metadata = uavnoma.output.load_results(output_fp, 'npz')
+    assert list(columns['scenario']) == ['los'] * 4 + ['nlos'] * 3
+    assert metadata['scenarios']['nlos']['rician_factor'] == 10
+
+    with open(scenarios_fp, 'a') as f:
+        f.write('invalid,25,1,4\n')
+    result = script_runner.run(script_name, 'batch', scenarios_fp, '-o', str(tmp_path / 'invalid.csv'))
+    assert result.returncode == 1
+    assert 'scenario invalid' in result.stderr
+    assert not (tmp_path / 'invalid.csv').exists()
+
+# Test that the tables of the table geometry are saved in the cache directory, and that the
+# geometry is kept when resuming
+def test_geometry(tmp_path, script_runner):
+    cache = tmp_path / 'geometry'
+    checkpoint_fp = str(tmp_path / 'state.npz')
+    result = script_runner.run(script_name, '-s', '200', '--snr-samples', '3', '--seed', '1', '--no-print',
+                               '--geometry', 'table', '--geometry-cache', str(cache), '--checkpoint', checkpoint_fp)
+    assert result.success
+    assert len(os.listdir(cache)) == 1
+    config, state = uavnoma.simulation.load_state(checkpoint_fp)
+    assert config.geometry == 'table'
+
+    result = script_runner.run(script_name, '--geometry', 'grid')
+    assert result.returncode == 2
+
+# Test that the Jacobian table of the sensitivities is saved and printed
+def test_sensitivity(tmp_path, script_runner):
+    output_fp = str(tmp_path / 'jacobian.csv')
+    result = script_runner.run(script_name, 'sensitivity', '-s', '500', '--snr-samples', '3', '--seed', '1',
+                               '--params', 'hardw_ip', 'path_loss', '--steps', '0.02', '0.02', '-o', output_fp)
+    assert result.success
+    assert 'Derivatives with respect to path_loss (step 0.02)' in result.stdout
+    columns = uavnoma.output.read_csv(output_fp)
+    assert len(columns['snr_dB']) == 3
+    assert 'd_avg_arate_usr1_d_hardw_ip_stderr' in columns
+
+    result = script_runner.run(script_name, 'sensitivity', '--steps', '0.1')
+    assert result.returncode == 1
+    assert 'Error Detected!' in result.stderr
+
+# Test that the plots are saved to files in the format of their extension
+def test_plot_file(tmp_path, script_runner):
+    result = script_runner.run(script_name, '-s', '100', '--snr-samples', '3', '--seed', '1', '--no-print',
+                               '--plot-file', str(tmp_path / 'plot.pdf'))
+    assert result.success
+    assert (tmp_path / 'plot_outage.pdf').read_bytes().startswith(b'%PDF')
+    assert (tmp_path / 'plot_rate.pdf').exists()
+
+    result = script_runner.run(script_name, '-s', '100', '--plot-file', str(tmp_path / 'plot.gif'))
+    assert result.returncode == 1
+    assert 'Error Detected!' in result.stderr
+    assert not (tmp_path / 'plot_outage.gif').exists()
+
+# Test that the plots of each scenario are rendered to a directory
+def test_batch_plots(tmp_path, script_runner):
+    scenarios_fp = str(tmp_path / 'scenarios.csv')
+    with open(scenarios_fp, 'w') as f:
+        f.write('scenario,rician_factor,seed,snr_samples\nlos k=18,18,1,4\nnlos,10,1,3\n')
+    for workers in ['1', '2']:
+        plot_dir = tmp_path / f'plots{workers}'
+        result = script_runner.run(script_name, 'batch', scenarios_fp, '--plot-dir', str(plot_dir),
+                                   '--plot-format', 'svg', '--workers', workers, '--no-print')
+        assert result.success
+        assert sorted(os.listdir(plot_dir)) == ['los_k_18_outage.svg', 'los_k_18_rate.svg',
+                                                'nlos_outage.svg', 'nlos_rate.svg']
+
+    result = script_runner.run(script_name, 'batch', scenarios_fp, '--plot-format', 'gif')
+    assert result.returncode == 2
+
+# Test that coverage maps are saved and plotted
+def test_coverage(tmp_path, script_runner):
+    output_fp = str(tmp_path / 'coverage.npz')
+    result = script_runner.run(script_name, 'coverage', '-s', '100', '--snr-samples', '2',
+                               '--resolution', '7', '--heights', '15', '25', '-o', output_fp,
+                               '--image', str(tmp_path / 'coverage.png'))
+    assert result.success
+    with np.load(output_fp) as data:
+        assert data['p_outage_user'].shape == (2, 2, 7, 7)
+    assert (tmp_path / 'coverage_p_outage_user.png').exists()
+    assert (tmp_path / 'coverage_avg_arate_user.png').exists()
+
+    result = script_runner.run(script_name, 'coverage', '--resolution', '1')
+    assert result.returncode == 1
@@ -0,0 +1,64 @@
+import json
+import numpy as np
+import pytest
+from uavnoma.coverage import coverage_map, metric_labels
+from uavnoma.simulation import SimulationConfig, run_simulation
+
+# Test the shape of the maps, and that cells outside the users' area are NaN
+def test_coverage_shape():
+    config = SimulationConfig(seed=1, monte_carlo_samples=200, snr_samples=3)
+    coverage = coverage_map(config, resolution=11, heights=[15, 25, 35])
+    assert sorted(coverage.metrics) == sorted(metric_labels)
+    for values in coverage.metrics.values():
+        assert values.shape == (3, 3, 11, 11)
+        assert np.isnan(values[:, :, 0, 0]).all() and not np.isnan(values[:, :, 5, 5]).any()
+    np.testing.assert_array_equal(coverage.snr_dB, config.snr_values())
+
+    # Outage increases, and rates decrease, with the height of the UAV
+    outage = np.nanmean(coverage.metrics['p_outage_user'][:, 1], axis=(1, 2))
+    rate = np.nanmean(coverage.metrics['avg_arate_user'][:, 1], axis=(1, 2))
+    assert np.all(np.diff(outage) > 0) and np.all(np.diff(rate) < 0)
+
+# Test that the maps don't depend on the tiles or the number of workers
+def test_coverage_tiles():
+    config = SimulationConfig(seed=2, monte_carlo_samples=100, snr_samples=4)
+    expected = coverage_map(config, resolution=9, workers=1)
+    coverage = coverage_map(config, resolution=9, workers=3, memory=1)
+    for name, values in expected.metrics.items():
+        np.testing.assert_array_equal(coverage.metrics[name], values)
+
+# Test that the average of the maps over the users' area is the result of the simulation,
+# where the users are uniformly distributed in the area
+def test_coverage_average():
+    config = SimulationConfig(seed=3, monte_carlo_samples=500, snr_samples=6)
+    coverage = coverage_map(config, resolution=61)
+    result = run_simulation(SimulationConfig(seed=4, monte_carlo_samples=20000, snr_samples=6))
+    for name in ['p_outage_usr1', 'p_outage_usr2', 'avg_arate_sys', 'avg_arate_usr1']:
+        np.testing.assert_allclose(np.nanmean(coverage.metrics[name][0], axis=(1, 2)),
+                                   getattr(result, name), rtol=0.05, atol=0.01)
+
+# Test that the maps are saved and plotted
+def test_coverage_save(tmp_path):
+    config = SimulationConfig(seed=1, monte_carlo_samples=100, snr_samples=2)
+    coverage = coverage_map(config, resolution=5, heights=[20, 30], snr_dB=[20, 40])
+    coverage.save(str(tmp_path / 'coverage.npz'))
+    with np.load(str(tmp_path / 'coverage.npz')) as data:
+        assert json.loads(str(data['metadata']))['params']['seed'] == 1
+        np.testing.assert_array_equal(data['heights'], [20, 30])
+        np.testing.assert_array_equal(data['avg_arate_user'], coverage.metrics['avg_arate_user'])
+
+    figure = coverage.figure('avg_arate_user', snr=35)
+    assert len(figure.axes) == 3
+    assert figure.axes[0].get_title() == 'UAV height 20 m, SNR 40 dB'
+    figure.savefig(str(tmp_path / 'coverage.png'))
+    assert (tmp_path / 'coverage.png').exists()
+
+@pytest.mark.parametrize('config, kwargs', [
+    (SimulationConfig(monte_carlo_samples=100), {'resolution': 1}),
+    (SimulationConfig(monte_carlo_samples=100), {'heights': [5]}),
+    (SimulationConfig(monte_carlo_samples=100), {'heights': [20, 60]}),
+    (SimulationConfig(monte_carlo_samples=100, geometry='table'), {}),
+])
+def test_coverage_invalid(config, kwargs):
+    with pytest.raises(ValueError):
+        coverage_map(config, **kwargs)
@@ -0,0 +1,139 @@
+"""
+Statistical-equivalence tests between the reference simulation engine, the per-sample loop run by
+the `uavnoma` command by default, and the optimized engines (vectorized, sharded, parallel,
+pipelined, threaded, asynchronous, counter-based, table geometry, quasi-Monte Carlo and variance-reduced).
+
+Engines which draw different random values than the reference can't be compared value by value,
+so each one is run on a matrix of configurations with a different seed than the reference, and:
+
+- the distributions of the channel gains are compared with two-sample Kolmogorov-Smirnov tests;
+- the outage and rate curves are compared at each SNR value, requiring their confidence intervals
+  to overlap.
+
+The seeds are fixed, so the tests are deterministic. To validate a new engine, add it to `engines`.
+"""
+import asyncio
+import dataclasses
+import numpy as np
+import pytest
+from uavnoma.parallel import run_parallel
+from uavnoma.pipeline import run_pipeline
+from uavnoma.threads import run_threads
+from uavnoma.simulation import SimulationConfig, SimulationResult, run_simulation, simulate_async
+from uavnoma.simulation import generate_gains, evaluate_gains, sample_metrics, metric_names
+
+# Number of Monte Carlo samples of each engine
+num_samples = 4000
+
+# Minimum p-value of the Kolmogorov-Smirnov tests of the channel gains
+ks_threshold = 1e-3
+
+# Half width of the confidence intervals, in standard errors
+ci_width = 4.0
+
+# Configurations on which the engines are compared
+configs = {
+    'defaults': SimulationConfig(),
+    'weak_los': SimulationConfig(power_los=1.0, rician_factor=10.0, path_loss=3.0),
+    'impaired': SimulationConfig(radius_uav=5.0, radius_user=20.0, uav_height_mean=40.0,
+                                 hardw_ip=0.2, sic_ip=0.2, target_rate_secondary_user=1.0),
+}
+
+# Optimized engines, each a function which performs the simulation of a configuration, storing
+# the channel gains of the samples
+engines = {
+    'vectorized': lambda config: SimulationResult(config, evaluate_gains(config, *generate_gains(config))),
+    'sharded': lambda config: run_simulation(dataclasses.replace(config, shard='0/1', block_size=500)),
+    'parallel': lambda config: run_parallel(dataclasses.replace(config, block_size=500), workers=2),
+    'pipeline': lambda config: run_pipeline(config)[0],
+    'threads': lambda config: run_threads(dataclasses.replace(config, block_size=500), threads=3),
+    'async': lambda config: asyncio.run(simulate_async(config, chunk_size=700)),
+    'sobol': lambda config: run_simulation(dataclasses.replace(config, sampler='sobol', replicates=16)),
+    'counter': lambda config: run_simulation(dataclasses.replace(config, sampler='counter')),
+    'geometry_table': lambda config: run_simulation(dataclasses.replace(config, geometry='table')),
+    'geometry_table_pipeline': lambda config: run_pipeline(dataclasses.replace(config, geometry='table'))[0],
+    'antithetic': lambda config: run_simulation(dataclasses.replace(config, antithetic=True)),
+    'control_variates': lambda config: run_simulation(dataclasses.replace(config, control_variates=True)),
+    'sobol_antithetic_cv': lambda config: run_simulation(dataclasses.replace(
+        config, sampler='sobol', replicates=16, antithetic=True, control_variates=True)),
+}
+
+def ks_test(a, b):
+    """Two-sample Kolmogorov-Smirnov test, returning the statistic and its asymptotic p-value.
+    """
+    a, b = np.sort(a), np.sort(b)
+    values = np.concatenate([a, b])
+    statistic = np.max(np.abs(np.searchsorted(a, values, side='right') / len(a)
+                              - np.searchsorted(b, values, side='right') / len(b)))
+    n = np.sqrt(len(a) * len(b) / (len(a) + len(b)))
+    lam = (n + 0.12 + 0.11 / n) * statistic
+    if lam < 0.3:
+        # The series converges slowly, to 1 within 1e-5
+        return statistic, 1.0
+    k = np.arange(1, 101)
+    p_value = 2 * np.sum((-1.0) ** (k - 1) * np.exp(-2 * k ** 2 * lam ** 2))
+    return statistic, float(np.clip(p_value, 0, 1))
+
+def estimates(result):
+    """Returns the averages of the metrics of a simulation and their standard errors.
+    """
+    config, state = result.config, result.state
+    means = {name: getattr(result, name) for name in metric_names}
+    if config.sampler == 'sobol':
+        return means, result.standard_errors()
+
+    # Standard errors of the plain averages, reduced by the achieved variance reduction factors
+    metrics = sample_metrics(config, state['gains_primary'], state['gains_secondary'],
+                             10.0 ** (result.snr_dB / 10.0))
+    errors = {name: values.std(axis=0, ddof=1) / np.sqrt(len(values)) for name, values in metrics.items()}
+    if state['variance_reduction'] is not None:
+        for name in metric_names:
+            factor = state['variance_reduction'][name]
+            errors[name] = np.where(factor > 0, errors[name] / np.sqrt(np.abs(factor)), errors[name])
+    return means, errors
+
+def check_equivalent(reference, candidate):
+    """Asserts that two simulations have the same distributions of channel gains and overlapping
+    confidence intervals of their curves.
+    """
+    for gains in ['gains_primary', 'gains_secondary']:
+        statistic, p_value = ks_test(reference.state[gains], candidate.state[gains])
+        assert p_value > ks_threshold, f"{gains}: KS statistic {statistic:.4f}, p-value {p_value:.2e}"
+
+    reference_means, reference_errors = estimates(reference)
+    candidate_means, candidate_errors = estimates(candidate)
+    for name in metric_names:
+        difference = np.abs(reference_means[name] - candidate_means[name])
+        tolerance = ci_width * (reference_errors[name] + candidate_errors[name]) + 1e-12
+        assert np.all(difference <= tolerance), \
+            f"{name}: differences {difference} exceed the confidence intervals {tolerance}"
+
+@pytest.fixture(scope='module', params=list(configs), ids=list(configs))
+def reference(request):
+    config = dataclasses.replace(configs[request.param], monte_carlo_samples=num_samples,
+                                 snr_samples=11, seed=1, store_gains=True)
+    return run_simulation(config)
+
+# Test that each engine gives statistically the same results as the reference one
+@pytest.mark.parametrize('engine', list(engines))
+def test_engine_equivalence(reference, engine):
+    candidate = engines[engine](dataclasses.replace(reference.config, seed=2))
+    assert candidate.samples == num_samples
+    check_equivalent(reference, candidate)
+
+# Test that the comparison detects an engine with a different model
+def test_detects_difference(reference):
+    config = reference.config
+    path_loss = config.path_loss + 0.3 if config.path_loss < 2.7 else config.path_loss - 0.3
+    changed = dataclasses.replace(config, seed=2, path_loss=path_loss)
+    with pytest.raises(AssertionError):
+        check_equivalent(reference, run_simulation(changed))
+
+# Test the Kolmogorov-Smirnov test on samples of known distributions
+def test_ks_test():
+    np.random.seed(0)
+    a, b = np.random.rand(2000), np.random.rand(3000)
+    assert ks_test(a, a) == (0.0, 1.0)
+    assert ks_test(a, b)[1] > 0.01
+    assert ks_test(a, b + 0.1)[1] < 1e-6
+    assert ks_test(a, b ** 1.2)[1] < 1e-3
@@ -126,3 +126,18 @@ def test_channel_gain_valid(number_user, x_u, y_u, x_r, y_r, uav_height_mean, pa
 def test_channel_gain_invalid(exception, number_user, x_u, y_u, x_r, y_r, uav_height_mean, path_loss, s, sigma):
     with pytest.raises(exception):
         generate_channel(s, sigma, number_user, x_u, y_u, x_r, y_r, uav_height_mean, path_loss)
+
+# Test that the counter-based generators of the samples depend only on the seed and the index
+def test_sample_generator():
+    values = sample_generator(5, 73412).random(4)
+    np.testing.assert_array_equal(sample_generator(5, 73412).random(4), values)
+    assert not np.array_equal(sample_generator(5, 73413).random(4), values)
+    assert not np.array_equal(sample_generator(6, 73412).random(4), values)
+
+    # The positions drawn with a generator don't use the global one
+    np.random.seed(1)
+    rng_state = np.random.get_state()
+    x_r, y_r, z_r = random_position_uav(1, 2, 20, sample_generator(5, 0))
+    x_u, y_u = random_position_users(2, 10, sample_generator(5, 0))
+    assert np.array_equal(np.random.get_state()[1], rng_state[1])
+    assert x_u.shape == (2, 1) and 15 <= z_r <= 25
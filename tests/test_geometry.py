@@ -0,0 +1,69 @@
+import os
+import numpy as np
+import pytest
+import uavnoma.geometry
+from uavnoma.geometry import GeometryTable, create_table, geometry_table, horizontal_cdf
+from uavnoma.simulation import SimulationConfig, user_gains
+
+# Test that the distribution of the squared horizontal distance is that of the positions drawn
+# in the cell and the orbit, including orbits larger than the cell
+@pytest.mark.parametrize('radius_user, radius_uav', [(15.0, 2.0), (1.0, 5.0), (3.0, 3.0)])
+def test_horizontal_cdf(radius_user, radius_uav):
+    rng = np.random.default_rng(1)
+    theta_uav, theta_user = rng.random((2, 100000)) * 2 * np.pi
+    rho_user = np.sqrt(rng.random(100000)) * radius_user
+    squared_distances = ((rho_user * np.cos(theta_user) - radius_uav * np.cos(theta_uav)) ** 2
+                         + (rho_user * np.sin(theta_user) - radius_uav * np.sin(theta_uav)) ** 2)
+    points = np.quantile(squared_distances, [0.001, 0.01, 0.1, 0.5, 0.9, 0.99, 0.999])
+    np.testing.assert_allclose(horizontal_cdf(points, radius_user, radius_uav),
+                               [0.001, 0.01, 0.1, 0.5, 0.9, 0.99, 0.999], atol=0.005)
+    high = (radius_user + radius_uav) ** 2
+    assert horizontal_cdf(high, radius_user, radius_uav) == 1
+    assert horizontal_cdf(max(radius_uav - radius_user, 0) ** 2, radius_user, radius_uav) == 0
+
+    table = create_table(radius_user, radius_uav)
+    assert np.all(np.diff(table.quantiles) >= 0)
+    assert table.quantiles[0] == pytest.approx(max(radius_uav - radius_user, 0) ** 2, abs=1e-9)
+    assert table.quantiles[-1] == pytest.approx(high)
+    probabilities = np.linspace(0.0005, 0.9995, 999)
+    np.testing.assert_allclose(horizontal_cdf(table.squared_distances(probabilities), radius_user, radius_uav),
+                               probabilities, atol=1e-4)
+    assert table.squared_distances(rng.random(100000)).mean() == pytest.approx(
+        radius_user ** 2 / 2 + radius_uav ** 2, rel=0.01)
+
+# Test that tables are lookups of their quantiles, with the shape of the uniform values
+def test_table_lookup():
+    table = GeometryTable(15.0, 2.0, np.array([0.0, 1.0, 4.0]))
+    np.testing.assert_allclose(table.squared_distances([[0.0, 0.25], [0.75, 1.0]]), [[0.0, 0.5], [2.5, 4.0]])
+    with pytest.raises(ValueError):
+        create_table(0.0, 2.0)
+
+# Test that tables are saved in the cache directory and reused from it
+def test_geometry_cache(tmp_path, monkeypatch):
+    uavnoma.geometry.cached_table.cache_clear()
+    table = geometry_table(12, 3, cache_dir=str(tmp_path))
+    files = os.listdir(tmp_path)
+    assert len(files) == 1
+    loaded = GeometryTable.load(str(tmp_path / files[0]))
+    assert loaded.radius_user == 12.0 and loaded.radius_uav == 3.0
+    np.testing.assert_array_equal(loaded.quantiles, table.quantiles)
+    assert geometry_table(12.0, 3.0, cache_dir=str(tmp_path)) is table
+
+    # Another process loads the table instead of computing it
+    uavnoma.geometry.cached_table.cache_clear()
+    monkeypatch.setattr(uavnoma.geometry, 'create_table', None)
+    np.testing.assert_array_equal(geometry_table(12, 3, cache_dir=str(tmp_path)).quantiles, table.quantiles)
+    monkeypatch.setattr(uavnoma.geometry, 'cache_dir', str(tmp_path))
+    np.testing.assert_array_equal(geometry_table(12, 3).quantiles, table.quantiles)
+    uavnoma.geometry.cached_table.cache_clear()
+
+# Test that the table geometry gives the same distances to both users for the same radii
+# uniform values, and that the configuration is validated
+def test_table_geometry():
+    config = SimulationConfig(geometry='table')
+    uniforms = np.random.rand(5, 6)
+    uniforms[:, 5] = uniforms[:, 4]
+    _, controls = user_gains(config, uniforms, np.zeros((5, 4)))
+    np.testing.assert_array_equal(controls[:, 0], controls[:, 1])
+    with pytest.raises(ValueError):
+        SimulationConfig(geometry='grid')
@@ -0,0 +1,120 @@
+import subprocess
+import sys
+import pytest
+import numpy as np
+import uavnoma.output
+from uavnoma.output import *
+
+# Skip the formats whose optional dependencies are not installed
+def require(file_format):
+    if file_format == "parquet":
+        pytest.importorskip("pyarrow")
+    if file_format == "hdf5":
+        pytest.importorskip("h5py")
+
+# Test that saved results are loaded back unchanged, with their metadata
+@pytest.mark.parametrize("file_format", formats)
+def test_results_roundtrip(tmp_path, file_format):
+    require(file_format)
+    columns = {'snr_dB': np.linspace(10, 60, 26), 'p_outage_sys': np.random.rand(26)}
+    metadata = {'params': {'seed': 123, 'monte_carlo_samples': 1000}}
+    filename = str(tmp_path / ('results.' + file_format))
+
+    save_results(filename, columns, metadata, file_format)
+    loaded, loaded_metadata = load_results(filename, file_format)
+
+    assert list(loaded) == list(columns)
+    for name in columns:
+        np.testing.assert_allclose(loaded[name], columns[name])
+    if file_format != "csv":
+        assert loaded_metadata['params'] == metadata['params']
+        assert loaded_metadata['uavnoma_version'] == package_version()
+
+# Test that text columns, e.g. the scenario IDs of a batch, are loaded back as strings
+@pytest.mark.parametrize("file_format", formats)
+def test_results_text_column(tmp_path, file_format):
+    require(file_format)
+    columns = {'scenario': np.array(['los', 'los', 'nlos']), 'snr_dB': np.array([10.0, 20.0, 10.0])}
+    filename = str(tmp_path / ('results.' + file_format))
+
+    save_results(filename, columns, {}, file_format)
+    loaded, _ = load_results(filename, file_format)
+    assert list(loaded['scenario']) == ['los', 'los', 'nlos']
+    np.testing.assert_array_equal(loaded['snr_dB'], columns['snr_dB'])
+
+# Test that raw data written in several chunks is loaded back unchanged
+@pytest.mark.parametrize("file_format", formats)
+def test_raw_writer(tmp_path, monkeypatch, file_format):
+    require(file_format)
+    monkeypatch.setattr(uavnoma.output, "raw_chunk_size", 7)
+    num_samples, num_snr = 30, 4
+    gains = np.random.rand(num_samples, 2)
+    rates = np.random.rand(num_samples, 2, num_snr)
+    filename = str(tmp_path / ('raw.' + file_format))
+
+    with raw_writer(filename, {'seed': 1}, num_samples, num_snr, file_format) as writer:
+        for i in range(num_samples):
+            writer.write(gains[i, 0], gains[i, 1], rates[i, 0], rates[i, 1])
+    loaded, loaded_metadata = load_results(filename, file_format)
+
+    if file_format == "csv":
+        np.testing.assert_allclose(loaded['gain_usr1'], gains[:, 0])
+        np.testing.assert_allclose(loaded[f'rate_usr2_{num_snr - 1}'], rates[:, 1, -1])
+    else:
+        assert loaded_metadata['seed'] == 1
+        np.testing.assert_array_equal(loaded['gain_usr1'], gains[:, 0])
+        np.testing.assert_array_equal(loaded['gain_usr2'], gains[:, 1])
+        np.testing.assert_array_equal(loaded['rate_usr1'], rates[:, 0])
+        np.testing.assert_array_equal(loaded['rate_usr2'], rates[:, 1])
+
+# Test that closing a raw data writer with missing samples raises an error
+def test_raw_writer_missing_samples(tmp_path):
+    writer = raw_writer(str(tmp_path / 'raw.npz'), {}, 10, 2, "npz")
+    writer.write(1.0, 2.0, np.zeros(2), np.zeros(2))
+    with pytest.raises(ValueError):
+        writer.close()
+
+# Test that unknown formats are rejected
+def test_check_format():
+    with pytest.raises(ValueError):
+        check_format("xlsx")
+
+# Test that result tables are mappings of views of a single array
+def test_result_table():
+    columns = {'snr_dB': np.linspace(10, 60, 6), 'p_outage_sys': np.random.rand(6)}
+    table = ResultTable(columns)
+    assert list(table) == ['snr_dB', 'p_outage_sys'] and len(table) == 2 and table.num_rows == 6
+    assert table.data.shape == (2, 6)
+    for name in columns:
+        np.testing.assert_array_equal(table[name], columns[name])
+        assert np.shares_memory(table[name], table.data)
+    assert dict(table.items()).keys() == columns.keys()
+    assert 'snr_dB' in repr(table)
+    assert len(ResultTable({})) == 0
+
+# Test that result tables are converted to pandas without copying
+def test_result_table_pandas():
+    pytest.importorskip("pandas")
+    table = ResultTable({'snr_dB': np.linspace(10, 60, 6), 'p_outage_sys': np.random.rand(6)})
+    data_frame = table.to_pandas()
+    assert list(data_frame.columns) == ['snr_dB', 'p_outage_sys']
+    assert np.shares_memory(data_frame['p_outage_sys'].to_numpy(), table.data)
+    np.testing.assert_array_equal(data_frame['p_outage_sys'].to_numpy(), table['p_outage_sys'])
+
+# Test that CSV files keep integers, floats exactly, NaN values and text
+def test_csv_columns(tmp_path):
+    filename = str(tmp_path / 'results.csv')
+    columns = {'scenario': np.array(['a,b', 'c']), 'index': np.array([1, 2]),
+               'value': np.array([0.1 + 0.2, np.nan])}
+    save_results(filename, columns, {}, 'csv')
+    loaded, _ = load_results(filename, 'csv')
+    assert list(loaded['scenario']) == ['a,b', 'c']
+    assert loaded['index'].dtype.kind == 'i'
+    np.testing.assert_array_equal(loaded['index'], columns['index'])
+    np.testing.assert_array_equal(loaded['value'], columns['value'])
+
+# Test that simulations are performed and saved without importing pandas
+def test_without_pandas(tmp_path):
+    code = ("import sys; sys.argv = ['uavnoma', '-s', '100', '--no-print', '-o', sys.argv[1]]; "
+            "from uavnoma.command_line import main; main(); assert 'pandas' not in sys.modules")
+    assert subprocess.run([sys.executable, '-c', code, str(tmp_path / 'results.csv')]).returncode == 0
@@ -0,0 +1,87 @@
+import dataclasses
+import os
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+import pytest
+import uavnoma.parallel
+from uavnoma.parallel import SharedArrays, attach_arrays, close_blocks, run_parallel
+from uavnoma.simulation import SimulationConfig, run_simulation
+
+# Test that a parallel simulation gives the results of the same simulation as a single shard,
+# from the same random streams, up to the rounding errors of the vectorized evaluation
+@pytest.mark.parametrize('params', [
+    dict(monte_carlo_samples=1100, block_size=200),
+    dict(monte_carlo_samples=700, block_size=100, store_gains=True, sketches=True),
+    dict(monte_carlo_samples=700, block_size=300, store_gains=True, geometry='table', uav_height_mean=33.3),
+    dict(monte_carlo_samples=500, block_size=100, store_gains=True, sampler='counter'),
+])
+def test_parallel_single_shard(params):
+    config = SimulationConfig(seed=7, **params)
+    result = run_parallel(config, workers=3)
+    expected = run_simulation(dataclasses.replace(config, shard='0/1'))
+    assert result.config == expected.config
+    assert result.samples == config.monte_carlo_samples
+    for name, values in expected.columns().items():
+        np.testing.assert_allclose(result.columns()[name], values, rtol=1e-12)
+    for value, expected_value in zip(result.state['rng_state'], expected.state['rng_state']):
+        np.testing.assert_array_equal(value, expected_value)
+    if config.store_gains:
+        np.testing.assert_allclose(result.state['gains_primary'], expected.state['gains_primary'], rtol=1e-12)
+        np.testing.assert_allclose(result.state['gains_secondary'], expected.state['gains_secondary'], rtol=1e-12)
+    if config.sketches:
+        for name, values in expected.percentiles([5, 50, 95]).items():
+            np.testing.assert_allclose(result.percentiles([5, 50, 95])[name], values, rtol=1e-12)
+
+# Test that simulations without a seed are given one, so that their blocks are independent
+def test_parallel_unseeded():
+    result = run_parallel(SimulationConfig(monte_carlo_samples=400, block_size=100), workers=2)
+    assert result.config.seed is not None
+    assert result.samples == 400
+
+# Test that simulations which can't be performed in parallel are rejected
+@pytest.mark.parametrize('params', [
+    dict(shard='0/2'),
+    dict(sampler='sobol'),
+    dict(antithetic=True),
+])
+def test_parallel_invalid(params):
+    with pytest.raises(ValueError):
+        run_parallel(SimulationConfig(seed=1, **params), workers=2)
+    with pytest.raises(ValueError):
+        run_parallel(SimulationConfig(seed=1), workers=-1)
+
+# Test that arrays written by another process are shared, and that the blocks are unlinked
+def test_shared_arrays():
+    with SharedArrays({'a': ((2, 3), np.float64), 'b': ((4,), np.int64)}) as shared:
+        names = [block.name for block in shared.blocks.values()]
+        assert np.all(shared.arrays['a'] == 0) and np.all(shared.arrays['b'] == 0)
+        blocks, arrays = attach_arrays(shared.spec())
+        arrays['a'][1] = 5.0
+        arrays['b'][:] = np.arange(4)
+        del arrays
+        close_blocks(blocks)
+        np.testing.assert_array_equal(shared.arrays['a'], [[0, 0, 0], [5, 5, 5]])
+        np.testing.assert_array_equal(shared.arrays['b'], np.arange(4))
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
+
+# Test that the shared memory blocks are unlinked when a worker crashes
+def test_parallel_crash(monkeypatch):
+    names = []
+    spec = SharedArrays.spec
+    def record_spec(self):
+        names.extend(block.name for block in self.blocks.values())
+        return spec(self)
+    def crash(config, uniforms, normals):
+        os._exit(1)
+    monkeypatch.setattr(SharedArrays, 'spec', record_spec)
+    monkeypatch.setattr(uavnoma.parallel, 'channel_gains', crash)
+
+    with pytest.raises(BrokenProcessPool):
+        run_parallel(SimulationConfig(monte_carlo_samples=400, block_size=100, seed=1), workers=2)
+    assert len(names) > 0
+    for name in set(names):
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
@@ -0,0 +1,62 @@
+import dataclasses
+import numpy as np
+import pytest
+import uavnoma.pipeline
+from uavnoma.pipeline import run_pipeline, block_generator
+from uavnoma.simulation import SimulationConfig, channel_gains, sample_metrics
+
+# Test that the results only depend on the seed and the block size, not on the buffering, and
+# that each block is drawn from its own generator
+def test_pipeline_deterministic():
+    config = SimulationConfig(monte_carlo_samples=2500, block_size=400, snr_samples=6, seed=5,
+                              store_gains=True, sketches=True)
+    result, stats = run_pipeline(config)
+    for buffers in [1, 4]:
+        other, _ = run_pipeline(config, buffers=buffers)
+        for name, values in result.columns().items():
+            np.testing.assert_array_equal(other.columns()[name], values)
+        np.testing.assert_array_equal(other.state['gains_primary'], result.state['gains_primary'])
+
+    # The last block, with fewer samples
+    rng = block_generator(config.seed, 6)
+    uniforms, normals = rng.random((100, 6)), rng.standard_normal((100, 4))
+    gains_primary, gains_secondary, _ = channel_gains(config, uniforms, normals)
+    np.testing.assert_array_equal(result.state['gains_primary'][2400:], gains_primary)
+    metrics = sample_metrics(config, gains_primary, gains_secondary, 10.0 ** (result.snr_dB / 10.0))
+    np.testing.assert_array_equal(result.state['block_sums']['avg_arate_usr1'][6],
+                                  metrics['avg_arate_usr1'].sum(axis=0))
+
+    assert result.samples == stats.samples == 2500
+    assert result.percentiles([50])['rate_usr1_p50'].shape == (6,)
+    throughput = stats.throughput()
+    assert list(throughput) == ['generate', 'channel', 'metrics', 'total']
+    assert all(rate > 0 for rate in throughput.values())
+    assert stats.wall_time >= stats.busy['channel'] + stats.busy['metrics']
+
+# Test that simulations without a seed are given one
+def test_pipeline_unseeded():
+    result, _ = run_pipeline(SimulationConfig(monte_carlo_samples=300))
+    assert result.config.seed is not None
+    assert result.samples == 300
+
+# Test that simulations which can't be pipelined are rejected
+@pytest.mark.parametrize('params', [
+    dict(shard='0/2'),
+    dict(sampler='sobol'),
+    dict(sampler='counter'),
+    dict(control_variates=True),
+])
+def test_pipeline_invalid(params):
+    with pytest.raises(ValueError):
+        run_pipeline(SimulationConfig(seed=1, **params))
+    with pytest.raises(ValueError):
+        run_pipeline(SimulationConfig(seed=1), buffers=0)
+
+# Test that errors in either stage are raised without leaving the producer blocked
+@pytest.mark.parametrize('stage', ['block_generator', 'channel_gains'])
+def test_pipeline_errors(monkeypatch, stage):
+    def fail(*args):
+        raise RuntimeError(stage)
+    monkeypatch.setattr(uavnoma.pipeline, stage, fail)
+    with pytest.raises(RuntimeError, match=stage):
+        run_pipeline(SimulationConfig(monte_carlo_samples=5000, block_size=100, seed=1))
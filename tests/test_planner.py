@@ -0,0 +1,78 @@
+import dataclasses
+import numpy as np
+import pytest
+from uavnoma.planner import plan, estimate_memory, format_bytes
+from uavnoma.simulation import SimulationConfig
+
+# Test that the estimates grow with the size of the simulation and are positive
+def test_plan_estimates():
+    small = plan(SimulationConfig(monte_carlo_samples=1000), calibrate=False)
+    large = plan(SimulationConfig(monte_carlo_samples=100000), calibrate=False)
+    assert 0 < small.peak_memory and 0 < small.wall_time < large.wall_time
+    assert small.samples == 1000 and large.samples == 100000
+    assert 1 <= small.chunk_size <= 1000 and small.workers >= 1
+    assert not small.exceeds_budget and small.warnings == []
+
+    # Samples drawn at once keep (samples x SNR values) matrices in memory
+    batch = SimulationConfig(monte_carlo_samples=64000, snr_samples=100, sampler='sobol')
+    assert estimate_memory(batch, 64000) > 64000 * 100 * 8
+    assert estimate_memory(SimulationConfig(monte_carlo_samples=64000, snr_samples=100), 64000) < 2 ** 20
+
+    # Sharded simulations only perform their own samples
+    shard = SimulationConfig(monte_carlo_samples=4000, seed=1, shard='1/4')
+    assert plan(shard, calibrate=False).samples == 1000
+
+# Test that the calibration doesn't change the state of the generator
+def test_plan_calibration():
+    np.random.seed(7)
+    expected = np.random.rand(3)
+    np.random.seed(7)
+    result = plan(SimulationConfig(monte_carlo_samples=200, seed=3, antithetic=True))
+    np.testing.assert_array_equal(np.random.rand(3), expected)
+    assert result.seconds_per_sample > 0
+
+    # Simulations with too many replicates for a short run use the typical time
+    for params in [dict(replicates=100000), dict(replicates=50000, antithetic=True)]:
+        config = SimulationConfig(monte_carlo_samples=100000, sampler='sobol', seed=3, **params)
+        assert plan(config).seconds_per_sample == plan(config, calibrate=False).seconds_per_sample
+    config = SimulationConfig(monte_carlo_samples=1000, sampler='sobol', replicates=500, antithetic=True)
+    assert plan(config).seconds_per_sample > 0
+
+# Test that simulations over the memory budget are refused, and warned about when close to it
+def test_plan_budget():
+    config = SimulationConfig(monte_carlo_samples=10000, snr_samples=50, control_variates=True)
+    memory = estimate_memory(config, 10000)
+    result = plan(config, memory_budget=memory - 1, calibrate=False)
+    assert result.exceeds_budget and len(result.warnings) == 1
+    result = plan(config, memory_budget=memory + 1, calibrate=False)
+    assert not result.exceeds_budget and len(result.warnings) == 1
+    result = plan(config, memory_budget=10 * memory, calibrate=False)
+    assert not result.exceeds_budget and result.warnings == []
+
+# Test that the buffers of the execution engines grow with their workers, threads or buffers
+def test_plan_engines():
+    config = SimulationConfig(monte_carlo_samples=100000, snr_samples=50, block_size=10000, seed=1)
+    serial = estimate_memory(config, 100000)
+    threads = [estimate_memory(config, 100000, engine='threads', parallelism=n) for n in [1, 10, 20]]
+    assert serial < threads[0] < threads[1] == threads[2]  # At most one thread per block
+    assert serial < estimate_memory(config, 100000, engine='parallel', parallelism=4)
+    assert (estimate_memory(config, 100000, engine='pipeline')
+            < estimate_memory(config, 100000, engine='pipeline', parallelism=8))
+
+    # Sketches are kept by each thread, with the metrics of each sample of its block
+    sketches = dataclasses.replace(config, sketches=True)
+    assert (estimate_memory(sketches, 100000, engine='threads', parallelism=4)
+            > 4 * 10000 * 50 * 8 + estimate_memory(sketches, 100000))
+    result = plan(sketches, memory_budget=estimate_memory(sketches, 100000) + 1, calibrate=False,
+                  engine='threads', parallelism=4)
+    assert result.exceeds_budget
+    with pytest.raises(ValueError):
+        plan(config, calibrate=False, engine='gpu')
+    with pytest.raises(ValueError):
+        plan(config, calibrate=False, engine='threads', parallelism=0)
+
+@pytest.mark.parametrize('size, expected', [
+    (512, '512.0 B'), (2048, '2.0 KiB'), (3 * 2 ** 20, '3.0 MiB'), (2 ** 40, '1.0 TiB'),
+])
+def test_format_bytes(size, expected):
+    assert format_bytes(size) == expected
@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from uavnoma.plotting import FigureTemplate, FigureRenderer, render, plot_format, file_basename
+from uavnoma.simulation import SimulationConfig, run_simulation
+
+# Results of two simulations, the second with outage 0 at the highest SNR values
+results = [run_simulation(SimulationConfig(seed=1, monte_carlo_samples=200, snr_samples=6)).columns(),
+           run_simulation(SimulationConfig(seed=2, monte_carlo_samples=100, snr_min=15, snr_max=80,
+                                           snr_samples=14, rician_factor=18)).columns()]
+
+# Test that a template shows the data of the last result, with the outage axis trimmed
+def test_template(tmp_path):
+    template = FigureTemplate()
+    for columns in results:
+        template.update(columns, title='scenario')
+    columns = results[1]
+    outage_lines = template.lines['outage']
+    np.testing.assert_array_equal(outage_lines[0].get_xdata(), columns['snr_dB'])
+    np.testing.assert_array_equal(outage_lines[1].get_ydata(), columns['p_outage_usr2'])
+    np.testing.assert_array_equal(template.lines['rate'][0].get_ydata(), columns['avg_arate_usr1'])
+    assert template.figures['outage'].axes[0].get_xlim()[1] < columns['snr_dB'][-1]
+    assert template.figures['rate'].axes[0].get_xlim() == (columns['snr_dB'][0], columns['snr_dB'][-1])
+    assert template.figures['rate'].axes[0].get_title() == 'scenario'
+
+    for file_format in ['png', 'svg', 'pdf']:
+        files = template.save(str(tmp_path / 'plot'), file_format)
+        assert files == [str(tmp_path / f'plot_outage.{file_format}'), str(tmp_path / f'plot_rate.{file_format}')]
+    assert (tmp_path / 'plot_rate.svg').read_text().count('<svg') == 1
+    assert (tmp_path / 'plot_rate.pdf').read_bytes().startswith(b'%PDF')
+    with pytest.raises(ValueError):
+        template.save(str(tmp_path / 'plot'), 'gif')
+
+# Test that a reused template renders the same images as a new one
+def test_template_reuse(tmp_path):
+    template = FigureTemplate()
+    template.update(results[0])
+    template.update(results[1])
+    reused = template.save(str(tmp_path / 'reused'))
+    template = FigureTemplate()
+    template.update(results[1])
+    new = template.save(str(tmp_path / 'new'))
+    for reused_file, new_file in zip(reused, new):
+        with open(reused_file, 'rb') as f1, open(new_file, 'rb') as f2:
+            assert f1.read() == f2.read()
+
+# Test that the renderer saves the figures of all results, in threads or processes
+@pytest.mark.parametrize('workers', [1, 2])
+def test_renderer(tmp_path, workers):
+    with FigureRenderer('png', workers) as renderer:
+        for i, columns in enumerate(results):
+            renderer.submit(columns, file_basename(str(tmp_path), f'scenario {i}'))
+        renderer.submit({'snr_dB': [10.0]}, str(tmp_path / 'invalid'))
+    assert sorted(renderer.files) == sorted(str(tmp_path / f'scenario_{i}_{name}.png')
+                                            for i in range(2) for name in ['outage', 'rate'])
+    assert list(renderer.failures) == [str(tmp_path / 'invalid')]
+    assert 'KeyError' in renderer.failures[str(tmp_path / 'invalid')]
+
+    render(results[1], str(tmp_path / 'direct'))
+    with open(tmp_path / 'scenario_1_outage.png', 'rb') as f1, open(tmp_path / 'direct_outage.png', 'rb') as f2:
+        assert f1.read() == f2.read()
+
+    with pytest.raises(ValueError):
+        FigureRenderer('gif')
+    with pytest.raises(ValueError):
+        FigureRenderer('png', workers=-1)
+
+# Test the format of figure files and their names
+def test_file_names():
+    assert plot_format('figures/plot.PDF') == 'pdf'
+    assert plot_format('plot.svg') == 'svg'
+    with pytest.raises(ValueError):
+        plot_format('plot')
+    assert file_basename('figures', 'los/k=18 dB') == 'figures/los_k_18_dB'
+
+# Test that figures are rendered without pyplot, so without a display
+def test_headless(tmp_path):
+    code = ("import sys; from uavnoma.plotting import render; "
+            "render({'snr_dB': [10.0, 20.0], 'p_outage_usr1': [0.5, 0.1], 'p_outage_usr2': [0.4, 0.0], "
+            "'avg_arate_usr1': [1.0, 2.0], 'avg_arate_usr2': [2.0, 4.0]}, sys.argv[1]); "
+            "assert 'matplotlib.pyplot' not in sys.modules")
+    subprocess.run([sys.executable, '-c', code, str(tmp_path / 'plot')], check=True,
+                   env=dict(os.environ, MPLBACKEND='TkAgg', DISPLAY=''))
+    assert (tmp_path / 'plot_outage.png').exists() and (tmp_path / 'plot_rate.png').exists()
@@ -0,0 +1,65 @@
+import asyncio
+import io
+import json
+import numpy as np
+import pytest
+from uavnoma.progress import ProgressLine, ProgressJSONLines, format_duration
+from uavnoma.simulation import SimulationConfig, run_simulation, simulate_async, new_state, simulate
+
+# Test that progress is reported after each chunk and doesn't change the results
+def test_progress_updates():
+    config = SimulationConfig(monte_carlo_samples=1000, seed=3, snr_samples=6)
+    updates = []
+    result = run_simulation(config, progress=updates.append, progress_every=300)
+    expected = run_simulation(config)
+    for name, values in expected.columns().items():
+        np.testing.assert_array_equal(result.columns()[name], values)
+
+    assert [update.samples_done for update in updates] == [300, 600, 900, 1000]
+    assert all(update.total_samples == 1000 for update in updates)
+    assert all(update.samples_per_second > 0 for update in updates)
+    assert updates[-1].fraction == 1.0 and updates[-1].eta == 0.0
+    np.testing.assert_array_equal(updates[-1].result.avg_arate_usr1, expected.avg_arate_usr1)
+
+    with pytest.raises(ValueError):
+        run_simulation(config, progress=updates.append, progress_every=0)
+
+# Test that the throughput of a resumed simulation only counts the samples performed after resuming
+def test_progress_resume():
+    config = SimulationConfig(monte_carlo_samples=1000, seed=3)
+    state = new_state(config)
+    simulate(config, state, samples=800)
+    updates = []
+    run_simulation(config, state, progress=updates.append, progress_every=500)
+    assert len(updates) == 1 and updates[0].samples_done == 1000
+    assert updates[0].samples_per_second == pytest.approx(200 / updates[0].elapsed)
+
+# Test that asynchronous simulations report their progress
+def test_progress_async():
+    config = SimulationConfig(monte_carlo_samples=500, seed=3)
+    updates = []
+    asyncio.run(simulate_async(config, chunk_size=200, progress=updates.append))
+    assert [update.samples_done for update in updates] == [200, 400, 500]
+
+# Test the progress line and the JSON lines
+def test_progress_reporters():
+    config = SimulationConfig(monte_carlo_samples=400, seed=3, snr_samples=4)
+    line, lines = io.StringIO(), io.StringIO()
+    show, write = ProgressLine(line), ProgressJSONLines(lines)
+    def progress(update):
+        show(update)
+        write(update)
+    result = run_simulation(config, progress=progress, progress_every=200)
+
+    assert line.getvalue().startswith('\r200/400 samples (50%)')
+    assert line.getvalue().endswith('\n') and '\r400/400 samples (100%)' in line.getvalue()
+    records = [json.loads(record) for record in lines.getvalue().splitlines()]
+    assert [record['samples_done'] for record in records] == [200, 400]
+    assert records[-1]['estimates']['avg_arate_usr2'] == result.avg_arate_usr2.tolist()
+    assert records[-1]['peak_rss'] is None or records[-1]['peak_rss'] > 0
+
+@pytest.mark.parametrize('seconds, expected', [
+    (None, '?'), (0, '0:00:00'), (59.6, '0:01:00'), (3725, '1:02:05'),
+])
+def test_format_duration(seconds, expected):
+    assert format_duration(seconds) == expected
@@ -0,0 +1,43 @@
+import pytest
+import numpy as np
+from uavnoma.qmc import *
+from statistics import NormalDist
+
+# Test that each coordinate of the points has exactly one point in each interval of length
+# 1 / num_points, with and without scrambling
+@pytest.mark.parametrize('scramble', [False, True])
+def test_sobol_stratified(scramble):
+    np.random.seed(1)
+    points = sobol(256, 12, scramble)
+    assert points.shape == (256, 12)
+    assert np.all((points > 0) & (points < 1))
+    for d in range(12):
+        assert len(np.unique(np.floor(points[:, d] * 256))) == 256
+
+# Test that scrambled points integrate a smooth function more accurately than random points
+def test_sobol_integration():
+    np.random.seed(2)
+    f = lambda x: np.prod(0.5 + x, axis=1)
+    error_sobol = np.mean([abs(f(sobol(1024, 6)).mean() - 1) for _ in range(10)])
+    error_random = np.mean([abs(f(np.random.rand(1024, 6)).mean() - 1) for _ in range(10)])
+    assert error_sobol < error_random / 5
+
+# Test that too many dimensions are rejected
+def test_sobol_dimensions():
+    with pytest.raises(ValueError):
+        sobol(16, 13)
+
+# Test the inverse normal distribution
+def test_normal_ppf():
+    np.testing.assert_allclose(normal_ppf([0.5, 0.975, 0.025]), [0, 1.959964, -1.959964], atol=1e-6)
+
+    # The central region, the tails and the far tails agree with the standard library
+    rng = np.random.default_rng(3)
+    u = np.concatenate([rng.random(10000), 10.0 ** -rng.uniform(1, 300, 1000),
+                        1.0 - 10.0 ** -rng.uniform(1, 15, 1000), [0.075, 0.925, 5e-324]])
+    expected = [NormalDist().inv_cdf(value) for value in u]
+    np.testing.assert_allclose(normal_ppf(u), expected, rtol=0, atol=1e-12)
+    assert normal_ppf(rng.random((5, 4))).shape == (5, 4)
+    for value in [0.0, 1.0, np.nan]:
+        with pytest.raises(ValueError):
+            normal_ppf([0.5, value])
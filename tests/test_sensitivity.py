@@ -0,0 +1,73 @@
+import copy
+from dataclasses import replace
+import numpy as np
+import pytest
+from uavnoma.sensitivity import sensitivities, sensitivity_params, default_steps
+from uavnoma.simulation import SimulationConfig, run_simulation, channel_gains, sample_metrics, metric_names
+
+config = SimulationConfig(monte_carlo_samples=2000, snr_samples=6, seed=3)
+
+# Test that the pathwise derivatives of the rates are those of the rates of the same samples
+@pytest.mark.parametrize('param', sensitivity_params)
+def test_pathwise_derivatives(param):
+    result = sensitivities(config, [param])
+    np.random.seed(config.seed)
+    uniforms = np.random.rand(config.monte_carlo_samples, 6)
+    normals = np.random.standard_normal((config.monte_carlo_samples, 4))
+    snr_linear = 10.0 ** (result.snr_dB / 10.0)
+    metrics = []
+    for step in [1e-6, -1e-6]:
+        perturbed = copy.copy(config)
+        setattr(perturbed, param, getattr(config, param) + step)
+        gains_primary, gains_secondary, _ = channel_gains(perturbed, uniforms, normals)
+        metrics.append(sample_metrics(perturbed, gains_primary, gains_secondary, snr_linear))
+    for name in ['avg_arate_sys', 'avg_arate_usr1', 'avg_arate_usr2']:
+        differences = (metrics[0][name] - metrics[1][name]) / 2e-6
+        np.testing.assert_allclose(result.derivative(name, param), differences.mean(axis=0), rtol=1e-4, atol=1e-8)
+        np.testing.assert_allclose(result.error(name, param), differences.std(axis=0, ddof=1) / np.sqrt(2000),
+                                   rtol=1e-3, atol=1e-8)
+
+# Test that the derivatives agree with those of simulations of perturbed configurations, and
+# that the outage derivatives are much more precise than differences of independent runs
+def test_sensitivities():
+    result = sensitivities(config)
+    assert result.params == sensitivity_params and result.steps == default_steps
+    for name in metric_names:
+        assert result.derivatives[name].shape == result.errors[name].shape == (5, 6)
+
+    # The gains don't depend on the impairments, so simulations with the same seed differ only
+    # by the impairments, but over other samples than the sensitivities
+    step = 0.01
+    up = run_simulation(replace(config, hardw_ip=config.hardw_ip + step))
+    down = run_simulation(replace(config, hardw_ip=config.hardw_ip - step))
+    for name in ['avg_arate_usr1', 'avg_arate_usr2']:
+        simulated = (getattr(up, name) - getattr(down, name)) / (2 * step)
+        assert np.all(np.abs(result.derivative(name, 'hardw_ip') - simulated)
+                      <= 5 * result.error(name, 'hardw_ip') + 0.02 * np.abs(simulated) + 1e-3)
+
+    # Outages increase with the path loss, and rates decrease with the hardware impairments
+    outage = result.derivative('p_outage_usr2', 'path_loss')
+    sn = np.argmax(outage)
+    assert outage[sn] > 5 * result.error('p_outage_usr2', 'path_loss')[sn]
+    assert np.all(result.derivative('avg_arate_sys', 'hardw_ip') < 0)
+    p = run_simulation(config).p_outage_usr2[sn]
+    independent_error = np.sqrt(2 * p * (1 - p) / 2000) / (2 * default_steps['path_loss'])
+    assert result.error('p_outage_usr2', 'path_loss')[sn] < independent_error / 2
+
+    # The imperfect SIC doesn't affect the primary user
+    assert np.all(result.derivative('avg_arate_usr1', 'sic_ip') == 0)
+    assert np.all(result.derivative('avg_arate_usr2', 'sic_ip') < 0)
+
+# Test the Jacobian table and the invalid arguments
+def test_sensitivity_table():
+    result = sensitivities(config, ['sic_ip', 'path_loss'], {'path_loss': 0.02})
+    assert result.steps == {'sic_ip': 0.01, 'path_loss': 0.02}
+    table = result.table()
+    assert table.num_rows == 6
+    assert len(table) == 1 + 2 * len(metric_names) * 2
+    np.testing.assert_array_equal(table['d_avg_arate_usr2_d_path_loss'], result.derivative('avg_arate_usr2', 'path_loss'))
+    np.testing.assert_array_equal(table['d_p_outage_sys_d_sic_ip_stderr'], result.error('p_outage_sys', 'sic_ip'))
+    with pytest.raises(ValueError):
+        sensitivities(config, ['radius_user'])
+    with pytest.raises(ValueError):
+        sensitivities(config, ['path_loss'], {'path_loss': 0})
@@ -0,0 +1,80 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+import pytest
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from uavnoma.server import SimulationServer
+from uavnoma.simulation import SimulationConfig, run_simulation
+
+@pytest.fixture
+def server():
+    server = SimulationServer(('127.0.0.1', 0), cache_size=4)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def post(server, request):
+    url = f'http://127.0.0.1:{server.server_address[1]}/simulate'
+    with urllib.request.urlopen(url, json.dumps(request).encode()) as response:
+        return json.loads(response.read())
+
+# Test that the served results are the same as those of a simulation, including those
+# evaluated over cached channel gains
+def test_server_results(server):
+    params = {'monte_carlo_samples': 300, 'seed': 5, 'snr_samples': 6}
+    for extra in [{}, {'power_coeff_primary': 0.7, 'power_coeff_secondary': 0.3},
+                  {'snr_min': 5, 'hardw_ip': 0.05}]:
+        response = post(server, dict(params, **extra))
+        result = run_simulation(SimulationConfig(**params, **extra))
+        assert response['samples'] == 300
+        for name, values in result.columns().items():
+            np.testing.assert_array_equal(response['columns'][name], values)
+    assert len(server.gains) == 1
+    assert len(server.results) == 3
+
+    response = post(server, dict(params, percentiles=[50]))
+    result = run_simulation(SimulationConfig(**params, sketches=True))
+    np.testing.assert_array_equal(response['percentiles']['rate_usr1_p50'],
+                                  result.percentiles([50])['rate_usr1_p50'])
+
+# Test that concurrent requests for the same configuration are simulated only once
+def test_server_coalesce(server):
+    params = {'monte_carlo_samples': 500, 'seed': 9}
+    with ThreadPoolExecutor(4) as executor:
+        responses = list(executor.map(lambda _: post(server, params), range(4)))
+    assert all(response == responses[0] for response in responses)
+    assert len(server.results) == 1 and len(server.gains) == 1
+
+# Test that invalid requests are rejected
+@pytest.mark.parametrize('request_body', [
+    {'monte_carlo_samples': 10},
+    {'unknown': 1},
+    {'percentiles': [101]},
+    {'percentiles': ['a']},
+    {'percentiles': 50},
+    {'seed': -1},
+    {'seed': 1.5},
+    {'monte_carlo_samples': 100.5, 'seed': 1},
+    [1, 2],
+])
+def test_server_invalid(server, request_body):
+    with pytest.raises(urllib.error.HTTPError) as e:
+        post(server, request_body)
+    assert e.value.code == 400
+    assert 'error' in json.loads(e.value.read())
+
+# Test that failed simulations get an error response, and that the server keeps serving
+def test_server_failure(server, monkeypatch):
+    def fail(config):
+        raise RuntimeError('out of memory')
+    monkeypatch.setattr(server, 'simulate', fail)
+    with pytest.raises(urllib.error.HTTPError) as e:
+        post(server, {'seed': 1})
+    assert e.value.code == 500
+    assert 'out of memory' in json.loads(e.value.read())['error']
+    monkeypatch.undo()
+    assert post(server, {'monte_carlo_samples': 100, 'seed': 1})['samples'] == 100
@@ -0,0 +1,247 @@
+import asyncio
+import os
+import pytest
+import numpy as np
+from dataclasses import replace
+from uavnoma.simulation import *
+
+# Test that the in-process simulation reproduces the canonical default results
+def test_run_simulation_defaults(request):
+    result = run_simulation(SimulationConfig(seed=123))
+    canonical = np.loadtxt(os.path.join(request.fspath.dirname, "defaults_seed123.csv"),
+                           delimiter=",", skiprows=1)
+    np.testing.assert_allclose(np.c_[tuple(result.columns().values())], canonical)
+    assert result.samples == 1000
+
+# Test that invalid configurations raise an error instead of exiting
+@pytest.mark.parametrize('params', [
+    {'monte_carlo_samples': 10},
+    {'rician_factor': 20.0},
+    {'power_coeff_primary': 0.1, 'power_coeff_secondary': 0.2},
+    {'shard': '0/2'},
+    {'shard': '2/2', 'seed': 123},
+    {'shard': 'one', 'seed': 123},
+    {'block_size': 0},
+    {'snr_samples': 0},
+    {'monte_carlo_samples': 100.5},
+    {'monte_carlo_samples': 1000.0},
+    {'snr_samples': True},
+    {'replicates': '8'},
+    {'seed': -1},
+    {'seed': 2 ** 32},
+    {'seed': 1.5},
+    {'seed': True},
+])
+def test_config_invalid(params):
+    with pytest.raises(ValueError):
+        SimulationConfig(**params)
+    with pytest.raises(ValueError):
+        replace(SimulationConfig(), **params)
+
+# Test that repeated runs in the same process give the same results, and that a configuration
+# is restored from its parameters
+def test_run_simulation_repeated():
+    config = SimulationConfig(monte_carlo_samples=300, snr_samples=5, seed=7)
+    first = run_simulation(config)
+    second = run_simulation(config)
+    for name in metric_names:
+        np.testing.assert_array_equal(getattr(first, name), getattr(second, name))
+    assert SimulationConfig.from_params(first.state['params']) == config
+
+# Test that merged shards give the same results as a single shard, and that extending a
+# simulation gives the same results as a single run with the total number of samples
+def test_merge_extend():
+    config = SimulationConfig(monte_carlo_samples=500, snr_samples=5, seed=7, block_size=100,
+                              sketches=True)
+    single = run_simulation(replace(config, shard='0/1'))
+    shards = [run_simulation(replace(config, shard=f'{i}/3')).state for i in range(3)]
+    merged_config, merged_state = merge_states(shards[::-1])
+    merged = SimulationResult(merged_config, merged_state)
+    for name in metric_names:
+        np.testing.assert_array_equal(getattr(merged, name), getattr(single, name))
+    np.testing.assert_array_equal(merged.percentiles([50])['rate_usr1_p50'],
+                                  single.percentiles([50])['rate_usr1_p50'])
+    with pytest.raises(ValueError):
+        merge_states(shards[:2])
+
+    config = SimulationConfig(monte_carlo_samples=300, snr_samples=6, seed=7, store_gains=True)
+    result = run_simulation(config)
+    extended_config = extend_state(config, result.state, 200, [70.0])
+    extended = run_simulation(extended_config, result.state)
+    full = run_simulation(replace(config, monte_carlo_samples=500, snr_max=70.0, snr_samples=7))
+    for name in metric_names:
+        np.testing.assert_allclose(getattr(extended, name), getattr(full, name))
+
+# Test that the metric kernel gives exactly the sums of the metrics of the samples, in tiles of
+# any size, and that evaluating stored channel gains gives the results of the simulation
+@pytest.mark.parametrize('tile_size', [None, 1, 7, 5000])
+def test_metric_kernel(tile_size):
+    config = SimulationConfig(monte_carlo_samples=1000, snr_samples=6, seed=2, hardw_ip=0.2,
+                              sic_ip=0.3, target_rate_secondary_user=1.0, store_gains=True)
+    result = run_simulation(config)
+    gains_primary, gains_secondary = result.state['gains_primary'], result.state['gains_secondary']
+    snr_linear = 10.0 ** (result.snr_dB / 10.0)
+    metrics = sample_metrics(config, gains_primary, gains_secondary, snr_linear)
+    kernel = MetricKernel(config, snr_linear, tile_size)
+    sums = kernel.sums(gains_primary, gains_secondary)
+    for m, name in enumerate(metric_names):
+        np.testing.assert_array_equal(sums[m], metrics[name].sum(axis=0))
+        np.testing.assert_array_equal(sums[m], result.state['sums'][name])
+
+    out = kernel.sums(gains_primary[:300], gains_secondary[:300])
+    assert kernel.sums(gains_primary[300:], gains_secondary[300:], out) is out
+    np.testing.assert_array_equal(out, sums)
+
+    evaluated = SimulationResult(config, evaluate_gains(config, gains_primary, gains_secondary,
+                                                        result.state['rng_state']))
+    for name in metric_names:
+        np.testing.assert_array_equal(getattr(evaluated, name), getattr(result, name))
+
+# Test that asynchronous simulations running concurrently in chunks give the same results as
+# synchronous ones, with partial results after each chunk, without using the global generator
+def test_simulate_async():
+    configs = [SimulationConfig(monte_carlo_samples=500, snr_samples=5, seed=3, store_gains=True),
+               SimulationConfig(monte_carlo_samples=500, snr_samples=5, seed=4, shard='0/1',
+                                block_size=150, sketches=True),
+               SimulationConfig(monte_carlo_samples=512, snr_samples=5, seed=5, sampler='sobol',
+                                replicates=4)]
+    expected = [run_simulation(config) for config in configs]
+    rng_state = np.random.get_state()
+
+    async def run():
+        results = await asyncio.gather(*[simulate_async(config, chunk_size=120) for config in configs])
+        partial = [result.samples async for result in iter_simulation(configs[0], chunk_size=200)]
+        return results, partial
+    results, partial = asyncio.run(run())
+    np.testing.assert_array_equal(np.random.get_state()[1], rng_state[1])
+
+    for result, result_expected in zip(results, expected):
+        for name in metric_names:
+            np.testing.assert_array_equal(getattr(result, name), getattr(result_expected, name))
+    np.testing.assert_array_equal(results[0].state['gains_primary'],
+                                  expected[0].state['gains_primary'])
+    assert partial == [200, 400, 500]
+
+# Test that an asynchronous simulation is cancelled when it times out, without changing its
+# state after the timeout, and that a simulation without samples gives a result
+def test_simulate_async_timeout():
+    config = SimulationConfig(monte_carlo_samples=100000, seed=3)
+    state = seeded_state(config)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(simulate_async(config, state, chunk_size=100, timeout=0.1))
+    # The chunk being performed has finished when the event loop is closed
+    assert state['samples_done'] == 0
+    assert not any(sums.any() for sums in state['sums'].values())
+
+    result = asyncio.run(simulate_async(SimulationConfig(seed=1, shard='0/2')))
+    assert result.samples == 0
+    assert np.all(np.isnan(result.avg_arate_sys))
+
+# Test that the sobol sampler is reproducible, estimates standard errors which are consistent
+# with the error of the averages, and is saved and loaded from checkpoints
+def test_sobol_sampler(tmp_path):
+    config = SimulationConfig(monte_carlo_samples=1024, snr_samples=6, seed=3, sampler='sobol')
+    result = run_simulation(config)
+    np.testing.assert_array_equal(result.avg_arate_usr1, run_simulation(config).avg_arate_usr1)
+    reference = run_simulation(replace(config, monte_carlo_samples=16384, seed=4))
+    errors = result.standard_errors()
+    assert np.all(np.abs(result.avg_arate_usr1 - reference.avg_arate_usr1)
+                  < 5 * errors['avg_arate_usr1'] + 1e-6)
+
+    checkpoint = str(tmp_path / 'sobol.npz')
+    run_simulation(config, checkpoint=checkpoint)
+    loaded_config, state = load_state(checkpoint)
+    assert loaded_config == config
+    np.testing.assert_array_equal(SimulationResult(loaded_config, state).standard_errors()['p_outage_usr1'],
+                                  errors['p_outage_usr1'])
+    with pytest.raises(ValueError):
+        extend_state(config, state, 1024)
+
+# Test the invalid configurations of the sobol sampler
+@pytest.mark.parametrize('params', [
+    {'sampler': 'halton'},
+    {'sampler': 'sobol', 'monte_carlo_samples': 1000, 'replicates': 16},
+    {'sampler': 'sobol', 'seed': 1, 'shard': '0/2'},
+    {'replicates': 0},
+])
+def test_sobol_invalid(params):
+    with pytest.raises(ValueError):
+        SimulationConfig(**params)
+
+# Test that any range of samples of the counter sampler can be generated again, and that sharded
+# simulations draw the same samples as non-sharded ones
+@pytest.mark.parametrize('params', [
+    {},
+    {'antithetic': True, 'control_variates': True},
+])
+def test_counter_sampler(params):
+    config = SimulationConfig(monte_carlo_samples=1000, snr_samples=6, seed=4, sampler='counter',
+                              store_gains=True, **params)
+    result = run_simulation(config)
+    for first, last in [(0, 1000), (731, 747), (3, 4), (500, 500)]:
+        gains_primary, gains_secondary = sample_gains(config, first, last)
+        np.testing.assert_array_equal(gains_primary, result.state['gains_primary'][first:last])
+        np.testing.assert_array_equal(gains_secondary, result.state['gains_secondary'][first:last])
+    with pytest.raises(ValueError):
+        sample_gains(config, 900, 1100)
+    with pytest.raises(ValueError):
+        sample_gains(replace(config, sampler='random'), 0, 10)
+    if config.antithetic:
+        return
+
+    shard = run_simulation(replace(config, shard='1/3', block_size=200))
+    first, last = sample_range(shard.config)
+    np.testing.assert_array_equal(shard.state['gains_primary'], result.state['gains_primary'][first:last])
+    extended = run_simulation(replace(config, monte_carlo_samples=600))
+    extended = run_simulation(config, extended.state)
+    np.testing.assert_array_equal(extended.state['gains_primary'], result.state['gains_primary'])
+    with pytest.raises(ValueError):
+        SimulationConfig(sampler='counter')
+
+# Test that the control variates have the expected values, and that antithetic samples are
+# mirror images of each other
+def test_control_means():
+    np.random.seed(6)
+    config = SimulationConfig(monte_carlo_samples=100000, antithetic=True)
+    gains_primary, gains_secondary, controls = batch_gains(config)
+    np.testing.assert_allclose(controls.mean(axis=0), control_means(config), rtol=0.01)
+    uniforms = np.random.rand(3, 6)
+    normals = np.random.standard_normal((3, 4))
+    direct = channel_gains(config, uniforms, normals)[2]
+    mirrored = channel_gains(config, 1 - uniforms, -normals)[2]
+    s, sigma = fading_rician(config.rician_factor, config.power_los)
+    np.testing.assert_allclose(np.sqrt(direct[:, 2:]) + np.sqrt(mirrored[:, 2:]), 2 * s)
+    assert not np.allclose(direct[:, :2], mirrored[:, :2])
+
+# Test that antithetic and control variates give averages consistent with plain sampling,
+# with variance reduction factors greater than one for the achievable rates, which are saved
+# in checkpoints
+@pytest.mark.parametrize('params', [
+    {'antithetic': True},
+    {'control_variates': True},
+    {'antithetic': True, 'control_variates': True},
+])
+def test_variance_reduction(tmp_path, params):
+    config = SimulationConfig(monte_carlo_samples=4000, snr_samples=6, seed=8, **params)
+    checkpoint = str(tmp_path / 'state.npz')
+    result = run_simulation(config, checkpoint=checkpoint)
+    reference = run_simulation(SimulationConfig(monte_carlo_samples=64000, snr_samples=6, seed=9))
+    np.testing.assert_allclose(result.avg_arate_usr1, reference.avg_arate_usr1, rtol=0.01, atol=1e-4)
+    factors = result.variance_reduction()
+    assert np.all(factors['avg_arate_usr1'] > 1) and np.all(factors['avg_arate_usr2'] > 1)
+
+    loaded_config, state = load_state(checkpoint)
+    assert loaded_config == config
+    np.testing.assert_array_equal(state['variance_reduction']['avg_arate_sys'], factors['avg_arate_sys'])
+    with pytest.raises(ValueError):
+        run_simulation(SimulationConfig(monte_carlo_samples=100)).variance_reduction()
+
+# Test the invalid configurations of antithetic and control variates
+@pytest.mark.parametrize('params', [
+    {'antithetic': True, 'monte_carlo_samples': 101},
+    {'antithetic': True, 'sampler': 'sobol', 'monte_carlo_samples': 1000, 'replicates': 8},
+    {'control_variates': True, 'seed': 1, 'shard': '0/2'},
+])
+def test_variance_reduction_invalid(params):
+    with pytest.raises(ValueError):
+        SimulationConfig(**params)
@@ -0,0 +1,53 @@
+import pytest
+import numpy as np
+from uavnoma.sketches import *
+
+# Samples of 3 series with different scales, including some zeros
+np.random.seed(123)
+samples = np.random.lognormal(mean=[-4.0, 0.0, 2.0], sigma=1.5, size=(5000, 3))
+samples[:10, 0] = 0
+
+# Test that the estimated quantiles are within the relative accuracy of the exact ones
+@pytest.mark.parametrize("q", [0.05, 0.25, 0.5, 0.9, 0.99])
+def test_quantile_accuracy(q):
+    sketch = QuantileSketch(3, relative_accuracy=0.01)
+    sketch.add(samples)
+    exact = np.quantile(samples, q, axis=0, method='lower')
+    np.testing.assert_allclose(sketch.quantile(q), exact, rtol=0.01)
+
+# Test that values below the tracked range are reported as zero, and empty series as NaN
+def test_quantile_low_values():
+    sketch = QuantileSketch(2)
+    sketch.add(np.array([0.0, 1.0]))
+    sketch.add(np.array([1e-15, 1.0]))
+    assert sketch.quantile(0.5)[0] == 0
+    assert np.isnan(QuantileSketch(1).quantile(0.5)[0])
+
+# Test that sketches built over separate chunks merge into the sketch of all samples
+@pytest.mark.parametrize("sketch_type", [
+    lambda: QuantileSketch(3),
+    lambda: LogHistogram(3, -8, 4, 120),
+])
+def test_merge(sketch_type):
+    whole = sketch_type()
+    whole.add(samples)
+    merged = sketch_type()
+    for chunk in np.array_split(samples, 7):
+        part = sketch_type()
+        for row in chunk:
+            part.add(row)
+        merged.merge(part)
+    np.testing.assert_array_equal(merged.counts, whole.counts)
+
+# Test that the CDF of the histogram matches the empirical CDF at the bin edges
+def test_histogram_cdf():
+    histogram = LogHistogram(3, -8, 4, 120)
+    histogram.add(samples)
+    edges = histogram.edges()
+    assert len(edges) == 121
+    cdf = histogram.cdf()
+    assert cdf.shape == (3, 121)
+    for i in range(3):
+        empirical = (samples[:, i][:, None] < edges).mean(axis=0)
+        np.testing.assert_allclose(cdf[i], empirical, atol=1e-12)
+    assert np.all(np.diff(cdf, axis=1) >= 0)
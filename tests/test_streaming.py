@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+import numpy as np
+import pytest
+from uavnoma.simulation import SimulationConfig, run_simulation, load_state, sample_metrics
+from uavnoma.streaming import RowStream, RowsCSV, RowsJSONLines
+
+# Test that the rows of each update have the running estimates, and that the confidence
+# intervals from the batch means match those of the samples
+def test_row_stream():
+    config = SimulationConfig(monte_carlo_samples=20000, snr_samples=4, seed=2, store_gains=True)
+    updates = []
+    result = run_simulation(config, progress=RowStream(updates.append), progress_every=500)
+    assert len(updates) == 40
+    assert all(len(rows) == 4 for rows in updates)
+    assert [row['samples'] for row in updates[3]] == [2000] * 4
+    assert np.isnan(updates[0][0]['avg_arate_usr1_ci'])
+    assert not any(row['final'] for rows in updates[:-1] for row in rows)
+
+    final = updates[-1]
+    assert all(row['final'] for row in final)
+    np.testing.assert_array_equal([row['avg_arate_usr2'] for row in final], result.avg_arate_usr2)
+    metrics = sample_metrics(config, result.state['gains_primary'], result.state['gains_secondary'],
+                             10.0 ** (result.snr_dB / 10.0))
+    for name in ['avg_arate_usr1', 'avg_arate_usr2', 'p_outage_sys']:
+        exact = 1.96 * metrics[name].std(axis=0, ddof=1) / np.sqrt(config.monte_carlo_samples)
+        np.testing.assert_allclose([row[name + '_ci'] for row in final], exact, rtol=0.3, atol=1e-9)
+
+# Test that the rows are finalized as they converge, that the simulation stops when all are
+# final, and that it can be resumed from its checkpoint
+def test_row_stream_tolerance(tmp_path):
+    config = SimulationConfig(monte_carlo_samples=20000, snr_samples=3, snr_max=30, seed=4)
+    checkpoint = str(tmp_path / 'state.npz')
+    updates = []
+    stream = RowStream(updates.append, tolerance=0.05, min_batches=4)
+    result = run_simulation(config, checkpoint=checkpoint, progress=stream, progress_every=1000)
+    assert result.samples < config.monte_carlo_samples
+    final = {row['snr_dB']: row for rows in updates for row in rows if row['final']}
+    assert sorted(final) == list(result.snr_dB)
+    assert all(row['samples'] >= 4000 for row in final.values())
+    for rows in updates:
+        for row in rows:
+            assert row['samples'] <= final[row['snr_dB']]['samples']
+
+    loaded_config, state = load_state(checkpoint)
+    assert state['samples_done'] == result.samples
+    resumed = run_simulation(loaded_config, state)
+    np.testing.assert_array_equal(resumed.avg_arate_usr1, run_simulation(config).avg_arate_usr1)
+
+# Test the CSV and JSON lines outputs, with unknown confidence intervals
+def test_row_outputs():
+    rows = [{'samples': 100, 'snr_dB': 10.0, 'final': False, 'avg_arate_usr1': 0.5,
+             'avg_arate_usr1_ci': float('nan')}]
+    text = io.StringIO()
+    output = RowsCSV(text)
+    output(rows)
+    output(rows)
+    lines = list(csv.DictReader(io.StringIO(text.getvalue())))
+    assert len(lines) == 2
+    assert lines[0]['avg_arate_usr1'] == '0.5' and lines[0]['avg_arate_usr1_ci'] == ''
+
+    text = io.StringIO()
+    RowsJSONLines(text)(rows)
+    assert json.loads(text.getvalue()) == dict(rows[0], avg_arate_usr1_ci=None)
+
+# Test the invalid parameters of the stream
+@pytest.mark.parametrize('params', [
+    {'tolerance': 0},
+    {'confidence': 1.0},
+    {'min_batches': 1},
+])
+def test_row_stream_invalid(params):
+    with pytest.raises(ValueError):
+        RowStream(print, **params)
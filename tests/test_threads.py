@@ -0,0 +1,88 @@
+import dataclasses
+import threading
+import numpy as np
+import pytest
+import uavnoma.threads
+from uavnoma.threads import run_threads, thread_generator
+from uavnoma.simulation import SimulationConfig, channel_gains, sample_metrics
+
+config = SimulationConfig(monte_carlo_samples=2500, block_size=400, snr_samples=6, seed=5,
+                          store_gains=True, sketches=True)
+
+# Test that the results only depend on the seed, the block size and the number of threads, and
+# that each thread draws its blocks from its own generator
+def test_threads_deterministic():
+    result = run_threads(config, threads=3)
+    other = run_threads(config, threads=3)
+    for name, values in result.columns().items():
+        np.testing.assert_array_equal(other.columns()[name], values)
+    np.testing.assert_array_equal(other.state['gains_primary'], result.state['gains_primary'])
+    assert not np.array_equal(run_threads(config, threads=2).state['gains_primary'],
+                              result.state['gains_primary'])
+
+    # The last thread performs the blocks 4 to 6, the last one with fewer samples
+    rng = thread_generator(config.seed, 2, 3)
+    for block, size in [(4, 400), (5, 400), (6, 100)]:
+        uniforms, normals = rng.random((size, 6)), rng.standard_normal((size, 4))
+        gains_primary, gains_secondary, _ = channel_gains(config, uniforms, normals)
+        np.testing.assert_array_equal(result.state['gains_primary'][block * 400:block * 400 + size], gains_primary)
+    metrics = sample_metrics(config, gains_primary, gains_secondary, 10.0 ** (result.snr_dB / 10.0))
+    np.testing.assert_array_equal(result.state['block_sums']['avg_arate_usr1'][6],
+                                  metrics['avg_arate_usr1'].sum(axis=0))
+
+    assert result.samples == 2500
+    assert result.state['sketches']['hist_gain_usr1'].counts.sum() == 2500
+    assert result.percentiles([50])['rate_usr1_p50'].shape == (6,)
+
+# Test that the sums of the kernel, without sketches, are those of the metrics of the samples
+def test_threads_kernel():
+    result = run_threads(config, threads=2)
+    kernel = run_threads(dataclasses.replace(config, sketches=False), threads=2)
+    for name, values in result.columns().items():
+        np.testing.assert_allclose(kernel.columns()[name], values, rtol=1e-12)
+
+# Test that simulations run at once in several threads don't share any state, not even the
+# global generator, and that simulations without a seed are given one
+def test_threads_concurrent():
+    state = np.random.get_state()
+    expected = [run_threads(SimulationConfig(monte_carlo_samples=3000, seed=seed), threads=2)
+                for seed in range(4)]
+    results = [None] * 4
+    def run(seed):
+        results[seed] = run_threads(SimulationConfig(monte_carlo_samples=3000, seed=seed), threads=2)
+    hosts = [threading.Thread(target=run, args=(seed,)) for seed in range(4)]
+    for host in hosts:
+        host.start()
+    for host in hosts:
+        host.join()
+    for result, other in zip(results, expected):
+        np.testing.assert_array_equal(result.avg_arate_sys, other.avg_arate_sys)
+    np.testing.assert_array_equal(np.random.get_state()[1], state[1])
+
+    result = run_threads(SimulationConfig(monte_carlo_samples=300), threads=8)
+    assert result.config.seed is not None
+    assert result.samples == 300
+
+# Test that simulations which can't be run in threads are rejected
+@pytest.mark.parametrize('params', [
+    dict(shard='0/2'),
+    dict(sampler='sobol'),
+    dict(sampler='counter'),
+    dict(antithetic=True),
+])
+def test_threads_invalid(params):
+    with pytest.raises(ValueError):
+        run_threads(SimulationConfig(seed=1, **params))
+    with pytest.raises(ValueError):
+        run_threads(SimulationConfig(seed=1), threads=-1)
+
+# Test that errors in a thread are raised, stopping the other threads
+def test_threads_errors(monkeypatch):
+    calls = []
+    def fail(*args):
+        calls.append(args)
+        raise RuntimeError('channel')
+    monkeypatch.setattr(uavnoma.threads, 'channel_gains', fail)
+    with pytest.raises(RuntimeError, match='channel'):
+        run_threads(SimulationConfig(monte_carlo_samples=5000, block_size=100, seed=1), threads=2)
+    assert len(calls) <= 2
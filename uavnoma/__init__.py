@@ -6,6 +6,8 @@
    .. include:: ../doc/documentation.md
 """
 
+from .generate_values import seed_stream
+from .generate_values import sample_generator
 from .generate_values import fading_rician
 from .generate_values import random_position_uav
 from .generate_values import random_position_users
@@ -14,7 +16,33 @@ from .performance_metrics import calculate_instantaneous_rate_primary
 from .performance_metrics import calculate_instantaneous_rate_secondary
 from .performance_metrics import average_rate
 from .performance_metrics import outage_probability
+from .checkpoint import save_checkpoint
+from .checkpoint import load_checkpoint
+from .sketches import LogHistogram
+from .sketches import QuantileSketch
+from .simulation import SimulationConfig
+from .simulation import SimulationResult
+from .output import ResultTable
+from .simulation import run_simulation
+from .simulation import simulate_async
+from .simulation import iter_simulation
+
+# The execution engines and the planner are only imported when used
+lazy_imports = {
+    'run_parallel': 'parallel',
+    'run_pipeline': 'pipeline',
+    'run_threads': 'threads',
+    'Plan': 'planner',
+    'plan': 'planner',
+}
+
+def __getattr__(name):
+    if name in lazy_imports:
+        import importlib
+        return getattr(importlib.import_module(f'.{lazy_imports[name]}', __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __pdoc__ = {}
+__pdoc__["lazy_imports"] = False
 __pdoc__["command_line.main"] = False
 __pdoc__["command_line.validate"] = False
\ No newline at end of file
@@ -0,0 +1,279 @@
+"""
+    This module contains the batch runner, which performs many simulation scenarios read from a
+    single file, scheduled across a pool of worker processes, and consolidates their results.
+
+    Scenario files are CSV, JSON or YAML (which requires the optional `pyyaml` package) tables
+    with a scenario per row and a column per parameter of a `uavnoma.SimulationConfig`, with
+    either the parameter names (`rician_factor`) or the command line options (`--rician-factor`).
+    Missing or empty parameters take their default values. The optional `scenario` column is the
+    ID of each scenario, by default its row number starting at 1. For example:
+
+    ```
+    scenario,rician_factor,path_loss,power_coeff_primary,power_coeff_secondary,seed
+    los,18,2.0,0.8,0.2,1
+    nlos,10,3.0,0.7,0.3,1
+    ```
+
+    JSON and YAML files are a list of objects with the parameters of each scenario, or an object
+    mapping the ID of each scenario to its parameters.
+
+    All scenarios are validated before any is run. Then the longest ones are scheduled first, so
+    that the workers finish at about the same time, and each worker process keeps the package
+    imported between its scenarios. A scenario which fails is retried without blocking the
+    others. If a worker process dies (e.g. killed for lack of memory), the pool is replaced, and
+    the scenarios which were pending in it are performed again, each counting as an attempt.
+"""
+
+import csv
+import dataclasses
+import json
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, BrokenExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from .planner import typical_time
+from .simulation import SimulationConfig, run_simulation
+
+scenario_formats = ['csv', 'json', 'yaml']
+
+
+def scenario_format(filename):
+    """Returns the format of a scenario file from its extension.
+    """
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    file_format = 'yaml' if extension == 'yml' else extension
+    if file_format not in scenario_formats:
+        raise ValueError(f"unknown scenario file format '{extension}', "
+                         f"it must be one of {', '.join(scenario_formats)}")
+    return file_format
+
+
+def read_scenarios(filename):
+    """Reads the rows of a scenario file, without validating them.
+
+    Return:
+
+        rows -- list of tuples with the ID of each scenario and a dictionary with its parameters.
+    """
+    file_format = scenario_format(filename)
+    if file_format == 'csv':
+        with open(filename, newline='') as fh:
+            table = [{name: value for name, value in row.items() if value not in ('', None)}
+                     for row in csv.DictReader(fh)]
+    elif file_format == 'json':
+        with open(filename) as fh:
+            table = json.load(fh)
+    else:
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("YAML scenario files require the pyyaml package")
+        with open(filename) as fh:
+            table = yaml.safe_load(fh)
+
+    if isinstance(table, dict):
+        rows = [(str(scenario), params) for scenario, params in table.items()]
+    elif isinstance(table, list):
+        rows = []
+        for index, params in enumerate(table):
+            params = dict(params) if isinstance(params, dict) else params
+            scenario = params.pop('scenario', index + 1) if isinstance(params, dict) else index + 1
+            rows.append((str(scenario), params))
+    else:
+        raise ValueError("the scenarios must be a list of rows or a mapping of IDs to parameters")
+    return rows
+
+
+def parse_params(params):
+    """Converts the parameters of a scenario, possibly strings read from a CSV file and named
+    as command line options, to the arguments of a `SimulationConfig`.
+    """
+    if not isinstance(params, dict):
+        raise ValueError("the parameters of a scenario must be a mapping")
+    fields = {field.name: field.type for field in dataclasses.fields(SimulationConfig)}
+    arguments = {}
+    for name, value in params.items():
+        name = str(name).strip().lstrip('-').replace('-', '_')
+        if name not in fields:
+            raise ValueError(f"unknown parameter '{name}'")
+        field_type = fields[name]
+        if typing.get_origin(field_type) is typing.Union:
+            if value is None:
+                arguments[name] = None
+                continue
+            field_type = typing.get_args(field_type)[0]
+        try:
+            arguments[name] = convert(value, field_type)
+        except ValueError:
+            raise ValueError(f"invalid value '{value}' of parameter '{name}', "
+                             f"it must be of type {field_type.__name__}")
+    return arguments
+
+
+def convert(value, field_type):
+    """Converts the value of a parameter to its type, raising `ValueError` if it is invalid.
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        if field_type is bool:
+            if value.lower() not in ('true', 'false', '1', '0', 'yes', 'no'):
+                raise ValueError(value)
+            return value.lower() in ('true', '1', 'yes')
+        if field_type is int:
+            number = float(value)
+            if not number.is_integer():
+                raise ValueError(value)
+            return int(number)
+        if field_type is float:
+            return float(value)
+        return value
+    if isinstance(value, bool) != (field_type is bool):
+        raise ValueError(value)
+    if field_type is int and not isinstance(value, int):
+        raise ValueError(value)
+    if field_type is float and not isinstance(value, (int, float)):
+        raise ValueError(value)
+    if field_type is str and not isinstance(value, str):
+        raise ValueError(value)
+    return value
+
+
+def load_scenarios(filename):
+    """Reads and validates the scenarios of a file.
+
+    Return:
+
+        scenarios -- dictionary with the `SimulationConfig` of each scenario, by ID, in the
+        order of the file.
+
+    Raises `ValueError` listing all the invalid scenarios, if any.
+    """
+    scenarios = {}
+    errors = []
+    for scenario, params in read_scenarios(filename):
+        try:
+            if scenario in scenarios:
+                raise ValueError("duplicated scenario ID")
+            scenarios[scenario] = SimulationConfig(**parse_params(params))
+        except (ValueError, TypeError) as e:
+            errors.append(f"scenario {scenario}: {e}")
+    if errors:
+        raise ValueError('\n'.join(errors))
+    return scenarios
+
+
+def expected_time(config):
+    """Returns the expected relative duration of a scenario, used to schedule the longest first.
+    """
+    return typical_time(config) * config.monte_carlo_samples
+
+
+def run_batch(scenarios, workers=None, retries=1, callback=None):
+    """Performs the simulations of many scenarios in a pool of worker processes, the longest
+    first, retrying those which fail.
+
+    Arguments:
+
+        scenarios -- dictionary with the `SimulationConfig` of each scenario, by ID.
+
+        workers -- number of worker processes, by default the number of CPUs. With 1 worker, the
+        scenarios are performed in a thread of the current process.
+
+        retries -- number of times a failed scenario is performed again. The scenarios pending
+        in the pool when a worker process dies count as failed attempts.
+
+        callback -- function called with the ID of each scenario, its `SimulationResult` (or
+        `None` if it failed) and its error message (or `None`) as each one finishes, or `None`.
+
+    Return:
+
+        results -- dictionary with the `SimulationResult` of each successful scenario, by ID,
+        in the order of `scenarios`.
+
+        failures -- dictionary with the error message of each failed scenario, by ID.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("Number of workers must be (value >= 1)")
+    if retries < 0:
+        raise ValueError("Number of retries must be (value >= 0)")
+
+    order = sorted(scenarios, key=lambda scenario: expected_time(scenarios[scenario]), reverse=True)
+    attempts = dict.fromkeys(scenarios, 0)
+    results, failures = {}, {}
+    queued = list(order)
+    pending = {}
+    executor = create_executor(workers, len(scenarios))
+    try:
+        while queued or pending:
+            try:
+                while queued:
+                    pending[executor.submit(run_simulation, scenarios[queued[0]])] = (queued[0], executor)
+                    queued.pop(0)
+            except BrokenExecutor:
+                # A worker died since the last scenarios finished; the pending ones fail below
+                executor = replace_executor(executor, workers, len(scenarios))
+                continue
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                scenario, future_executor = pending.pop(future)
+                attempts[scenario] += 1
+                try:
+                    results[scenario] = future.result()
+                except Exception as e:
+                    # All the scenarios pending in a broken pool fail, and are retried in a new one
+                    if isinstance(e, BrokenExecutor) and future_executor is executor:
+                        executor = replace_executor(executor, workers, len(scenarios))
+                    if attempts[scenario] <= retries:
+                        queued.append(scenario)
+                        continue
+                    failures[scenario] = f"{type(e).__name__}: {e}"
+                if callback is not None:
+                    callback(scenario, results.get(scenario), failures.get(scenario))
+    finally:
+        executor.shutdown()
+    results = {scenario: results[scenario] for scenario in scenarios if scenario in results}
+    return results, failures
+
+
+def create_executor(workers, num_scenarios):
+    """Returns the pool which performs the scenarios: a thread with 1 worker, otherwise a pool
+    of worker processes.
+    """
+    if workers == 1:
+        return ThreadPoolExecutor(1)
+    return ProcessPoolExecutor(min(workers, max(num_scenarios, 1)), initializer=init_worker)
+
+
+def replace_executor(executor, workers, num_scenarios):
+    """Shuts down a broken pool and returns a new one.
+    """
+    executor.shutdown(wait=False)
+    return create_executor(workers, num_scenarios)
+
+
+def init_worker():
+    """Initializes a worker process. Worker processes may be forked with the state of the
+    global generator of the parent, so it is seeded anew, otherwise scenarios without a seed
+    would draw the same values in all workers.
+    """
+    np.random.seed()
+
+
+def consolidate(results):
+    """Returns the results of many scenarios as a single table, with the results columns of
+    each scenario (see `uavnoma.SimulationResult.columns()`) preceded by a `scenario` column.
+    """
+    columns = {'scenario': []}
+    if not results:
+        return {'scenario': np.array([], dtype=str)}
+    for scenario, result in results.items():
+        scenario_columns = result.columns()
+        columns['scenario'] += [scenario] * len(result.snr_dB)
+        for name, values in scenario_columns.items():
+            columns.setdefault(name, []).append(values)
+    for name, values in columns.items():
+        columns[name] = np.array(values) if name == 'scenario' else np.concatenate(values)
+    return columns
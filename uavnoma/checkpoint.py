@@ -0,0 +1,117 @@
+"""
+    This module contains functions to save and load the state of a simulation, so that long
+    runs can be checkpointed periodically and resumed later.
+"""
+
+import json
+import os
+import numpy as np
+
+def save_checkpoint(filename, state):
+    """Saves the state of a simulation to a compressed NumPy (`.npz`) file.
+
+    The file is first written to a temporary file and then renamed, so an existing checkpoint
+    is never left half-written if the process is killed while saving.
+
+    Arguments:
+
+        filename -- name of the checkpoint file.
+
+        state -- dictionary with the simulation state, containing the keys:
+
+            `params` -- dictionary with the simulation parameters.
+
+            `samples_done` -- number of Monte Carlo samples already performed.
+
+            `snr_dB` -- SNR values in dB.
+
+            `sums` -- dictionary with the accumulated sum of each metric for each SNR value.
+
+            `rng_state` -- state of the pseudo-random number generator, as returned by
+            `np.random.get_state()`.
+
+            `gains_primary`, `gains_secondary` -- channel gains of the primary and secondary
+            users for each sample done, or `None` if they are not stored.
+
+            `block_sums` -- dictionary with the sums of each metric for each block of samples
+            and SNR value, or `None` if the samples are not split into blocks.
+
+            `sketches` -- dictionary with the distribution sketches (see `uavnoma.sketches`),
+            or `None` if they are not tracked. Only their counts are saved.
+
+            `variance_reduction` -- dictionary with the variance reduction factor of each
+            metric for each SNR value, or `None`.
+    """
+    rng_name, rng_keys, rng_pos, rng_has_gauss, rng_cached_gaussian = state["rng_state"]
+
+    data = {
+        "params": np.array(json.dumps(state["params"])),
+        "samples_done": np.array(state["samples_done"]),
+        "snr_dB": np.asarray(state["snr_dB"]),
+        "rng_name": np.array(rng_name),
+        "rng_keys": np.asarray(rng_keys),
+        "rng_pos": np.array(rng_pos),
+        "rng_has_gauss": np.array(rng_has_gauss),
+        "rng_cached_gaussian": np.array(rng_cached_gaussian),
+    }
+    for name, values in state["sums"].items():
+        data["sum_" + name] = np.asarray(values)
+    if state.get("gains_primary") is not None:
+        data["gains_primary"] = np.asarray(state["gains_primary"])[:state["samples_done"]]
+        data["gains_secondary"] = np.asarray(state["gains_secondary"])[:state["samples_done"]]
+    if state.get("block_sums") is not None:
+        for name, values in state["block_sums"].items():
+            data["block_" + name] = np.asarray(values)
+    if state.get("sketches") is not None:
+        for name, sketch in state["sketches"].items():
+            data["sketch_" + name] = sketch.counts
+    if state.get("variance_reduction") is not None:
+        for name, values in state["variance_reduction"].items():
+            data["vrf_" + name] = np.asarray(values)
+
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "wb") as fh:
+        np.savez_compressed(fh, **data)
+    os.replace(temp_filename, filename)
+
+
+def load_checkpoint(filename):
+    """Loads the state of a simulation from a checkpoint file created with `save_checkpoint()`.
+
+    Arguments:
+
+        filename -- name of the checkpoint file.
+
+    Return:
+
+        state -- dictionary with the simulation state (see `save_checkpoint()`), where the
+        sketches are given by their counts.
+    """
+    with np.load(filename, allow_pickle=False) as data:
+        state = {
+            "params": json.loads(str(data["params"])),
+            "samples_done": int(data["samples_done"]),
+            "snr_dB": data["snr_dB"],
+            "sums": {
+                key[len("sum_"):]: data[key] for key in data.files if key.startswith("sum_")
+            },
+            "rng_state": (
+                str(data["rng_name"]),
+                data["rng_keys"],
+                int(data["rng_pos"]),
+                int(data["rng_has_gauss"]),
+                float(data["rng_cached_gaussian"]),
+            ),
+            "gains_primary": data["gains_primary"] if "gains_primary" in data else None,
+            "gains_secondary": data["gains_secondary"] if "gains_secondary" in data else None,
+            "block_sums": {
+                key[len("block_"):]: data[key] for key in data.files if key.startswith("block_")
+            } or None,
+            "sketches": {
+                key[len("sketch_"):]: data[key] for key in data.files if key.startswith("sketch_")
+            } or None,
+            "variance_reduction": {
+                key[len("vrf_"):]: data[key] for key in data.files if key.startswith("vrf_")
+            } or None,
+        }
+    return state
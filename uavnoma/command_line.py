@@ -6,7 +6,36 @@ Usage:
 ```
 uavnoma [-h] [-s SAMPLES] [-p POWER_LOS] [-f FACTOR] [-l LOSS] [-r RADIUS] [-ur RADIUS] [-uh MEAN] [-t1 RATE] [-t2 RATE]
         [-hi COEFF] [-si COEFF] [-p1 COEFF] [-p2 COEFF] [--snr-min SNR_MIN] [--snr-max SNR_MAX] [--snr-samples NUM]
-        [--seed SEED] [-o FILE] [--plot] [--no-print]
+        [--seed SEED] [-o FILE] [--format {csv,npz,parquet,hdf5}] [--plot] [--plot-file FILE] [--no-print]
+        [--percentiles P [P ...]] [--distribution-output FILE] [--checkpoint FILE] [--checkpoint-every SAMPLES]
+        [--resume CHECKPOINT] [--store-gains] [--raw-output FILE] [--shard I/N] [--block-size SAMPLES]
+        [--sampler {random,sobol,counter}] [--replicates NUM] [--antithetic] [--control-variates]
+        [--geometry {exact,table}] [--geometry-cache DIR] [--dry-run] [--memory-budget MB] [--progress] [--progress-output FILE] [--progress-every SAMPLES]
+        [--stream-output FILE] [--stream-format {csv,jsonl}] [--tolerance TOL] [--workers NUM] [--pipeline]
+        [--threads NUM]
+
+uavnoma extend [-h] [-s SAMPLES] [--snr-points SNR [SNR ...]] [-o FILE] [--format {csv,npz,parquet,hdf5}]
+        [--plot] [--plot-file FILE] [--no-print] [--percentiles P [P ...]] [--distribution-output FILE]
+        [--checkpoint FILE] [--checkpoint-every SAMPLES] STATE
+
+uavnoma merge [-h] [-o FILE] [--format {csv,npz,parquet,hdf5}] [--plot] [--plot-file FILE] [--no-print]
+        [--percentiles P [P ...]] [--distribution-output FILE] [--checkpoint FILE] SHARD [SHARD ...]
+
+uavnoma serve [-h] [--host HOST] [--port PORT] [--cache-size NUM] [--verbose]
+
+uavnoma batch [-h] [-o FILE] [--format {csv,npz,parquet,hdf5}] [--workers NUM] [--retries NUM]
+        [--plot-dir DIR] [--plot-format {png,svg,pdf}] [--no-print] SCENARIOS
+
+uavnoma coverage [-h] [-s SAMPLES] [-p POWER_LOS] [-f FACTOR] [-l LOSS] [-r RADIUS] [-ur RADIUS] [-uh MEAN]
+        [-t1 RATE] [-t2 RATE] [-hi COEFF] [-si COEFF] [-p1 COEFF] [-p2 COEFF] [--snr-min SNR_MIN]
+        [--snr-max SNR_MAX] [--snr-samples NUM] [--seed SEED] [--resolution NUM] [--heights HEIGHT [HEIGHT ...]]
+        [--workers NUM] [--tile-memory MB] [-o FILE] [--image FILE] [--image-snr SNR] [--no-print]
+
+uavnoma sensitivity [-h] [-s SAMPLES] [-p POWER_LOS] [-f FACTOR] [-l LOSS] [-r RADIUS] [-ur RADIUS] [-uh MEAN]
+        [-t1 RATE] [-t2 RATE] [-hi COEFF] [-si COEFF] [-p1 COEFF] [-p2 COEFF] [--snr-min SNR_MIN]
+        [--snr-max SNR_MAX] [--snr-samples NUM] [--seed SEED]
+        [--params {power_coeff_primary,hardw_ip,sic_ip,rician_factor,path_loss} [...]]
+        [--steps STEP [STEP ...]] [-o FILE] [--format {csv,npz,parquet,hdf5}] [--no-print]
 ```
 
 Optional arguments:
@@ -44,30 +73,688 @@ Optional arguments:
   --snr-samples NUM     Number of SNR samples between SNR_MIN and SNR_MAX (default: 26)
   --seed SEED           Seed for pseudo-random number generator (default: None)
   -o FILE, --output FILE
-                        CSV file where to save simulation data (default: None)
+                        File where to save simulation data (default: None)
+  --format {csv,npz,parquet,hdf5}
+                        Format of the output files (default: csv)
   --plot                Plot the values of the achievable rate and outage probability (default: False)
+  --plot-file FILE      Image file where to save the plots, suffixed with the name of each plot, in the format of
+                        its extension (png, svg or pdf) (default: None)
   --no-print            Do not print results to terminal (default: False)
+  --percentiles P [P ...]
+                        Percentiles of the instantaneous achievable rate to estimate for each SNR value (default: None)
+  --distribution-output FILE
+                        File where to save the CDFs of the achievable rates and channel gains (default: None)
+  --checkpoint FILE     File where to periodically save the simulation state (default: None)
+  --checkpoint-every SAMPLES
+                        Number of Monte Carlo samples between checkpoints (default: 1000)
+  --resume CHECKPOINT   Resume the simulation saved in the given checkpoint file (default: None)
+  --store-gains         Also save the channel gains of each sample in the checkpoint file (default: False)
+  --raw-output FILE     File where to stream the channel gains and rates of each sample (default: None)
+  --shard I/N           Perform only the I-th of N shards of the simulation, saving its state in the checkpoint
+                        file (default: None)
+  --block-size SAMPLES  Number of Monte Carlo samples in each independent random stream of a sharded simulation
+                        (default: 1000)
+  --sampler {random,sobol,counter}
+                        Sampler of the positions and fading of each Monte Carlo sample (default: random)
+  --replicates NUM      Number of independent replicates of the sobol sampler, used to estimate standard errors
+                        (default: 8)
+  --antithetic          Draw the samples in antithetic pairs, with mirrored positions and negated fading
+                        (default: False)
+  --control-variates    Adjust the averages with control variates of the distances and fading (default: False)
+  --geometry {exact,table}
+                        Draw the positions of the UAV and users (exact), or their distances from a precomputed table
+                        of their distribution (table) (default: exact)
+  --geometry-cache DIR  Directory where to save and reuse the tables of the table geometry (default: None)
+  --dry-run             Only print the estimated memory and time of the simulation, and the recommended chunk size
+                        and number of workers (default: False)
+  --memory-budget MB    Refuse to perform simulations whose estimated memory exceeds the given megabytes
+                        (default: None)
+  --progress            Show the progress, throughput and estimated remaining time in the standard error stream
+                        (default: False)
+  --progress-output FILE
+                        File where to write the progress and current estimates as JSON lines (default: None)
+  --progress-every SAMPLES
+                        Number of Monte Carlo samples between progress updates (default: 1000)
+  --stream-output FILE  File where to stream the running estimates and confidence intervals of each SNR value after
+                        each progress update ('-' for the standard output) (default: None)
+  --stream-format {csv,jsonl}
+                        Format of the streamed estimates (default: csv)
+  --tolerance TOL       Relative half width of the confidence intervals at which the streamed estimates of an SNR
+                        value are final, stopping the simulation when all are (default: None)
+  --workers NUM         Number of worker processes, each performing a group of blocks of samples (default: 1)
+  --pipeline            Generate the random values of each block of samples in a background thread while evaluating
+                        the previous block (default: False)
+  --threads NUM         Number of threads, each performing a group of blocks of samples with its own random stream
+                        (default: None)
 ```
 """
 
 import argparse
-import matplotlib.pyplot as plt
+import contextlib
+import os
 import numpy as np
-import pandas as pd
 import sys
 import tabulate as tab
-import uavnoma
+from uavnoma.checkpoint import save_checkpoint
+from uavnoma.progress import ProgressLine, ProgressJSONLines
+from uavnoma.streaming import RowStream, RowsCSV, RowsJSONLines, stream_formats
+from uavnoma.output import formats, check_format, save_results, raw_writer
+from uavnoma.simulation import SimulationConfig, SimulationResult, run_simulation, load_state
+from uavnoma.simulation import extend_state, merge_states, sample_range, samplers, geometries, metric_names
+
+# Names of the arguments which define a simulation, saved in checkpoint files
+simulation_params = list(SimulationConfig().params())
 
 def main():
     """
     This function is called when the script is invoked with the `uavnoma` command.
     """
 
+    # Subcommands
+    if sys.argv[1:2] == ['extend']:
+        return extend()
+    if sys.argv[1:2] == ['merge']:
+        return merge()
+    if sys.argv[1:2] == ['serve']:
+        return serve()
+    if sys.argv[1:2] == ['batch']:
+        return batch()
+    if sys.argv[1:2] == ['coverage']:
+        return coverage()
+    if sys.argv[1:2] == ['sensitivity']:
+        return sensitivity()
+
     # Create an argument parser
     parser = argparse.ArgumentParser(description='Model of UAV-NOMA system with two users.',
                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
     # Specify arguments to parse
+    add_model_arguments(parser)
+    add_output_arguments(parser)
+    parser.add_argument('--checkpoint', type=str, metavar='FILE',
+                        help='File where to periodically save the simulation state',
+                        default=None)
+    parser.add_argument('--checkpoint-every', type=int, metavar='SAMPLES',
+                        help='Number of Monte Carlo samples between checkpoints',
+                        default=1000)
+    parser.add_argument('--resume', type=str, metavar='CHECKPOINT',
+                        help='Resume the simulation saved in the given checkpoint file',
+                        default=None)
+    parser.add_argument('--store-gains', action='store_true',
+                        help='Also save the channel gains of each sample in the checkpoint file',
+                        default=False)
+    parser.add_argument('--raw-output', type=str, metavar='FILE',
+                        help='File where to stream the channel gains and rates of each sample',
+                        default=None)
+    parser.add_argument('--shard', type=str, metavar='I/N',
+                        help='Perform only the I-th of N shards of the simulation, saving its state in the checkpoint file',
+                        default=None)
+    parser.add_argument('--block-size', type=int, metavar='SAMPLES',
+                        help='Number of Monte Carlo samples in each independent random stream of a sharded simulation',
+                        default=1000)
+    parser.add_argument('--sampler', type=str, choices=samplers,
+                        help='Sampler of the positions and fading of each Monte Carlo sample',
+                        default='random')
+    parser.add_argument('--replicates', type=int, metavar='NUM',
+                        help='Number of independent replicates of the sobol sampler, used to estimate standard errors',
+                        default=8)
+    parser.add_argument('--antithetic', action='store_true',
+                        help='Draw the samples in antithetic pairs, with mirrored positions and negated fading',
+                        default=False)
+    parser.add_argument('--control-variates', action='store_true',
+                        help='Adjust the averages with control variates of the distances and fading',
+                        default=False)
+    parser.add_argument('--geometry', type=str, choices=geometries,
+                        help='Draw the positions of the UAV and users (exact), or their distances from a '
+                        'precomputed table of their distribution (table)',
+                        default='exact')
+    parser.add_argument('--geometry-cache', type=str, metavar='DIR',
+                        help='Directory where to save and reuse the tables of the table geometry',
+                        default=None)
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only print the estimated memory and time of the simulation, and the recommended chunk size and number of workers',
+                        default=False)
+    parser.add_argument('--memory-budget', type=float, metavar='MB',
+                        help='Refuse to perform simulations whose estimated memory exceeds the given megabytes',
+                        default=None)
+    parser.add_argument('--progress', action='store_true',
+                        help='Show the progress, throughput and estimated remaining time in the standard error stream',
+                        default=False)
+    parser.add_argument('--progress-output', type=str, metavar='FILE',
+                        help='File where to write the progress and current estimates as JSON lines',
+                        default=None)
+    parser.add_argument('--progress-every', type=int, metavar='SAMPLES',
+                        help='Number of Monte Carlo samples between progress updates',
+                        default=1000)
+    parser.add_argument('--stream-output', type=str, metavar='FILE',
+                        help="File where to stream the running estimates and confidence intervals of each SNR value after each progress update ('-' for the standard output)",
+                        default=None)
+    parser.add_argument('--stream-format', type=str, choices=stream_formats,
+                        help='Format of the streamed estimates',
+                        default='csv')
+    parser.add_argument('--tolerance', type=float, metavar='TOL',
+                        help='Relative half width of the confidence intervals at which the streamed estimates of an SNR value are final, stopping the simulation when all are',
+                        default=None)
+    parser.add_argument('--workers', type=int, metavar='NUM',
+                        help='Number of worker processes, each performing a group of blocks of samples',
+                        default=1)
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Generate the random values of each block of samples in a background thread while evaluating the previous block',
+                        default=False)
+    parser.add_argument('--threads', type=int, metavar='NUM',
+                        help='Number of threads, each performing a group of blocks of samples with its own random stream',
+                        default=None)
+
+    # Unused arguments for now
+    parser.add_argument('--number-uav', type=int, metavar='NUM',
+                        help=argparse.SUPPRESS, # 'Number of UAV must be 1',
+                        default=1)
+    parser.add_argument('--number-user', type=int, metavar='NUM',
+                        help=argparse.SUPPRESS, # 'Number of users must be 2',
+                        default=2)
+
+    # Parse and validate command line arguments
+    args = parser.parse_args()
+    args.sketches = args.percentiles != None or args.distribution_output != None
+
+    # If resuming, the simulation parameters are the ones saved in the checkpoint
+    state = None
+    if args.resume != None:
+        if args.raw_output != None:
+            print("Error Detected! Raw data can't be saved when resuming a simulation", file=sys.stderr)
+            sys.exit(1)
+        state = read_state(args.resume)
+        vars(args).update(state['params'])
+        args.store_gains = state['gains_primary'] is not None
+        if args.checkpoint == None:
+            args.checkpoint = args.resume
+        config = validate(args)
+        check_sketches(args, state)
+    else:
+        config = validate(args)
+        if args.shard != None and args.checkpoint == None:
+            print("Error Detected! Sharded simulations require a checkpoint file", file=sys.stderr)
+            sys.exit(1)
+
+    # Tables of the table geometry are saved in, and reused from, the cache directory. The
+    # subsystems of the options and commands are only imported when used
+    if args.geometry == 'table':
+        import uavnoma.geometry
+        uavnoma.geometry.cache_dir = args.geometry_cache
+
+    # Predict the resources of the simulation, only showing them on a dry run
+    if args.dry_run or args.memory_budget != None:
+        if args.memory_budget != None and args.memory_budget <= 0:
+            print("Error Detected! Memory budget must be (> 0)", file=sys.stderr)
+            sys.exit(1)
+        memory_budget = None if args.memory_budget == None else int(args.memory_budget * 2 ** 20)
+        engine, parallelism = 'serial', None
+        if args.threads != None:
+            engine, parallelism = 'threads', args.threads
+        elif args.pipeline:
+            engine = 'pipeline'
+        elif args.workers != 1:
+            engine, parallelism = 'parallel', args.workers
+        import uavnoma.planner
+        try:
+            plan = uavnoma.planner.plan(config, memory_budget, calibrate=args.dry_run,
+                                        raw_output=args.raw_output != None, engine=engine,
+                                        parallelism=parallelism)
+        except ValueError as e:
+            print(f"Error Detected! {e}", file=sys.stderr)
+            sys.exit(1)
+        if args.dry_run:
+            show_plan(plan)
+            sys.exit(1 if plan.exceeds_budget else 0)
+        for warning in plan.warnings:
+            print(f"Warning: {warning}", file=sys.stderr)
+        if plan.exceeds_budget:
+            print("Error Detected! The simulation exceeds the memory budget, see --dry-run", file=sys.stderr)
+            sys.exit(1)
+
+    if args.progress_every < 1:
+        print("Error Detected! Number of samples between progress updates must be (value >= 1)", file=sys.stderr)
+        sys.exit(1)
+    if args.tolerance != None and (args.stream_output == None or args.tolerance <= 0):
+        print("Error Detected! Tolerance requires --stream-output and must be (value > 0)", file=sys.stderr)
+        sys.exit(1)
+    reports_progress = args.progress or args.progress_output != None or args.stream_output != None
+
+    # Perform a simulation in a pool of threads
+    if args.threads != None:
+        if args.threads < 1:
+            print("Error Detected! Number of threads must be (value >= 1)", file=sys.stderr)
+            sys.exit(1)
+        if (state != None or args.shard != None or args.raw_output != None or reports_progress
+                or args.checkpoint != None or args.workers != 1 or args.pipeline):
+            print("Error Detected! Threaded simulations can't be resumed, sharded, checkpointed, "
+                  "run by several workers, pipelined, stream raw data or report progress", file=sys.stderr)
+            sys.exit(1)
+        import uavnoma.threads
+        try:
+            result = uavnoma.threads.run_threads(config, args.threads)
+        except ValueError as e:
+            print(f"Error Detected! {e}", file=sys.stderr)
+            sys.exit(1)
+        show_results(args, result)
+        return
+
+    # Perform a pipelined simulation, showing the throughput of its stages
+    if args.pipeline:
+        if (state != None or args.shard != None or args.raw_output != None or reports_progress
+                or args.checkpoint != None or args.workers != 1):
+            print("Error Detected! Pipelined simulations can't be resumed, sharded, checkpointed, "
+                  "run by several workers, stream raw data or report progress", file=sys.stderr)
+            sys.exit(1)
+        import uavnoma.pipeline
+        try:
+            result, stats = uavnoma.pipeline.run_pipeline(config)
+        except ValueError as e:
+            print(f"Error Detected! {e}", file=sys.stderr)
+            sys.exit(1)
+        show_results(args, result)
+        if not args.no_print:
+            throughput = stats.throughput()
+            print(tab.tabulate([[name, stats.busy.get(name, stats.wall_time), throughput[name]]
+                                for name in throughput], tablefmt='psql', floatfmt='.4g',
+                               headers=['Stage', 'Time (s)', 'Samples per second']))
+        return
+
+    # Perform a parallel simulation in worker processes, saving its final state if requested
+    if args.workers != 1:
+        if args.workers < 1:
+            print("Error Detected! Number of workers must be (value >= 1)", file=sys.stderr)
+            sys.exit(1)
+        if state != None or args.shard != None or args.raw_output != None or reports_progress:
+            print("Error Detected! Parallel simulations can't be resumed, sharded, stream raw data "
+                  "or report progress", file=sys.stderr)
+            sys.exit(1)
+        import uavnoma.parallel
+        try:
+            result = uavnoma.parallel.run_parallel(config, args.workers)
+        except ValueError as e:
+            print(f"Error Detected! {e}", file=sys.stderr)
+            sys.exit(1)
+        if args.checkpoint != None:
+            save_checkpoint(args.checkpoint, result.state)
+        show_results(args, result)
+        return
+
+    # Perform simulation, streaming the raw data of each sample and reporting its progress and
+    # running estimates if requested, and show results
+    with contextlib.ExitStack() as stack:
+        reporters = []
+        if args.progress:
+            reporters.append(ProgressLine())
+        if args.progress_output != None:
+            reporters.append(ProgressJSONLines(stack.enter_context(open(args.progress_output, 'w'))))
+        if args.stream_output != None:
+            stream_file = sys.stdout if args.stream_output == '-' else \
+                stack.enter_context(open(args.stream_output, 'w', newline=''))
+            stream_rows = RowsCSV if args.stream_format == 'csv' else RowsJSONLines
+            reporters.append(RowStream(stream_rows(stream_file), args.tolerance))
+        def progress(update):
+            # The simulation stops early when the streamed estimates converged
+            stops = [report(update) for report in reporters]
+            return any(stop is True for stop in stops)
+
+        writer = None
+        if args.raw_output != None:
+            first_sample, last_sample = sample_range(config)
+            writer = stack.enter_context(raw_writer(args.raw_output, metadata(config, config.snr_values()),
+                                                    last_sample - first_sample, config.snr_samples, args.format))
+        result = run_simulation(config, state, writer, args.checkpoint, args.checkpoint_every,
+                                progress if reports_progress else None, args.progress_every)
+    show_results(args, result)
+
+def extend():
+    """
+    This function is called when the script is invoked with the `uavnoma extend` command.
+    """
+
+    # Create an argument parser
+    parser = argparse.ArgumentParser(prog='uavnoma extend',
+                                    description='Extend a stored UAV-NOMA simulation with more '
+                                    'Monte Carlo samples and/or more SNR values.',
+                                    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Specify arguments to parse
+    parser.add_argument('state', type=str, metavar='STATE',
+                        help='Checkpoint file of a finished simulation')
+    parser.add_argument('-s', '--monte-carlo-samples', type=int, metavar='SAMPLES',
+                        help='Additional Monte Carlo samples', default=0)
+    parser.add_argument('--snr-points', type=float, nargs='+', metavar='SNR',
+                        help='Additional SNR values in dB, evaluated over the stored channel gains',
+                        default=[])
+    add_output_arguments(parser)
+    parser.add_argument('--checkpoint', type=str, metavar='FILE',
+                        help='File where to save the extended simulation state (default: STATE)',
+                        default=None)
+    parser.add_argument('--checkpoint-every', type=int, metavar='SAMPLES',
+                        help='Number of Monte Carlo samples between checkpoints',
+                        default=1000)
+
+    # Parse command line arguments and load the stored simulation
+    args = parser.parse_args(sys.argv[2:])
+    args.raw_output = None
+    additional_samples = args.monte_carlo_samples
+    state = read_state(args.state)
+    vars(args).update(state['params'])
+    args.store_gains = state['gains_primary'] is not None
+    check_sketches(args, state)
+    if args.checkpoint == None:
+        args.checkpoint = args.state
+    config = validate(args)
+
+    # Evaluate the new SNR values over the stored channel gains
+    try:
+        config = extend_state(config, state, additional_samples, args.snr_points)
+    except ValueError as e:
+        print(f"Error Detected! {e}", file=sys.stderr)
+        sys.exit(1)
+
+    # Perform the additional samples and show results
+    result = run_simulation(config, state, None, args.checkpoint, args.checkpoint_every)
+    show_results(args, result)
+
+def merge():
+    """
+    This function is called when the script is invoked with the `uavnoma merge` command.
+    """
+
+    # Create an argument parser
+    parser = argparse.ArgumentParser(prog='uavnoma merge',
+                                    description='Merge the shards of a UAV-NOMA simulation.',
+                                    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Specify arguments to parse
+    parser.add_argument('shards', type=str, nargs='+', metavar='SHARD',
+                        help='Checkpoint files of the finished shards')
+    add_output_arguments(parser)
+    parser.add_argument('--checkpoint', type=str, metavar='FILE',
+                        help='File where to save the merged simulation state',
+                        default=None)
+
+    # Parse command line arguments and load the shards
+    args = parser.parse_args(sys.argv[2:])
+    args.checkpoint_every = 1
+    args.store_gains = False
+    states = [read_state(filename) for filename in args.shards]
+    vars(args).update(states[0]['params'])
+    check_sketches(args, states[0])
+    validate(args)
+
+    # Merge the shards, which must be all the finished parts of the same simulation
+    try:
+        config, state = merge_states(states)
+    except ValueError as e:
+        print(f"Error Detected! {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.checkpoint != None:
+        save_checkpoint(args.checkpoint, state)
+    show_results(args, SimulationResult(config, state))
+
+def serve():
+    """
+    This function is called when the script is invoked with the `uavnoma serve` command.
+    """
+
+    # Create an argument parser
+    parser = argparse.ArgumentParser(prog='uavnoma serve',
+                                    description='Run a local HTTP server which performs UAV-NOMA '
+                                    'simulations on request.',
+                                    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Specify arguments to parse
+    parser.add_argument('--host', type=str, metavar='HOST',
+                        help='Address where to listen',
+                        default='127.0.0.1')
+    parser.add_argument('--port', type=int, metavar='PORT',
+                        help='Port where to listen',
+                        default=8050)
+    parser.add_argument('--cache-size', type=int, metavar='NUM',
+                        help='Maximum number of results, and of sets of channel gains, kept in memory',
+                        default=128)
+    parser.add_argument('--verbose', action='store_true',
+                        help='Log each request to the error output stream',
+                        default=False)
+
+    args = parser.parse_args(sys.argv[2:])
+    if (args.cache_size < 1):
+        print("Error Detected! Cache size must be (value >= 1)", file=sys.stderr)
+        sys.exit(1)
+
+    import uavnoma.server
+    uavnoma.server.serve(args.host, args.port, args.cache_size, args.verbose)
+
+def batch():
+    """
+    This function is called when the script is invoked with the `uavnoma batch` command.
+    """
+    import uavnoma.batch
+    import uavnoma.plotting
+
+    # Create an argument parser
+    parser = argparse.ArgumentParser(prog='uavnoma batch',
+                                    description='Run the UAV-NOMA simulation scenarios of a file '
+                                    'across a pool of worker processes.',
+                                    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Specify arguments to parse
+    parser.add_argument('scenarios', type=str, metavar='SCENARIOS',
+                        help='CSV, JSON or YAML file with the parameters of each scenario')
+    parser.add_argument('-o', '--output', type=str, metavar='FILE',
+                        help='File where to save the results of all scenarios',
+                        default=None)
+    parser.add_argument('--format', type=str, choices=formats,
+                        help='Format of the output file',
+                        default='csv')
+    parser.add_argument('--workers', type=int, metavar='NUM',
+                        help='Number of worker processes (default: number of CPUs)',
+                        default=None)
+    parser.add_argument('--retries', type=int, metavar='NUM',
+                        help='Number of times a failed scenario is performed again',
+                        default=1)
+    parser.add_argument('--plot-dir', type=str, metavar='DIR',
+                        help='Directory where to save the plots of each scenario',
+                        default=None)
+    parser.add_argument('--plot-format', type=str, choices=uavnoma.plotting.figure_formats,
+                        help='Format of the plot files',
+                        default='png')
+    parser.add_argument('--no-print', action='store_true',
+                        help='Do not print the summary of the scenarios to terminal',
+                        default=False)
+
+    # Parse command line arguments and validate all scenarios before running any
+    args = parser.parse_args(sys.argv[2:])
+    if (args.workers != None and args.workers < 1):
+        print("Error Detected! Number of workers must be (value >= 1)", file=sys.stderr)
+        sys.exit(1)
+    if (args.retries < 0):
+        print("Error Detected! Number of retries must be (value >= 0)", file=sys.stderr)
+        sys.exit(1)
+    try:
+        check_format(args.format)
+        scenarios = uavnoma.batch.load_scenarios(args.scenarios)
+    except (ValueError, ImportError, OSError) as e:
+        print(f"Error Detected! {e}", file=sys.stderr)
+        sys.exit(1)
+
+    # Perform the scenarios, rendering the plots of each one in the background as it finishes
+    with contextlib.ExitStack() as stack:
+        callback = None
+        if args.plot_dir != None:
+            try:
+                os.makedirs(args.plot_dir, exist_ok=True)
+            except OSError as e:
+                print(f"Error Detected! {e}", file=sys.stderr)
+                sys.exit(1)
+            renderer = stack.enter_context(uavnoma.plotting.FigureRenderer(args.plot_format, args.workers))
+
+            def callback(scenario, result, error):
+                if result is not None:
+                    renderer.submit(result.columns(), uavnoma.plotting.file_basename(args.plot_dir, scenario),
+                                    title=str(scenario))
+
+        results, failures = uavnoma.batch.run_batch(scenarios, args.workers, args.retries, callback)
+    if args.output != None:
+        metadata = {'scenarios': {scenario: result.config.params() for scenario, result in results.items()}}
+        save_results(args.output, uavnoma.batch.consolidate(results), metadata, args.format)
+
+    if not args.no_print:
+        print(tab.tabulate([[scenario, 'ok' if scenario in results else 'failed',
+                             results[scenario].samples if scenario in results else '',
+                             failures.get(scenario, '')] for scenario in scenarios],
+                           tablefmt='psql', headers=['Scenario', 'Status', 'Samples', 'Error']))
+    for scenario, error in failures.items():
+        print(f"Error Detected! Scenario {scenario} failed: {error}", file=sys.stderr)
+    if args.plot_dir != None:
+        for basename, error in renderer.failures.items():
+            print(f"Error Detected! Plots {basename} failed: {error}", file=sys.stderr)
+    if failures or (args.plot_dir != None and renderer.failures):
+        sys.exit(1)
+
+def coverage():
+    """
+    This function is called when the script is invoked with the `uavnoma coverage` command.
+    """
+    import uavnoma.coverage
+
+    # Create an argument parser
+    parser = argparse.ArgumentParser(prog='uavnoma coverage',
+                                    description='Compute maps of the outage probability and average '
+                                    'achievable rate of a UAV-NOMA system over the location of a user '
+                                    'and the height of the UAV.',
+                                    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Specify arguments to parse
+    add_model_arguments(parser)
+    parser.add_argument('--resolution', type=int, metavar='NUM',
+                        help='Number of rows and columns of the grid of user locations',
+                        default=41)
+    parser.add_argument('--heights', type=float, nargs='+', metavar='HEIGHT',
+                        help='Average heights of the UAV (default: UAV_HEIGHT_MEAN)',
+                        default=None)
+    parser.add_argument('--workers', type=int, metavar='NUM',
+                        help='Number of threads computing the maps (default: number of CPUs)',
+                        default=None)
+    parser.add_argument('--tile-memory', type=float, metavar='MB',
+                        help='Memory budget of each tile of grid cells computed at once, in megabytes',
+                        default=uavnoma.coverage.tile_memory / 2 ** 20)
+    parser.add_argument('-o', '--output', type=str, metavar='FILE',
+                        help='NPZ file where to save the maps and their coordinates',
+                        default=None)
+    parser.add_argument('--image', type=str, metavar='FILE',
+                        help='Image file where to plot the maps of the located user',
+                        default=None)
+    parser.add_argument('--image-snr', type=float, metavar='SNR',
+                        help='SNR value in dB of the plotted maps (default: SNR_MIN)',
+                        default=None)
+    parser.add_argument('--no-print', action='store_true',
+                        help='Do not print the summary of the maps to terminal',
+                        default=False)
+
+    # Parse and validate command line arguments
+    args = parser.parse_args(sys.argv[2:])
+    try:
+        config = SimulationConfig(**{name: getattr(args, name) for name in simulation_params
+                                     if hasattr(args, name)})
+        if (args.workers != None and args.workers < 1):
+            raise ValueError("Number of workers must be (value >= 1)")
+        if (args.tile_memory <= 0):
+            raise ValueError("Tile memory must be (> 0)")
+        coverage_map = uavnoma.coverage.coverage_map(config, args.resolution, args.heights, None,
+                                                     args.workers, args.tile_memory * 2 ** 20)
+    except ValueError as e:
+        print(f"Error Detected! {e}", file=sys.stderr)
+        sys.exit(1)
+
+    # Save and plot the maps, and print the averages over the users' area
+    if args.output != None:
+        coverage_map.save(args.output)
+    if args.image != None:
+        for metric in ['p_outage_user', 'avg_arate_user']:
+            name, extension = os.path.splitext(args.image)
+            coverage_map.figure(metric, args.image_snr).savefig(f"{name}_{metric}{extension}")
+    if not args.no_print:
+        rows = []
+        for index, height in enumerate(coverage_map.heights):
+            for snr_index, snr in enumerate(coverage_map.snr_dB):
+                rows.append([height, snr] + [np.nanmean(coverage_map.metrics[metric][index, snr_index])
+                                             for metric in ['p_outage_user', 'avg_arate_user']])
+        print(tab.tabulate(rows, tablefmt='psql',
+                           headers=['UAV height\n(m)', 'SNR\n(dB)', 'Outage\nprobability\nLocated user\n(area mean)',
+                                    'Average\nachievable rate\nLocated user\n(area mean)']))
+
+def sensitivity():
+    """
+    This function is called when the script is invoked with the `uavnoma sensitivity` command.
+    """
+    import uavnoma.sensitivity
+
+    # Create an argument parser
+    parser = argparse.ArgumentParser(prog='uavnoma sensitivity',
+                                    description='Compute the derivatives of the outage probability and '
+                                    'average achievable rate of a UAV-NOMA system with respect to its '
+                                    'parameters, over the same random draws.',
+                                    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # Specify arguments to parse
+    add_model_arguments(parser)
+    parser.add_argument('--params', type=str, nargs='+', choices=uavnoma.sensitivity.sensitivity_params,
+                        metavar='PARAM', help='Parameters with respect to which the metrics are derived '
+                        f'({", ".join(uavnoma.sensitivity.sensitivity_params)})',
+                        default=uavnoma.sensitivity.sensitivity_params)
+    parser.add_argument('--steps', type=float, nargs='+', metavar='STEP',
+                        help='Step of the finite differences of the outage probabilities for each parameter '
+                        '(default: ' + ' '.join(f'{uavnoma.sensitivity.default_steps[param]:g}'
+                                                 for param in uavnoma.sensitivity.sensitivity_params) + ')',
+                        default=None)
+    parser.add_argument('-o', '--output', type=str, metavar='FILE',
+                        help='File where to save the Jacobian table',
+                        default=None)
+    parser.add_argument('--format', type=str, choices=formats,
+                        help='Format of the output file',
+                        default='csv')
+    parser.add_argument('--no-print', action='store_true',
+                        help='Do not print the derivatives to terminal',
+                        default=False)
+
+    # Parse and validate command line arguments
+    args = parser.parse_args(sys.argv[2:])
+    try:
+        config = SimulationConfig(**{name: getattr(args, name) for name in simulation_params
+                                     if hasattr(args, name)})
+        check_format(args.format)
+        if args.steps != None and len(args.steps) != len(args.params):
+            raise ValueError("There must be one step for each parameter")
+        steps = None if args.steps == None else dict(zip(args.params, args.steps))
+        result = uavnoma.sensitivity.sensitivities(config, args.params, steps)
+    except (ValueError, ImportError) as e:
+        print(f"Error Detected! {e}", file=sys.stderr)
+        sys.exit(1)
+
+    # Save the Jacobian table, and print the derivatives with respect to each parameter
+    if args.output != None:
+        save_results(args.output, result.table(),
+                     dict(metadata(config, result.snr_dB), steps=result.steps), args.format)
+    if not args.no_print:
+        for param in result.params:
+            print(f"Derivatives with respect to {param} (step {result.steps[param]:g})")
+            print(tab.tabulate(dict(snr_dB=result.snr_dB, **{
+                metric: [f"{value:.4g} ± {error:.2g}" for value, error
+                         in zip(result.derivative(metric, param), result.error(metric, param))]
+                for metric in metric_names}), tablefmt='psql', disable_numparse=True,
+                headers=['SNR\n(dB)', 'Outage\nprobability\nSystem', 'Outage\nprobability\nPrimary user',
+                         'Outage\nprobability\nSecondary user', 'Average\nachievable rate\nSystem',
+                         'Average\nachievable rate\nPrimary User', 'Average\nachievable rate\nSecondary User']))
+
+def add_model_arguments(parser):
+    """
+    Add the arguments which specify the parameters of the model and the simulation.
+    """
+
     parser.add_argument('-s', '--monte-carlo-samples', type=int, metavar='SAMPLES',
                         help='Monte Carlo samples', default=1000)
     parser.add_argument('-p', '--power-los', type=float, metavar='POWER_LOS',
@@ -118,137 +805,76 @@ def main():
     parser.add_argument('--seed', type=int, metavar="SEED",
                         help="Seed for pseudo-random number generator",
                         default = None)
+
+def add_output_arguments(parser):
+    """
+    Add the arguments which specify how to output the results of a simulation.
+    """
+
     parser.add_argument('-o', '--output', type=str, metavar='FILE',
-                        help='CSV file where to save simulation data',
+                        help='File where to save simulation data',
                         default=None)
+    parser.add_argument('--format', type=str, choices=formats,
+                        help='Format of the output files',
+                        default='csv')
     parser.add_argument('--plot', action='store_true',
                         help='Plot the values of the achievable rate and outage probability',
                         default=False)
+    parser.add_argument('--plot-file', type=str, metavar='FILE',
+                        help='Image file where to save the plots, suffixed with the name of each plot, '
+                        'in the format of its extension (png, svg or pdf)',
+                        default=None)
     parser.add_argument('--no-print', action='store_true',
                         help='Do not print results to terminal',
                         default=False)
+    parser.add_argument('--percentiles', type=float, nargs='+', metavar='P',
+                        help='Percentiles of the instantaneous achievable rate to estimate for each SNR value',
+                        default=None)
+    parser.add_argument('--distribution-output', type=str, metavar='FILE',
+                        help='File where to save the CDFs of the achievable rates and channel gains',
+                        default=None)
 
-    # Unused arguments for now
-    parser.add_argument('--number-uav', type=int, metavar='NUM',
-                        help=argparse.SUPPRESS, # 'Number of UAV must be 1',
-                        default=1)
-    parser.add_argument('--number-user', type=int, metavar='NUM',
-                        help=argparse.SUPPRESS, # 'Number of users must be 2',
-                        default=2)
+def check_sketches(args, state):
+    """
+    Check that the distribution sketches required by the output arguments were tracked.
+    """
 
-    # Parse and validate command line arguments
-    args = parser.parse_args()
-    validate(args)
+    if (args.percentiles != None or args.distribution_output != None) and state['sketches'] == None:
+        print("Error Detected! Percentiles and distributions require a simulation run with "
+              "--percentiles or --distribution-output", file=sys.stderr)
+        sys.exit(1)
 
-    # If a seed was defined, set it
-    if (args.seed != None):
-        np.random.seed(args.seed)
-
-    # Initialization of some auxiliary arrays
-    snr_dB = np.linspace(args.snr_min, args.snr_max, args.snr_samples) # SNR in dB
-    snr_linear = 10.0 ** (snr_dB / 10.0)  # SNR linear
-    out_probability_system = np.zeros((args.monte_carlo_samples, len(snr_dB)))
-    out_probability_secondary_user = np.zeros((args.monte_carlo_samples, len(snr_dB)))
-    out_probability_primary_user = np.zeros((args.monte_carlo_samples, len(snr_dB)))
-    system_average_rate = np.zeros((args.monte_carlo_samples, len(snr_dB)))
-    rate_secondary_user = np.zeros((args.monte_carlo_samples, len(snr_dB)))
-    rate_primary_user = np.zeros((args.monte_carlo_samples, len(snr_dB)))
-
-
-    ## Perform simulation
-
-    for mc in range(args.monte_carlo_samples):
-        # Position UAV and users
-        uav_axis_x, uav_axis_y, uav_height = uavnoma.random_position_uav(args.number_uav,
-                                                                        args.radius_uav,
-                                                                        args.uav_height_mean)
-
-        user_axis_x, user_axis_y = uavnoma.random_position_users(args.number_user,
-                                                                args.radius_user)
-
-        s, sigma = uavnoma.fading_rician(args.rician_factor, args.power_los)
-
-        # Generate channel gains
-        channel_gain_primary, channel_gain_secondary =  uavnoma.generate_channel(
-            s,
-            sigma,
-            args.number_user,
-            user_axis_x,
-            user_axis_y,
-            uav_axis_x,
-            uav_axis_y,
-            uav_height,
-            args.path_loss,
-        )
-
-        # Analyzes system performance metrics for various SNR values
-        for sn in range(0, len(snr_dB)):
-
-            # Calculating achievable rate of primary user
-            rate_primary_user[mc, sn] = uavnoma.calculate_instantaneous_rate_primary(
-                channel_gain_primary,
-                snr_linear[sn],
-                args.power_coeff_primary,
-                args.power_coeff_secondary,
-                args.hardw_ip,
-            )
-            # Calculating achievable rate of secondary user
-            rate_secondary_user[mc, sn] = uavnoma.calculate_instantaneous_rate_secondary(
-                channel_gain_secondary,
-                snr_linear[sn],
-                args.power_coeff_secondary,
-                args.power_coeff_primary,
-                args.hardw_ip,
-                args.sic_ip,
-            )
-
-            system_average_rate[mc, sn] = uavnoma.average_rate(rate_primary_user[mc, sn],
-                                                            rate_secondary_user[mc, sn])
-
-            # Calculating of outage probability of the system
-            out_probability_system[mc, sn], out_probability_primary_user[mc,sn], out_probability_secondary_user[mc, sn] = uavnoma.outage_probability(
-                rate_primary_user[mc, sn],
-                rate_secondary_user[mc, sn],
-                args.target_rate_primary_user,
-                args.target_rate_secondary_user,
-            )
-
-    ## Outage Probability
-
-    # Outage probability of the System
-    out_prob_mean = np.mean(out_probability_system, axis=0)
-
-    # Outage probability of the Primary User
-    out_prob_primary = np.mean(out_probability_primary_user, axis=0)
-
-    # Outage probability of the Secondary User
-    out_prob_secondary = np.mean(out_probability_secondary_user, axis=0)
-
-    ## Achievable Rate
-
-    # Average achievable rate of the system
-    average_rate_mean = np.mean(system_average_rate, axis=0)
-
-    # Average achievable rate of the Primary User
-    rate_mean_primary_user = np.mean(rate_primary_user, axis=0)
-
-    # Average achievable rate of the Secondary User
-    rate_mean_secondary_user = np.mean(rate_secondary_user, axis=0)
-
-
-    # Put all mean data into a numpy matrix / table
-    all_data_np = np.c_[ snr_dB, out_prob_mean, out_prob_primary, out_prob_secondary,
-                        average_rate_mean, rate_mean_primary_user, rate_mean_secondary_user]
-
-    # Convert numpy matrix to Pandas dataframe with column names
-    all_data_df = pd.DataFrame(all_data_np,
-                            columns = ['snr_dB', 'p_outage_sys', 'p_outage_usr1',
-                                        'p_outage_usr2', 'avg_arate_sys',
-                                        'avg_arate_usr1', 'avg_arate_usr2' ])
+def read_state(filename):
+    """
+    Load the state of a simulation from a checkpoint file, exiting if it can't be read.
+    """
 
+    try:
+        config, state = load_state(filename)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Error Detected! Unable to load checkpoint '{filename}': {e}", file=sys.stderr)
+        sys.exit(1)
+    return state
+
+def metadata(config, snr_dB):
+    """
+    Information on a simulation to embed in output files.
+    """
+
+    return {'params': config.params(), 'snr_dB': [float(snr) for snr in snr_dB]}
+
+def show_results(args, result):
+    """
+    Print, save and/or plot the results of a simulation, as requested in the command line.
+    """
+
+    snr_dB = result.snr_dB
+
+    # Table with the SNR values and the average of each metric
+    table = result.columns()
     # Print to screen, except if --no-print option was specified
     if not args.no_print:
-        print(tab.tabulate(all_data_df, tablefmt='psql', showindex=False,
+        print(tab.tabulate(table, tablefmt='psql', showindex=False,
                         headers=['SNR\n(dB)', 'Outage\nprobability\nSystem',
                                     'Outage\nprobability\nPrimary user',
                                     'Outage\nprobability\nSecondary user',
@@ -256,114 +882,118 @@ def main():
                                     'Average\nachievable rate\nPrimary User',
                                     'Average\nachievable rate\nSecondary User']))
 
+    # Estimate the requested percentiles of the achievable rates from the sketches
+    results = dict(table.items())
+    if args.percentiles != None:
+        percentiles = result.percentiles(args.percentiles)
+        results.update(percentiles)
+
+        if not args.no_print:
+            print(tab.tabulate(dict(snr_dB=snr_dB, **percentiles), tablefmt='psql',
+                            headers=['SNR\n(dB)'] + [
+                                f'{p:g}th percentile\nachievable rate\n{user}'
+                                for p in args.percentiles
+                                for user in ['Primary User', 'Secondary User']]))
+
+    # Estimate the standard errors of the averages from the replicates of the sobol sampler
+    if result.config.sampler == 'sobol':
+        errors = {name + '_stderr': values for name, values in result.standard_errors().items()}
+        results.update(errors)
+
+        if not args.no_print:
+            print(tab.tabulate(dict(snr_dB=snr_dB, **errors), tablefmt='psql',
+                            headers=['SNR\n(dB)', 'Standard error\noutage\nSystem',
+                                        'Standard error\noutage\nPrimary user',
+                                        'Standard error\noutage\nSecondary user',
+                                        'Standard error\nachievable rate\nSystem',
+                                        'Standard error\nachievable rate\nPrimary User',
+                                        'Standard error\nachievable rate\nSecondary User']))
+
+    # Report how much the variance of the averages was reduced with respect to plain sampling
+    if result.state.get('variance_reduction') is not None:
+        factors = {name + '_vrf': values for name, values in result.variance_reduction().items()}
+        results.update(factors)
+
+        if not args.no_print:
+            print(tab.tabulate(dict(snr_dB=snr_dB, **factors), tablefmt='psql',
+                            headers=['SNR\n(dB)', 'Variance\nreduction outage\nSystem',
+                                        'Variance\nreduction outage\nPrimary user',
+                                        'Variance\nreduction outage\nSecondary user',
+                                        'Variance\nreduction rate\nSystem',
+                                        'Variance\nreduction rate\nPrimary User',
+                                        'Variance\nreduction rate\nSecondary User']))
+
     # Save results to file if a filename was specified
     if args.output != None:
-        all_data_df.to_csv(args.output, index=False)
+        save_results(args.output, results, metadata(result.config, snr_dB), args.format)
+
+    # Save the CDFs of the achievable rates and channel gains if a filename was specified
+    if args.distribution_output != None:
+        save_results(args.distribution_output, result.distributions(),
+                     metadata(result.config, snr_dB), args.format)
+
+    # Save the plots to files, without a display, if --plot-file option was given
+    if args.plot_file != None:
+        import uavnoma.plotting
+        name, extension = os.path.splitext(args.plot_file)
+        template = uavnoma.plotting.FigureTemplate()
+        template.update(table)
+        template.save(name, uavnoma.plotting.plot_format(args.plot_file))
 
     # Plot simulation results if --plot option was given
     if args.plot:
+        import matplotlib.pyplot as plt
+        import uavnoma.plotting
 
         # Outage probability
-        plt.semilogy(snr_dB, out_prob_primary, "b.-", label="Primary user", linewidth=1)
-        plt.semilogy(snr_dB, out_prob_secondary, "r.-", label="Secondary user", linewidth=1)
-        plt.xlabel("SNR (dB)")
-        plt.ylabel("Outage Probability")
-        plt.legend(loc="lower left")
-
-        # Determine the highest index of the outage probability arrays containing values > 0
-        i_max = len(snr_dB) - 1
-        for i in range(len(snr_dB) - 1, 0, -1):
-            if out_prob_primary[i] == 0 and out_prob_secondary[i] == 0:
-                i_max = i
-            else:
-                break
-
-        # Adjust plot
-        plt.xlim(args.snr_min, snr_dB[i_max])
+        uavnoma.plotting.draw_outage(plt.gca(), snr_dB, result.p_outage_usr1, result.p_outage_usr2)
 
         # Average Achievable Rate of the users
-        plt.figure()
-        plt.plot(snr_dB, rate_mean_primary_user, "b.-", label="primary user", linewidth=1)
-        plt.plot(snr_dB, rate_mean_secondary_user, "r.-", label="secondary user", linewidth=1)
-        plt.xlabel("SNR (dB)")
-        plt.ylabel("Achievable rate (bits/s/Hz)")
-        plt.legend(loc="upper left")
-        plt.xlim(args.snr_min, args.snr_max)
+        uavnoma.plotting.draw_rate(plt.figure().gca(), snr_dB, result.avg_arate_usr1, result.avg_arate_usr2)
 
         plt.show()
 
-def validate(args):
+def show_plan(plan):
     """
-    Validate command line arguments.
+    Print the predicted resources of a simulation.
     """
+    import uavnoma.planner
+
+    budget = 'None' if plan.memory_budget == None else uavnoma.planner.format_bytes(plan.memory_budget)
+    print(tab.tabulate([['Monte Carlo samples', plan.samples],
+                        ['Estimated peak memory', uavnoma.planner.format_bytes(plan.peak_memory)],
+                        ['Memory budget', budget],
+                        ['Time per sample', f'{plan.seconds_per_sample * 1e6:.1f} us'],
+                        ['Estimated wall time', f'{plan.wall_time:.1f} s'],
+                        ['Recommended chunk size', plan.chunk_size],
+                        ['Recommended workers', plan.workers]],
+                       tablefmt='psql', headers=['Resource', 'Estimate']))
+    for warning in plan.warnings:
+        print(f"Warning: {warning}", file=sys.stderr)
 
-    if ( args.monte_carlo_samples < 100 or args.monte_carlo_samples > 100000 ):
-        print("Invalid Monte Carlo samples, the value must be (100 <= monte_carlo_samples <= 100000)", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.power_los < 1.0 or args.power_los > 2.0 ):
-        print("Error Detected! The power must be (1.0 <= value <= 2.0)", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.rician_factor < 10.0 or args.rician_factor > 18.0):
-        print("Error Detected! Rician factor must be (10 <= value <= 18)", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.path_loss < 2.0 or args.path_loss > 3.0):
-        print("Error Detected! Path loss value must be (2.0 <= value <= 3.0)", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.radius_uav < 1 or args.radius_uav > 5.0):
-        print("Error Detected! Radius UAV value must be (1.0 <= value <= 5.0)", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.radius_user < 1 or args.radius_user > 20.0):
-        print("Error Detected! Radius user value must be (1.0 <= value <= 20.0)", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.uav_height_mean < 10 or args.uav_height_mean > 50):
-        print("Error Detected! Heigth UAV value must be (10 <= value <= 40)", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.number_user != 2):
-        print("Error Detected! Number of user value must be 2)", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.number_uav !=1):
-        print("Error Detected! Number UAV value must be 1", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.target_rate_primary_user < 0 or args.target_rate_primary_user > 2):
-        print("Error Detected! Target rate of primary user must be (0.1<= value <= 2)", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.target_rate_secondary_user < 0 or args.target_rate_secondary_user > 2):
-        print("Error Detected! Target rate of secondary user must be (0.1 <= value <= 2)", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.hardw_ip < 0 or args.hardw_ip > 1):
-        print("Error Detected! Residual Hardware impairment must be (0 <= value <= 1.0)", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.sic_ip < 0 or args.sic_ip > 1):
-        print("Error Detected! Residual imperfect SIC must be (0 <= value <= 1.0)", file=sys.stderr)
-        sys.exit(1)
-
-    if (args.snr_min < 0 or args.snr_min > 15):
-        print("Error Detected! SNR minimum value must be (0 <= value <= 15)", file=sys.stderr)
-        sys.exit(1)
+def validate(args):
+    """
+    Validate command line arguments, returning the configuration of the simulation.
+    """
 
-    if (args.snr_max < 30 or args.snr_max > 80):
-        print("Error Detected! SNR maximum value must be (30 <= value <= 80)", file=sys.stderr)
+    try:
+        config = SimulationConfig(**{name: getattr(args, name) for name in simulation_params
+                                     if hasattr(args, name)},
+                                  store_gains=args.store_gains)
+        check_format(args.format)
+        if args.plot_file != None:
+            import uavnoma.plotting
+            uavnoma.plotting.plot_format(args.plot_file)
+    except (ValueError, ImportError) as e:
+        print(f"Error Detected! {e}", file=sys.stderr)
         sys.exit(1)
 
-    if (args.power_coeff_primary < args.power_coeff_secondary):
-        print("Error Detected! The power coefficient of the primary user must be greater than that of the Secondary user.", file=sys.stderr)
+    if (args.percentiles != None and (min(args.percentiles) < 0 or max(args.percentiles) > 100)):
+        print("Error Detected! Percentiles must be (0 <= value <= 100)", file=sys.stderr)
         sys.exit(1)
 
-    sum_power = args.power_coeff_primary + args.power_coeff_secondary
-    if(sum_power < 0.0 or  sum_power > 1.0 ):
-        print("Error Detected! The sum of the power coefficients must be (0.0 < value <= 1.0)", file=sys.stderr)
+    if (args.checkpoint_every < 1):
+        print("Error Detected! Number of samples between checkpoints must be (value >= 1)", file=sys.stderr)
         sys.exit(1)
 
-    return args
\ No newline at end of file
+    return config
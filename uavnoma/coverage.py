@@ -0,0 +1,208 @@
+"""
+    This module contains the computation of coverage maps: the outage probabilities and average
+    achievable rates as a function of the location of a user in the cell and of the average
+    height of the UAV, for cell planning.
+
+    Each cell of a square grid covering the users' area fixes the location of one user (the
+    located user), while the other user is placed at random in the area, as in the simulation,
+    and the metrics are averaged over the position of the UAV in its orbit, its height around
+    each average height and the fading. All cells are evaluated over the same random draws, so
+    the maps are smooth and the differences between cells are due to the location only. Cells
+    outside the users' area are NaN.
+
+    The grid is split in tiles of cells, whose size is limited so that the (samples x SNR values)
+    arrays of each tile fit in a memory budget, and tiles are evaluated in parallel by a pool of
+    threads, since NumPy releases the GIL in array operations.
+
+    ```
+    from uavnoma import SimulationConfig
+    from uavnoma.coverage import coverage_map
+
+    coverage = coverage_map(SimulationConfig(seed=1), resolution=41, heights=[15, 30])
+    coverage.save('coverage.npz')
+    coverage.figure('p_outage_user', snr=30).savefig('coverage.png')
+    ```
+"""
+
+import dataclasses
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict
+import numpy as np
+from matplotlib.figure import Figure
+from .output import package_version
+from .simulation import metric_names, sample_metrics, user_gains
+
+# Metrics of the located user, in addition to those of the simulation
+user_metric_names = ['p_outage_user', 'avg_arate_user']
+
+# Default memory budget of each tile, in bytes
+tile_memory = 64 * 2 ** 20
+
+# Labels of the metrics in the figures
+metric_labels = {
+    'p_outage_sys': 'Outage probability, system',
+    'p_outage_usr1': 'Outage probability, primary user',
+    'p_outage_usr2': 'Outage probability, secondary user',
+    'avg_arate_sys': 'Average achievable rate, system (bits/s/Hz)',
+    'avg_arate_usr1': 'Average achievable rate, primary user (bits/s/Hz)',
+    'avg_arate_usr2': 'Average achievable rate, secondary user (bits/s/Hz)',
+    'p_outage_user': 'Outage probability of the located user',
+    'avg_arate_user': 'Average achievable rate of the located user (bits/s/Hz)',
+}
+
+
+@dataclass
+class CoverageMap:
+    """Coverage maps of a configuration.
+
+    Attributes:
+
+        config -- the `uavnoma.SimulationConfig` of the maps.
+
+        x, y -- coordinates in meters of the columns and rows of the grid.
+
+        heights -- average heights of the UAV.
+
+        snr_dB -- SNR values in dB.
+
+        metrics -- dictionary with an array of shape (heights, SNR values, rows, columns) for
+        each metric: those of the simulation (see `uavnoma.SimulationResult.columns()`), where
+        the primary and secondary users are the weaker and the stronger of the two, and the
+        outage probability and average rate of the located user, `p_outage_user` and
+        `avg_arate_user`.
+    """
+    config: Any
+    x: np.ndarray
+    y: np.ndarray
+    heights: np.ndarray
+    snr_dB: np.ndarray
+    metrics: Dict[str, np.ndarray]
+
+    def save(self, filename):
+        """Saves the maps and their coordinates to a NumPy `npz` file, with the parameters of
+        the simulation embedded as JSON in its `metadata` entry.
+        """
+        metadata = {'params': self.config.params(), 'uavnoma_version': package_version()}
+        with open(filename, 'wb') as fh:
+            np.savez(fh, metadata=np.array(json.dumps(metadata)), x=self.x, y=self.y,
+                     heights=self.heights, snr_dB=self.snr_dB, **self.metrics)
+
+    def figure(self, metric='p_outage_user', snr=None):
+        """Returns a matplotlib figure with the map of a metric for each height, at the SNR value
+        closest to `snr` (by default the first one). The figure doesn't use pyplot, so it can be
+        created in any thread and saved with `figure.savefig()`.
+        """
+        snr_index = 0 if snr is None else int(np.argmin(np.abs(self.snr_dB - snr)))
+        values = self.metrics[metric][:, snr_index]
+        figure = Figure(figsize=(4.5 * len(self.heights), 4), constrained_layout=True)
+        axes = figure.subplots(1, len(self.heights), squeeze=False)[0]
+        extent = [self.x[0], self.x[-1], self.y[0], self.y[-1]]
+        low, high = np.nanmin(values), np.nanmax(values)
+        for ax, height, image in zip(axes, self.heights, values):
+            mesh = ax.imshow(image, origin='lower', extent=extent, vmin=low, vmax=high, cmap='viridis')
+            ax.set_title(f"UAV height {height:g} m, SNR {self.snr_dB[snr_index]:g} dB")
+            ax.set_xlabel('x (m)')
+            ax.set_ylabel('y (m)')
+        figure.colorbar(mesh, ax=list(axes), label=metric_labels[metric])
+        return figure
+
+
+def coverage_map(config, resolution=41, heights=None, snr_dB=None, workers=None,
+                 memory=tile_memory):
+    """Computes the coverage maps of a configuration.
+
+    Arguments:
+
+        config -- the `uavnoma.SimulationConfig`, whose `monte_carlo_samples` are the samples
+        averaged in each cell.
+
+        resolution -- number of rows and columns of the grid, which covers the square around
+        the users' area.
+
+        heights -- average heights of the UAV, by default that of the configuration.
+
+        snr_dB -- SNR values in dB, by default those of the configuration.
+
+        workers -- number of threads evaluating tiles in parallel, by default the number of CPUs.
+
+        memory -- approximate memory budget of each tile, in bytes.
+
+    Return:
+
+        coverage -- a `CoverageMap`.
+    """
+    if resolution < 2:
+        raise ValueError("Resolution must be (value >= 2)")
+    if config.geometry != 'exact':
+        raise ValueError("Coverage maps require the exact geometry, which places the users")
+    heights = np.array([config.uav_height_mean] if heights is None else heights, dtype=float)
+    for height in heights:
+        dataclasses.replace(config, uav_height_mean=height)  # Validates the height
+    snr_dB = config.snr_values() if snr_dB is None else np.atleast_1d(np.asarray(snr_dB, dtype=float))
+    workers = workers or os.cpu_count() or 1
+
+    # Location of the user of each cell, as the uniform values which give it
+    x = np.linspace(-config.radius_user, config.radius_user, resolution)
+    y = np.linspace(-config.radius_user, config.radius_user, resolution)
+    grid_x, grid_y = np.meshgrid(x, y)
+    inside = np.hypot(grid_x, grid_y) <= config.radius_user
+    cell_angles = (np.arctan2(grid_y[inside], grid_x[inside]) % (2 * np.pi)) / (2 * np.pi)
+    cell_radii = np.minimum((np.hypot(grid_x[inside], grid_y[inside]) / config.radius_user) ** 2, 1.0)
+
+    # Random draws of the UAV position, the other user and the fading, shared by all cells
+    rng = np.random.RandomState(config.seed)
+    samples = config.monte_carlo_samples
+    uniforms = rng.rand(samples, 6)
+    normals = rng.standard_normal((samples, 4))
+
+    # Tiles of cells whose arrays fit in the memory budget
+    cell_memory = samples * (12 * len(snr_dB) + 40) * 8
+    tile_size = max(1, int(memory // cell_memory))
+    tiles = [slice(start, start + tile_size) for start in range(0, len(cell_angles), tile_size)]
+
+    names = metric_names + user_metric_names
+    metrics = {name: np.full((len(heights), len(snr_dB), resolution, resolution), np.nan)
+               for name in names}
+    values = {name: np.zeros((len(heights), len(snr_dB), len(cell_angles))) for name in names}
+
+    def evaluate(task):
+        height_index, tile = task
+        height_config = dataclasses.replace(config, uav_height_mean=heights[height_index])
+        tile_metrics = evaluate_tile(height_config, uniforms, normals, cell_angles[tile],
+                                     cell_radii[tile], snr_dB)
+        for name in names:
+            values[name][height_index, :, tile] = tile_metrics[name].T
+
+    tasks = [(height_index, tile) for height_index in range(len(heights)) for tile in tiles]
+    if workers == 1:
+        for task in tasks:
+            evaluate(task)
+    else:
+        with ThreadPoolExecutor(workers) as executor:
+            list(executor.map(evaluate, tasks))
+
+    for name in names:
+        metrics[name][:, :, inside] = values[name]
+    return CoverageMap(config, x, y, heights, snr_dB, metrics)
+
+
+def evaluate_tile(config, uniforms, normals, cell_angles, cell_radii, snr_dB):
+    """Returns the average metrics of a tile of cells, with shape (cells, SNR values), over the
+    given random draws, with the located user at the given angles and radii (as uniform values).
+    """
+    num_cells, samples = len(cell_angles), len(uniforms)
+    tile_uniforms = np.tile(uniforms, (num_cells, 1))
+    tile_uniforms[:, 2] = np.repeat(cell_angles, samples)
+    tile_uniforms[:, 4] = np.repeat(cell_radii, samples)
+    h_n, _ = user_gains(config, tile_uniforms, np.tile(normals, (num_cells, 1)))
+
+    gains_primary, gains_secondary = h_n.min(axis=1), h_n.max(axis=1)
+    metrics = sample_metrics(config, gains_primary, gains_secondary, 10.0 ** (snr_dB / 10.0))
+    located_primary = (h_n[:, 0] <= h_n[:, 1])[:, np.newaxis]
+    metrics['p_outage_user'] = np.where(located_primary, metrics['p_outage_usr1'], metrics['p_outage_usr2'])
+    metrics['avg_arate_user'] = np.where(located_primary, metrics['avg_arate_usr1'], metrics['avg_arate_usr2'])
+    return {name: values.reshape(num_cells, samples, len(snr_dB)).mean(axis=1)
+            for name, values in metrics.items()}
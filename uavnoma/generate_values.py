@@ -3,11 +3,50 @@
 
 """
 
+import functools
 import numpy as np
 from numpy import sqrt
 import math
 
-def random_position_uav(number_UAV, radius_UAV, uav_height):
+def seed_stream(seed, stream, rng=None):
+    """Seeds the pseudo-random number generator with one of several independent streams derived
+    from the same seed, so that blocks of samples can be generated separately and in any order.
+
+    Arguments:
+
+        seed -- seed of the simulation.
+
+        stream -- index of the stream, e.g. the index of a block of samples.
+
+        rng -- `np.random.RandomState` to seed, by default the global generator.
+    """
+    rng = np.random if rng is None else rng
+    rng.seed(np.random.SeedSequence(seed, spawn_key=(stream,)).generate_state(4))
+
+
+def sample_generator(seed, index):
+    """Returns a counter-based generator (Philox) for one Monte Carlo sample, whose values depend
+    only on the seed and the index of the sample, so that any sample can be generated again
+    independently of the others, in any order. The generator is keyed by the seed and its
+    counter starts at the index of the sample, leaving room for 2^64 values per sample.
+
+    Arguments:
+
+        seed -- seed of the simulation.
+
+        index -- index of the sample.
+    """
+    return np.random.Generator(np.random.Philox(key=counter_key(seed), counter=[0, index, 0, 0]))
+
+
+@functools.lru_cache(maxsize=16)
+def counter_key(seed):
+    """Returns the key of the counter-based generators derived from a seed.
+    """
+    return np.random.SeedSequence(seed).generate_state(2, np.uint64)
+
+
+def random_position_uav(number_UAV, radius_UAV, uav_height, rng=None):
     """Returns a random UAV position based on 3D Cartesian coordinates.
 
             x_r: x-axis | y_r: y-axis | z_r: height
@@ -26,19 +65,23 @@ def random_position_uav(number_UAV, radius_UAV, uav_height):
 
         uav_height -- average flight height
 
+        rng -- generator of the random values, e.g. from `sample_generator()`, by default the
+        global one.
+
     Return:
 
         x_r, y_r, z_r -- position in the x-axis, y-axis and height of the UAV.
     """
-    theta_r = np.random.rand(number_UAV, 1) * (math.pi * 2)
+    rng = np.random if rng is None else rng
+    theta_r = rng.random((number_UAV, 1)) * (math.pi * 2)
     rho_r = radius_UAV
     x_r = rho_r * np.cos(theta_r)
     y_r = rho_r * np.sin(theta_r)
-    z_r = np.random.uniform(uav_height - 5.0, uav_height + 5.0)
+    z_r = rng.uniform(uav_height - 5.0, uav_height + 5.0)
     return x_r, y_r, z_r
 
 
-def random_position_users(number_users, radiusUser):
+def random_position_users(number_users, radiusUser, rng=None):
     """Returns a random ground users position based on 2D Cartesian coordinates.
 
             x_u: x-axis |  y_u: y-axis | height is not considered
@@ -53,13 +96,16 @@ def random_position_users(number_users, radiusUser):
 
         radiusUser -- distribution radius of users in the cell in meters.
 
+        rng -- generator of the random values, by default the global one.
+
     Return:
 
         x_u, y_u -- position in the x-axis and y-axis of the n-th user.
 
     """
-    theta_u = (np.random.rand(number_users, 1)) * (math.pi * 2)
-    rho_u = np.sqrt(np.random.rand(number_users, 1)) * radiusUser
+    rng = np.random if rng is None else rng
+    theta_u = (rng.random((number_users, 1))) * (math.pi * 2)
+    rho_u = np.sqrt(rng.random((number_users, 1))) * radiusUser
     x_u = rho_u * np.cos(theta_u)
     y_u = rho_u * np.sin(theta_u)
     return x_u, y_u
@@ -85,7 +131,7 @@ def fading_rician(K, P_los):
 
 
 def generate_channel(
-    s, sigma, number_user, user_X, user_Y, uav_X, uav_Y, uav_Z, path_loss
+    s, sigma, number_user, user_X, user_Y, uav_X, uav_Y, uav_Z, path_loss, rng=None
 ):
     """Returns the channel gains of the users over Rician Fading. The channel gains are sorted to identify
     the primary user and secondary user.
@@ -124,6 +170,8 @@ def generate_channel(
 
         path_loss -- path loss exponent.
 
+        rng -- generator of the random values, by default the global one.
+
     Return:
 
         channel_primary --  channel gain of the primary user.
@@ -134,13 +182,14 @@ def generate_channel(
     # Initializing auxiliary arrays to store channel coefficients and distance between UAV and users, respectively:
     h_n = np.zeros(number_user)
     distance = np.zeros(number_user)
+    rng = np.random if rng is None else rng
 
     for uu in range(number_user):
 
         # Generate small scale fading according to Rician Distribution
         small_scale_fading = np.sqrt(
-            (np.random.normal(s, sigma) ** 2)
-            + 1j * (np.random.normal(0, sigma) ** 2)
+            (rng.normal(s, sigma) ** 2)
+            + 1j * (rng.normal(0, sigma) ** 2)
         )
         # Normalized distance
         distance[uu] = np.sqrt(
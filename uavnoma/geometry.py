@@ -0,0 +1,139 @@
+"""
+    This module contains the tables of the distribution of the distances between the UAV and the
+    users, which replace the positions drawn in `uavnoma.generate_values` with the `table`
+    geometry of a simulation (see `uavnoma.SimulationConfig`).
+
+    By the rotational symmetry of the cell, the horizontal distance between the UAV, anywhere in
+    its orbit, and a user placed at random in the cell doesn't depend on the angle of the UAV,
+    and the horizontal distances of the two users, whose angles are independent, are independent
+    and identically distributed. The squared distance of each user is the squared horizontal
+    distance plus the squared height of the UAV, which is shared by both users. So the joint
+    distribution of the distances of both users, whether ordered (near and far) or not, is
+    given by the height and the distribution of the squared horizontal distance, which only
+    depends on `radius_user` and `radius_uav`, and doesn't need coordinates or trigonometry.
+
+    A `GeometryTable` holds the quantiles of the squared horizontal distance at equally spaced
+    probabilities, computed from the exact distribution, so that each value is drawn from one
+    uniform value by linear interpolation, in constant time. Tables are created once per process
+    for each pair of radii, and can be persisted in a cache directory and reused across runs:
+
+    ```
+    from uavnoma.geometry import geometry_table
+
+    table = geometry_table(radius_user=15.0, radius_uav=2.0, cache_dir='geometry')
+    squared_distances = table.squared_distances(uniforms) + uav_height ** 2
+    ```
+"""
+
+import functools
+import os
+from dataclasses import dataclass
+import numpy as np
+
+# Number of quantiles of each table
+table_size = 4097
+
+# Number of points where the exact distribution is evaluated to compute the quantiles
+cdf_points = 65537
+
+# Directory where tables are persisted by default, or `None` to keep them only in memory
+cache_dir = None
+
+
+@dataclass
+class GeometryTable:
+    """Quantiles of the squared horizontal distance between the UAV and a user.
+
+    Attributes:
+
+        radius_user -- distribution radius of users in the cell in meters.
+
+        radius_uav -- radius of the UAV flight trajectory in meters.
+
+        quantiles -- squared horizontal distances at the probabilities `k / (len(quantiles) - 1)`.
+    """
+    radius_user: float
+    radius_uav: float
+    quantiles: np.ndarray
+
+    def squared_distances(self, uniforms):
+        """Returns the squared horizontal distances given by uniform values in [0, 1], through
+        the inverse of their distribution function, with the same shape as `uniforms`.
+        """
+        position = np.asarray(uniforms) * (len(self.quantiles) - 1)
+        index = np.minimum(position.astype(np.intp), len(self.quantiles) - 2)
+        low = self.quantiles[index]
+        return low + (position - index) * (self.quantiles[index + 1] - low)
+
+    def save(self, filename):
+        """Saves the table to a NumPy `npz` file.
+        """
+        with open(filename, 'wb') as fh:
+            np.savez(fh, radius_user=self.radius_user, radius_uav=self.radius_uav,
+                     quantiles=self.quantiles)
+
+    @classmethod
+    def load(cls, filename):
+        """Loads a table saved with `save()`.
+        """
+        with np.load(filename) as data:
+            return cls(float(data['radius_user']), float(data['radius_uav']), data['quantiles'])
+
+
+def horizontal_cdf(squared_distances, radius_user, radius_uav):
+    """Returns the distribution function of the squared horizontal distance between the UAV and
+    a user: the fraction of the cell within each distance of the UAV, i.e. the area of the
+    intersection of the cell and a circle around the UAV, over the area of the cell.
+    """
+    rho = np.sqrt(np.asarray(squared_distances, dtype=float))
+    R, d = radius_user, radius_uav
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Area of the lens where both circles overlap
+        lens = (rho ** 2 * np.arccos(np.clip((d ** 2 + rho ** 2 - R ** 2) / (2 * d * rho), -1, 1))
+                + R ** 2 * np.arccos(np.clip((d ** 2 + R ** 2 - rho ** 2) / (2 * d * R), -1, 1))
+                - 0.5 * np.sqrt(np.maximum((-d + rho + R) * (d + rho - R) * (d - rho + R) * (d + rho + R), 0)))
+    area = np.where(rho + d <= R, np.pi * rho ** 2,
+                    np.where(rho >= R + d, np.pi * R ** 2, np.where(rho <= d - R, 0.0, lens)))
+    return np.clip(area / (np.pi * R ** 2), 0, 1)
+
+
+def create_table(radius_user, radius_uav, size=table_size):
+    """Computes the table of the squared horizontal distance for the given radii.
+    """
+    if radius_user <= 0 or radius_uav < 0:
+        raise ValueError("Radii must be (radius_user > 0, radius_uav >= 0)")
+    low = max(radius_uav - radius_user, 0.0) ** 2
+    high = (radius_user + radius_uav) ** 2
+    points = np.linspace(low, high, cdf_points)
+    cdf = horizontal_cdf(points, radius_user, radius_uav)
+    cdf[0], cdf[-1] = 0.0, 1.0
+    quantiles = np.interp(np.linspace(0, 1, size), cdf, points)
+    return GeometryTable(float(radius_user), float(radius_uav), quantiles)
+
+
+def geometry_table(radius_user, radius_uav, cache_dir=None):
+    """Returns the table of the squared horizontal distance for the given radii, computed once
+    per process. If a cache directory is given, or set in the module's `cache_dir`, the table is
+    loaded from it if it was saved before, otherwise it is saved in it.
+    """
+    return cached_table(float(radius_user), float(radius_uav), cache_dir or globals()['cache_dir'])
+
+
+@functools.lru_cache(maxsize=16)
+def cached_table(radius_user, radius_uav, cache_dir):
+    """Returns the table of the given radii, from the cache directory if possible.
+    """
+    if cache_dir is None:
+        return create_table(radius_user, radius_uav)
+    filename = os.path.join(cache_dir, f'geometry_{radius_user!r}_{radius_uav!r}_{table_size}.npz')
+    try:
+        return GeometryTable.load(filename)
+    except (OSError, ValueError, KeyError):
+        pass
+    table = create_table(radius_user, radius_uav)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first, so that concurrent runs never read a partial table
+    temporary = f'{filename}.{os.getpid()}.tmp'
+    table.save(temporary)
+    os.replace(temporary, filename)
+    return table
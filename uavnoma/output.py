@@ -0,0 +1,432 @@
+"""
+    This module contains functions to save and load simulation results in several file
+    formats, as well as writers which stream the raw data of each Monte Carlo sample to disk.
+
+    Supported formats are `csv`, `npz`, `parquet` (requires `pyarrow`) and `hdf5` (requires
+    `h5py`). Except for CSV, files embed a metadata dictionary with the simulation parameters,
+    seed and package version, so that they are self-describing.
+
+    Results are tables of columns, either dictionaries of arrays or a `ResultTable`, which keeps
+    all the columns in a single array and doesn't require pandas, although it can be converted to
+    a pandas `DataFrame` without copying.
+"""
+
+import csv
+import json
+import zipfile
+from collections.abc import Mapping
+import numpy as np
+
+formats = ["csv", "npz", "parquet", "hdf5"]
+
+# Number of samples buffered in memory by raw data writers before writing them to disk
+raw_chunk_size = 4096
+
+def package_version():
+    """Returns the installed version of the uavnoma package, or `"unknown"` if it is not installed.
+    """
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError: # pragma: no cover
+        return "unknown"
+    try:
+        return version("uavnoma")
+    except PackageNotFoundError: # pragma: no cover
+        return "unknown"
+
+
+class ResultTable(Mapping):
+    """Table of numeric results, e.g. the SNR values and the average of each metric, with all
+    its columns stored in a single 2-D array, `data`, whose rows are the columns of the table.
+    It is a read-only mapping of column names to views of the array, so it can be used wherever
+    a dictionary of columns is, e.g. in `save_results()` or `tabulate`.
+
+    Arguments:
+
+        columns -- dictionary of column name to 1-D array, all of the same length.
+    """
+    __slots__ = ('names', 'data', '_index')
+
+    def __init__(self, columns):
+        self.names = list(columns)
+        self.data = np.array([np.asarray(values, dtype=float) for values in columns.values()])
+        if not self.names:
+            self.data = np.zeros((0, 0))
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+    def __getitem__(self, name):
+        return self.data[self._index[name]]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        import tabulate
+        return tabulate.tabulate(self, headers='keys', tablefmt='psql')
+
+    @property
+    def num_rows(self):
+        """Number of rows of the table, e.g. of SNR values.
+        """
+        return self.data.shape[1]
+
+    def to_pandas(self):
+        """Returns the table as a pandas `DataFrame` which shares the memory of the table.
+        """
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError("converting results to a DataFrame requires the pandas package")
+        return pd.DataFrame(self.data.T, columns=self.names, copy=False)
+
+
+def check_format(file_format):
+    """Checks that a file format is supported and that its optional dependencies are installed.
+
+    Arguments:
+
+        file_format -- one of `csv`, `npz`, `parquet` or `hdf5`.
+
+    Raises `ValueError` for unknown formats and `ImportError` for missing dependencies.
+    """
+    if file_format not in formats:
+        raise ValueError(f"unknown file format '{file_format}'")
+    if file_format == "parquet":
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("the parquet format requires the pyarrow package")
+    if file_format == "hdf5":
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("the hdf5 format requires the h5py package")
+
+
+def save_results(filename, columns, metadata, file_format="csv"):
+    """Saves the simulation results to a file.
+
+    Arguments:
+
+        filename -- name of the file.
+
+        columns -- dictionary of column name to 1-D array, e.g. the average values of the
+        metrics for each SNR value.
+
+        metadata -- dictionary with information on the simulation (parameters, seed, etc.),
+        which is embedded in the file, except for CSV.
+
+        file_format -- one of `csv`, `npz`, `parquet` or `hdf5`.
+    """
+    check_format(file_format)
+    metadata = dict(metadata, uavnoma_version=package_version())
+
+    if file_format == "csv":
+        write_csv(filename, columns)
+
+    elif file_format == "npz":
+        with open(filename, "wb") as fh:
+            np.savez(fh, metadata=np.array(json.dumps(metadata)),
+                     **{name: np.asarray(values) for name, values in columns.items()})
+
+    elif file_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.table({name: np.asarray(values) for name, values in columns.items()})
+        table = table.replace_schema_metadata({"uavnoma": json.dumps(metadata)})
+        pq.write_table(table, filename)
+
+    elif file_format == "hdf5":
+        import h5py
+        with h5py.File(filename, "w", track_order=True) as fh:
+            fh.attrs["uavnoma"] = json.dumps(metadata)
+            for name, values in columns.items():
+                values = np.asarray(values)
+                if values.dtype.kind == "U":
+                    # HDF5 stores text as variable-length UTF-8 strings
+                    fh.create_dataset(name, data=values.astype(object), dtype=h5py.string_dtype())
+                else:
+                    fh.create_dataset(name, data=values)
+
+
+def load_results(filename, file_format="csv"):
+    """Loads simulation results saved with `save_results()` or written by a `RawWriter`.
+
+    Arguments:
+
+        filename -- name of the file.
+
+        file_format -- one of `csv`, `npz`, `parquet` or `hdf5`.
+
+    Return:
+
+        columns -- dictionary of column name to array.
+
+        metadata -- dictionary with the embedded metadata (empty for CSV files).
+    """
+    check_format(file_format)
+
+    if file_format == "csv":
+        return read_csv(filename), {}
+
+    elif file_format == "npz":
+        with np.load(filename, allow_pickle=False) as data:
+            metadata = json.loads(str(data["metadata"]))
+            columns = {}
+            for name in data.files:
+                if name == "metadata":
+                    continue
+                values = data[name]
+                if values.dtype.names is not None:
+                    # Raw data is stored as a single structured array
+                    columns.update({field: values[field] for field in values.dtype.names})
+                else:
+                    columns[name] = values
+        return columns, metadata
+
+    elif file_format == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(filename)
+        metadata = json.loads(table.schema.metadata[b"uavnoma"])
+        columns = {}
+        for name in table.column_names:
+            column = table.column(name).combine_chunks()
+            if hasattr(column.type, "list_size"):
+                columns[name] = column.flatten().to_numpy().reshape(len(column), column.type.list_size)
+            elif column.type == "string":
+                columns[name] = column.to_numpy(zero_copy_only=False).astype(str)
+            else:
+                columns[name] = column.to_numpy()
+        return columns, metadata
+
+    elif file_format == "hdf5":
+        import h5py
+        with h5py.File(filename, "r") as fh:
+            metadata = json.loads(fh.attrs["uavnoma"])
+            columns = {}
+            for name in fh.keys():
+                dataset = fh[name]
+                if h5py.check_string_dtype(dataset.dtype) is not None:
+                    columns[name] = dataset.asstr()[()].astype(str)
+                else:
+                    columns[name] = dataset[()]
+        return columns, metadata
+
+
+def write_csv(filename, columns):
+    """Writes a table of columns to a CSV file, with a header with the column names. Numbers are
+    written with the shortest representation which reads back exactly, and NaN as empty fields.
+    """
+    def fields(values):
+        values = np.asarray(values)
+        if values.dtype.kind == "f":
+            return ["" if np.isnan(value) else repr(value) for value in values.tolist()]
+        return values.tolist()
+
+    with open(filename, "w", newline="") as fh:
+        writer = csv.writer(fh, lineterminator="\n")
+        writer.writerow(list(columns))
+        writer.writerows(zip(*(fields(values) for values in columns.values())))
+
+
+def read_csv(filename):
+    """Reads a table written by `write_csv()`, or any CSV file with a header, returning a
+    dictionary of columns: integer columns as integers, other numeric columns as floats (empty
+    fields are NaN) and the rest as strings.
+    """
+    with open(filename, newline="") as fh:
+        reader = csv.reader(fh)
+        header = next(reader, [])
+        rows = list(reader)
+    columns = {}
+    for i, name in enumerate(header):
+        values = np.array([row[i] if i < len(row) else "" for row in rows], dtype=str)
+        try:
+            columns[name] = values.astype(np.int64)
+        except ValueError:
+            try:
+                columns[name] = np.where(values == "", "nan", values).astype(float)
+            except ValueError:
+                columns[name] = values
+    return columns
+
+
+def raw_writer(filename, metadata, num_samples, num_snr, file_format="csv"):
+    """Returns a writer which streams the raw data of each Monte Carlo sample to a file.
+
+    Data is kept in a buffer of `raw_chunk_size` samples, which is written to disk each time
+    it fills up, so memory usage does not depend on the number of samples. Each sample has the
+    channel gains of both users (`gain_usr1`, `gain_usr2`) and their instantaneous rates for
+    each SNR value (`rate_usr1`, `rate_usr2`).
+
+    Arguments:
+
+        filename -- name of the file.
+
+        metadata -- dictionary with information on the simulation, embedded in the file.
+
+        num_samples -- total number of samples which will be written.
+
+        num_snr -- number of SNR values.
+
+        file_format -- one of `csv`, `npz`, `parquet` or `hdf5`.
+
+    Return:
+
+        writer -- a `RawWriter`, to be closed after writing all samples.
+    """
+    check_format(file_format)
+    metadata = dict(metadata, uavnoma_version=package_version())
+    writers = {"csv": RawWriterCSV, "npz": RawWriterNPZ,
+               "parquet": RawWriterParquet, "hdf5": RawWriterHDF5}
+    return writers[file_format](filename, metadata, num_samples, num_snr)
+
+
+class RawWriter:
+    """Base class of the raw data writers, which buffers samples and writes them in chunks.
+    """
+
+    def __init__(self, filename, metadata, num_samples, num_snr):
+        self.filename = filename
+        self.metadata = metadata
+        self.num_samples = num_samples
+        self.num_snr = num_snr
+        self.samples_written = 0
+        self.dtype = np.dtype([("gain_usr1", "f8"), ("gain_usr2", "f8"),
+                               ("rate_usr1", "f8", (num_snr,)), ("rate_usr2", "f8", (num_snr,))])
+        self.buffer = np.zeros(raw_chunk_size, dtype=self.dtype)
+        self.buffered = 0
+        self.open()
+
+    def write(self, gain_primary, gain_secondary, rate_primary, rate_secondary):
+        """Adds the raw data of one sample, writing the buffer to disk if it is full.
+        """
+        row = self.buffer[self.buffered]
+        row["gain_usr1"] = gain_primary
+        row["gain_usr2"] = gain_secondary
+        row["rate_usr1"] = rate_primary
+        row["rate_usr2"] = rate_secondary
+        self.buffered += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered samples to disk.
+        """
+        if self.buffered > 0:
+            self.write_chunk(self.buffer[:self.buffered])
+            self.samples_written += self.buffered
+            self.buffered = 0
+
+    def close(self):
+        """Writes any buffered samples and closes the file.
+        """
+        self.flush()
+        if self.samples_written != self.num_samples:
+            raise ValueError(f"{self.samples_written} samples written, {self.num_samples} expected")
+        self.finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.finish()
+
+
+class RawWriterCSV(RawWriter):
+    """Raw data writer for CSV files, with one column per user and SNR index.
+    """
+
+    def open(self):
+        self.fh = open(self.filename, "w")
+        header = ["gain_usr1", "gain_usr2"]
+        header += [f"rate_usr1_{i}" for i in range(self.num_snr)]
+        header += [f"rate_usr2_{i}" for i in range(self.num_snr)]
+        self.fh.write(",".join(header) + "\n")
+
+    def write_chunk(self, chunk):
+        np.savetxt(self.fh, np.c_[chunk["gain_usr1"], chunk["gain_usr2"],
+                                  chunk["rate_usr1"], chunk["rate_usr2"]], delimiter=",")
+
+    def finish(self):
+        self.fh.close()
+
+
+class RawWriterNPZ(RawWriter):
+    """Raw data writer for NPZ files, storing a single structured array named `raw`.
+    """
+
+    def open(self):
+        self.zip = zipfile.ZipFile(self.filename, "w")
+        with self.zip.open("metadata.npy", "w") as fh:
+            np.lib.format.write_array(fh, np.array(json.dumps(self.metadata)))
+        # The array header can be written in advance, since the number of samples is known
+        self.fh = self.zip.open("raw.npy", "w", force_zip64=True)
+        np.lib.format.write_array_header_2_0(self.fh, {
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (self.num_samples,),
+        })
+
+    def write_chunk(self, chunk):
+        self.fh.write(chunk.tobytes())
+
+    def finish(self):
+        self.fh.close()
+        self.zip.close()
+
+
+class RawWriterParquet(RawWriter):
+    """Raw data writer for Parquet files, with rates stored as fixed-size list columns.
+    """
+
+    def open(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.schema = pa.schema([
+            ("gain_usr1", pa.float64()), ("gain_usr2", pa.float64()),
+            ("rate_usr1", pa.list_(pa.float64(), self.num_snr)),
+            ("rate_usr2", pa.list_(pa.float64(), self.num_snr)),
+        ], metadata={"uavnoma": json.dumps(self.metadata)})
+        self.writer = pq.ParquetWriter(self.filename, self.schema)
+
+    def write_chunk(self, chunk):
+        import pyarrow as pa
+        rates = [pa.FixedSizeListArray.from_arrays(np.ascontiguousarray(chunk[name]).ravel(),
+                                                   self.num_snr)
+                 for name in ("rate_usr1", "rate_usr2")]
+        self.writer.write_table(pa.Table.from_arrays(
+            [pa.array(chunk["gain_usr1"]), pa.array(chunk["gain_usr2"])] + rates,
+            schema=self.schema))
+
+    def finish(self):
+        self.writer.close()
+
+
+class RawWriterHDF5(RawWriter):
+    """Raw data writer for HDF5 files, with one dataset per field.
+    """
+
+    def open(self):
+        import h5py
+        self.fh = h5py.File(self.filename, "w", track_order=True)
+        self.fh.attrs["uavnoma"] = json.dumps(self.metadata)
+        for name in ("gain_usr1", "gain_usr2"):
+            self.fh.create_dataset(name, shape=(self.num_samples,), dtype="f8")
+        for name in ("rate_usr1", "rate_usr2"):
+            self.fh.create_dataset(name, shape=(self.num_samples, self.num_snr), dtype="f8",
+                                   chunks=(min(raw_chunk_size, max(self.num_samples, 1)), self.num_snr))
+
+    def write_chunk(self, chunk):
+        start = self.samples_written
+        for name in self.dtype.names:
+            self.fh[name][start:start + len(chunk)] = chunk[name]
+
+    def finish(self):
+        self.fh.close()
@@ -0,0 +1,217 @@
+"""
+    This module contains the parallel engine, which performs a simulation in several worker
+    processes, each one performing a contiguous group of blocks of samples with their own random
+    streams, as the shards of a sharded simulation (see `--shard`). Workers draw the random values
+    of each block from the same streams, and in the same order, as a sharded simulation (see
+    `uavnoma.simulation.stream_values()`), and evaluate the channel gains and the sums of the
+    metrics of all samples of the block at once (see `uavnoma.simulation.MetricKernel`). So the
+    results are those of the same simulation run as a single shard (`'0/1'`), up to rounding
+    errors of the vectorized evaluation (relative differences of about 1e-15), and the final
+    state of the generator is the same.
+
+    The buffers written by the workers, i.e. the sums of each block of samples, the channel
+    gains of each sample (if they are stored) and the counts of the distribution sketches of each
+    worker, are NumPy arrays in `multiprocessing.shared_memory` blocks created by the parent
+    process. Workers attach to the blocks and write their results in place, so no arrays are
+    pickled between processes, and the parent reads them when all workers finish. The parent
+    owns the blocks and always unlinks them, even if a worker crashes.
+
+    ```
+    from uavnoma import SimulationConfig
+    from uavnoma.parallel import run_parallel
+
+    result = run_parallel(SimulationConfig(monte_carlo_samples=100000, seed=1), workers=4)
+    ```
+"""
+
+import dataclasses
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from .simulation import SimulationResult, metric_names, seeded_state, new_state, sample_range
+from .simulation import create_sketches, batch_sampled, stream_values, channel_gains
+from .simulation import sample_metrics, update_sketches, MetricKernel
+
+
+class SharedArrays:
+    """NumPy arrays, filled with zeros, in shared memory blocks which other processes can
+    attach to with `attach_arrays()`. The blocks are unlinked when closed, or when leaving a
+    `with` statement, after which the arrays can't be used anymore.
+
+    Arguments:
+
+        shapes -- dictionary with the shape and data type of each array, by name.
+    """
+
+    def __init__(self, shapes):
+        self.blocks = {}
+        self.arrays = {}
+        try:
+            for name, (shape, dtype) in shapes.items():
+                size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+                self.blocks[name] = SharedMemory(create=True, size=max(size, 1))
+                self.arrays[name] = np.ndarray(shape, dtype, buffer=self.blocks[name].buf)
+                self.arrays[name][...] = 0
+        except BaseException:
+            self.close()
+            raise
+
+    def spec(self):
+        """Returns the names of the shared memory blocks and the shapes and data types of the
+        arrays, which is passed to other processes to attach to them.
+        """
+        return {name: (self.blocks[name].name, array.shape, array.dtype.str)
+                for name, array in self.arrays.items()}
+
+    def close(self):
+        """Releases the arrays and unlinks the shared memory blocks.
+        """
+        self.arrays = {}
+        close_blocks(self.blocks)
+        for block in self.blocks.values():
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach_arrays(spec):
+    """Attaches to the shared memory blocks of a `SharedArrays` in another process.
+
+    Return:
+
+        blocks -- dictionary with the shared memory blocks, which must be closed when done.
+
+        arrays -- dictionary with the arrays, which must be released before closing the blocks.
+    """
+    blocks = {}
+    try:
+        for name, (block_name, _, _) in spec.items():
+            blocks[name] = SharedMemory(name=block_name)
+    except BaseException:
+        close_blocks(blocks)
+        raise
+    arrays = {name: np.ndarray(shape, dtype, buffer=blocks[name].buf)
+              for name, (_, shape, dtype) in spec.items()}
+    return blocks, arrays
+
+
+def close_blocks(blocks):
+    """Closes shared memory blocks, without unlinking them.
+    """
+    for block in blocks.values():
+        try:
+            block.close()
+        except BufferError:
+            # Arrays are still referenced, e.g. by a traceback; the mapping is released at exit
+            pass
+
+
+def run_parallel(config, workers=None):
+    """Performs a simulation in several worker processes and returns its results, which are
+    those of `run_simulation()` with the configuration as a single shard (`'0/1'`), up to
+    rounding errors.
+
+    Simulations without a seed are given a random one, so that the blocks of samples have
+    independent random streams. Simulations whose samples are drawn at once (with the `sobol`
+    sampler, antithetic or control variates) can't be run in parallel.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation, which must not be sharded.
+
+        workers -- number of worker processes, by default the number of CPUs, at most the
+        number of blocks of samples.
+
+    Return:
+
+        result -- a `SimulationResult`, whose configuration is that of the single shard.
+    """
+    if config.shard is not None:
+        raise ValueError("Parallel simulations can't be sharded")
+    if batch_sampled(config):
+        raise ValueError("Parallel simulations can't use the sobol sampler, antithetic or control variates")
+    workers = workers or os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("Number of workers must be (value >= 1)")
+    if config.seed is None:
+        config = dataclasses.replace(config, seed=int(np.random.randint(2 ** 31 - 1)))
+    config = dataclasses.replace(config, shard='0/1')
+
+    num_blocks = -(-config.monte_carlo_samples // config.block_size)
+    num_tasks = min(workers, num_blocks)
+    num_snr = config.snr_samples
+    shapes = {'block_sums': ((len(metric_names), num_blocks, num_snr), np.float64)}
+    if config.store_gains:
+        shapes['gains'] = ((2, config.monte_carlo_samples), np.float64)
+    if config.sketches:
+        for name, sketch in create_sketches(num_snr).items():
+            shapes['sketch_' + name] = ((num_tasks,) + sketch.counts.shape, np.int64)
+
+    with SharedArrays(shapes) as shared:
+        with ProcessPoolExecutor(num_tasks) as executor:
+            futures = [executor.submit(run_shard, config, shared.spec(), task, num_tasks)
+                       for task in range(num_tasks)]
+            rng_states = [future.result() for future in futures]
+
+        # The state of the simulation as a single shard, read from the shared buffers
+        state = seeded_state(config)
+        state['block_sums'] = {name: shared.arrays['block_sums'][m].copy()
+                               for m, name in enumerate(metric_names)}
+        if config.store_gains:
+            state['gains_primary'] = shared.arrays['gains'][0].copy()
+            state['gains_secondary'] = shared.arrays['gains'][1].copy()
+        if config.sketches:
+            state['sketches'] = create_sketches(num_snr, {
+                name: shared.arrays['sketch_' + name].sum(axis=0) for name in state['sketches']})
+        state['samples_done'] = config.monte_carlo_samples
+        state['rng_state'] = rng_states[-1]
+    return SimulationResult(config, state)
+
+
+def run_shard(config, spec, task, num_tasks):
+    """Performs the blocks of samples of a worker, as the shard `task` of `num_tasks`, writing
+    its results in the shared buffers. Returns the final state of the generator.
+    """
+    blocks, arrays = attach_arrays(spec)
+    try:
+        shard_config = dataclasses.replace(config, shard=f'{task}/{num_tasks}')
+        state = new_state(shard_config)
+        rng = np.random.RandomState()
+        rng.set_state(state['rng_state'])
+        snr_linear = 10.0 ** (state['snr_dB'] / 10.0)
+        first_sample, last_sample = sample_range(shard_config)
+        block_size = config.block_size
+
+        # Each block of samples is evaluated at once, writing in place in the shared buffers
+        kernel = MetricKernel(config, snr_linear)
+        sketches = None
+        if config.sketches:
+            sketches = create_sketches(config.snr_samples, {
+                name: arrays['sketch_' + name][task] for name in state['sketches']})
+        for first in range(first_sample, last_sample, block_size):
+            block, last = first // block_size, min(first + block_size, last_sample)
+            uniforms, normals = stream_values(shard_config, first, last, rng)
+            gains_primary, gains_secondary, _ = channel_gains(config, uniforms, normals)
+            if sketches is None:
+                kernel.sums(gains_primary, gains_secondary, out=arrays['block_sums'][:, block])
+            else:
+                metrics = sample_metrics(config, gains_primary, gains_secondary, snr_linear)
+                for m, name in enumerate(metric_names):
+                    arrays['block_sums'][m, block] = metrics[name].sum(axis=0)
+                update_sketches(sketches, metrics, gains_primary, gains_secondary)
+            if config.store_gains:
+                arrays['gains'][0, first:last] = gains_primary
+                arrays['gains'][1, first:last] = gains_secondary
+        del state, sketches, arrays
+        return rng.get_state()
+    finally:
+        close_blocks(blocks)
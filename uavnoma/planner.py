@@ -0,0 +1,265 @@
+"""
+    This module contains a planner which predicts the peak memory and the wall time of a
+    simulation before running it, so that runs which would take too long or exhaust the memory
+    can be adjusted beforehand.
+
+    Memory is estimated from the sizes of the arrays kept by the simulation, which for
+    simulations whose samples are drawn at once (see `uavnoma.simulation.batch_sampled()`) are
+    dominated by the (samples x SNR values) matrices of the metrics. The execution engines of the
+    script (see `engines`) also keep buffers of random values, channel gains and metrics for each
+    block of samples in each worker process or thread, and the sums of all blocks. Time is
+    estimated from a quick calibration run of a few samples of the same configuration on this
+    machine.
+"""
+
+import dataclasses
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+import numpy as np
+from .output import raw_chunk_size
+from .simulation import run_simulation, sample_range, batch_sampled, create_sketches
+from .simulation import metric_names, kernel_tile_memory
+
+# Bytes of a float64 value
+float_size = 8
+
+# Target duration in seconds of each chunk of an asynchronous or checkpointed simulation
+chunk_duration = 1.0
+
+# Target duration in seconds of each worker (shard) of a long simulation
+worker_duration = 60.0
+
+# Fraction of the memory budget above which a warning is given
+budget_warning = 0.8
+
+# Execution engines: the simulation loop, worker processes (`uavnoma.parallel`), the pipeline
+# (`uavnoma.pipeline`) and threads (`uavnoma.threads`)
+engines = ['serial', 'parallel', 'pipeline', 'threads']
+
+# Default number of buffers of random values of the pipelined engine
+pipeline_buffers = 2
+
+
+@dataclass
+class Plan:
+    """Predicted resources of a simulation.
+
+    Attributes:
+
+        samples -- number of Monte Carlo samples to perform.
+
+        peak_memory -- estimated peak memory of the simulation data, in bytes.
+
+        seconds_per_sample -- measured (or, without calibration, typical) time per sample.
+
+        wall_time -- estimated wall time in seconds, with a single worker.
+
+        chunk_size -- recommended number of samples per chunk (e.g. for `--checkpoint-every` or
+        `uavnoma.simulation.iter_simulation()`), about one second of work.
+
+        workers -- recommended number of workers (shards, see `--shard`) to run in parallel.
+
+        memory_budget -- memory budget in bytes, or `None`.
+
+        warnings -- list of warning messages.
+    """
+    samples: int
+    peak_memory: int
+    seconds_per_sample: float
+    wall_time: float
+    chunk_size: int
+    workers: int
+    memory_budget: Optional[int] = None
+    warnings: List[str] = field(default_factory=list)
+
+    @property
+    def exceeds_budget(self):
+        """Whether the estimated peak memory exceeds the memory budget.
+        """
+        return self.memory_budget is not None and self.peak_memory > self.memory_budget
+
+
+def plan(config, memory_budget=None, calibrate=True, raw_output=False, engine='serial',
+         parallelism=None):
+    """Predicts the resources needed by a simulation.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        memory_budget -- maximum memory for the simulation data in bytes, or `None` to compare
+        with the physical memory of the machine.
+
+        calibrate -- whether to measure the time per sample with a short run of the same
+        configuration; otherwise, or if the configuration has too many replicates for a short
+        run, a typical value is used. The global generator state is preserved.
+
+        raw_output -- whether the raw data of each sample is streamed to a file.
+
+        engine -- execution engine which performs the simulation, one of `engines`.
+
+        parallelism -- number of worker processes of the `parallel` engine, threads of the
+        `threads` engine (by default the number of CPUs), or buffers of the `pipeline` engine.
+
+    Return:
+
+        plan -- a `Plan`.
+    """
+    first_sample, last_sample = sample_range(config)
+    samples = last_sample - first_sample
+    peak_memory = estimate_memory(config, samples, raw_output, engine, parallelism)
+    seconds_per_sample = calibrate_time(config) if calibrate else typical_time(config)
+    wall_time = seconds_per_sample * samples
+
+    chunk_size = int(min(samples, max(1, chunk_duration / seconds_per_sample)))
+    workers = 1
+    if not batch_sampled(config) and config.seed is not None:
+        # Sharded simulations split the samples in blocks, which are the unit of work
+        num_blocks = -(-config.monte_carlo_samples // config.block_size)
+        workers = max(1, min(os.cpu_count() or 1, num_blocks, math.ceil(wall_time / worker_duration)))
+
+    result = Plan(samples, peak_memory, seconds_per_sample, wall_time, chunk_size, workers,
+                  memory_budget)
+    if memory_budget is not None:
+        if peak_memory > memory_budget:
+            result.warnings.append(f"Estimated memory {format_bytes(peak_memory)} exceeds the "
+                                   f"budget of {format_bytes(memory_budget)}")
+        elif peak_memory > budget_warning * memory_budget:
+            result.warnings.append(f"Estimated memory {format_bytes(peak_memory)} is close to the "
+                                   f"budget of {format_bytes(memory_budget)}")
+    else:
+        physical = physical_memory()
+        if physical is not None and peak_memory > budget_warning * physical:
+            result.warnings.append(f"Estimated memory {format_bytes(peak_memory)} is close to or "
+                                   f"exceeds the physical memory of {format_bytes(physical)}")
+    if batch_sampled(config) and peak_memory > 2 ** 30:
+        result.warnings.append("All samples are drawn at once with the sobol sampler, antithetic or "
+                               "control variates; reduce the samples or SNR values to save memory")
+    return result
+
+
+def estimate_memory(config, samples, raw_output=False, engine='serial', parallelism=None):
+    """Returns the estimated peak memory in bytes of the data of a simulation with the given
+    number of samples, performed by the given engine (see `plan()`).
+    """
+    if engine not in engines:
+        raise ValueError(f"Engine must be one of {', '.join(engines)}")
+    if parallelism is not None and parallelism < 1:
+        raise ValueError("Number of workers, threads or buffers must be (value >= 1)")
+    if engine != 'serial':
+        return engine_memory(config, engine, parallelism)
+
+    num_snr = config.snr_samples
+    memory = 6 * num_snr * float_size  # Sums of the metrics
+    if config.shard is not None:
+        memory += 6 * -(-samples // config.block_size) * num_snr * float_size
+    if config.sketches:
+        memory += sum(sketch.counts.nbytes for sketch in create_sketches(num_snr).values())
+    if raw_output:
+        memory += raw_chunk_size * (2 + 2 * num_snr) * float_size
+    if batch_sampled(config):
+        # Uniform, normal and control values and the intermediate geometry of each sample
+        memory += 40 * samples * float_size
+        # Metrics of each sample and SNR value, their temporaries and their adjusted values
+        matrices = 9 + (6 if config.control_variates else 0)
+        memory += matrices * samples * num_snr * float_size
+        if config.store_gains:
+            memory += 2 * samples * float_size
+    elif config.store_gains:
+        # The stored gains are copied when room is made for new samples
+        memory += 4 * samples * float_size
+    return int(memory)
+
+
+def engine_memory(config, engine, parallelism=None):
+    """Returns the estimated peak memory in bytes of a (non-sharded) simulation performed by an
+    execution engine other than the simulation loop.
+    """
+    num_snr = config.snr_samples
+    num_samples = config.monte_carlo_samples
+    num_blocks = -(-num_samples // config.block_size)
+    block_size = min(config.block_size, num_samples)
+    sketches = 0
+    if config.sketches:
+        sketches = sum(sketch.counts.nbytes for sketch in create_sketches(num_snr).values())
+
+    # Sums of the metrics of each block, and the stored gains, filled in place
+    memory = len(metric_names) * num_blocks * num_snr * float_size
+    if config.store_gains:
+        memory += 2 * num_samples * float_size
+
+    # Each worker, thread, or the consumer of the pipeline, evaluates a block at once: its
+    # intermediate geometry and channel gains, and the buffers of the metric kernel or, with
+    # sketches, the metrics of each sample and SNR value and their temporaries
+    if config.sketches:
+        evaluation = 32 * block_size * float_size + 12 * block_size * num_snr * float_size + sketches
+    else:
+        tile_size = max(1, kernel_tile_memory // (float_size * max(num_snr, 1)))
+        evaluation = 32 * block_size * float_size + (8 * tile_size + 6) * num_snr * float_size
+    # Uniform and normal values of each block
+    buffer = 10 * block_size * float_size
+    if engine == 'pipeline':
+        buffers = parallelism or pipeline_buffers
+        return int(memory + buffers * buffer + evaluation)
+    if engine == 'parallel':
+        # The shared memory blocks, including the sketches of each worker, are copied by the parent
+        workers = min(parallelism or os.cpu_count() or 1, num_blocks)
+        return int(2 * memory + workers * (buffer + evaluation) + sketches)
+    threads = min(parallelism or os.cpu_count() or 1, num_blocks)
+    return int(memory + threads * (buffer + evaluation) + sketches)
+
+
+def typical_time(config):
+    """Returns a typical time per sample in seconds, used without calibration.
+    """
+    if batch_sampled(config):
+        return 2e-6 * config.snr_samples + 2e-5
+    return 1.2e-5 * config.snr_samples + 6e-5
+
+
+def calibrate_time(config, samples=256):
+    """Measures the time per sample of a configuration with a short simulation on this machine,
+    preserving the state of the global generator.
+    """
+    if batch_sampled(config):
+        # Enough samples for the vectorized evaluation to dominate, respecting the replicates and
+        # antithetic pairs. Simulations with more replicates than that can't be calibrated with
+        # a short run
+        multiple = (config.replicates if config.sampler == 'sobol' else 1) * (2 if config.antithetic else 1)
+        if multiple > max(samples * 16, 100):
+            return typical_time(config)
+        samples = multiple * math.ceil(max(samples * 16, 100) / multiple)
+    else:
+        samples = max(samples, 100)
+    calibration = dataclasses.replace(config, monte_carlo_samples=samples, shard=None,
+                                      store_gains=False)
+    rng_state = np.random.get_state()
+    try:
+        start = time.perf_counter()
+        run_simulation(calibration)
+        elapsed = time.perf_counter() - start
+    finally:
+        np.random.set_state(rng_state)
+    return elapsed / samples
+
+
+def physical_memory():
+    """Returns the physical memory of the machine in bytes, or `None` if it is unknown.
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def format_bytes(size):
+    """Returns a size in bytes as a human readable string.
+    """
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
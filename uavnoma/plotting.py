@@ -0,0 +1,204 @@
+"""
+    This module contains the rendering of the figures of simulation results to files: the
+    outage probability (`outage`) and the average achievable rate (`rate`) of the users as a
+    function of the SNR, the same figures shown by `uavnoma --plot`.
+
+    Figures are created without pyplot, so rendering is headless and doesn't depend on the
+    matplotlib backend or on a display. A `FigureTemplate` creates the figures once and only
+    updates their data for each result, which is much faster than creating them anew when
+    rendering many results, e.g. those of a sweep. `FigureRenderer` renders the figures of many
+    results in a pool of worker processes, each with its own template, so that rendering runs
+    in the background, e.g. while the next simulations are performed:
+
+    ```
+    from uavnoma.plotting import FigureRenderer
+
+    with FigureRenderer('png') as renderer:
+        for name, result in results.items():
+            renderer.submit(result.columns(), f'figures/{name}')
+    print(renderer.files)
+    ```
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from matplotlib.figure import Figure
+
+figure_formats = ['png', 'svg', 'pdf']
+
+# Names of the figures, which suffix the names of their files
+figure_names = ['outage', 'rate']
+
+# Template of each thread of the current process, created when first used
+templates = threading.local()
+
+
+def draw_outage(ax, snr_dB, out_prob_primary, out_prob_secondary):
+    """Plots the outage probability of the users in the given axes, returning the lines.
+    """
+    lines = [ax.semilogy(snr_dB, out_prob_primary, "b.-", label="Primary user", linewidth=1)[0],
+             ax.semilogy(snr_dB, out_prob_secondary, "r.-", label="Secondary user", linewidth=1)[0]]
+    ax.set_xlabel("SNR (dB)")
+    ax.set_ylabel("Outage Probability")
+    ax.legend(loc="lower left")
+    ax.set_xlim(snr_dB[0], snr_dB[outage_limit(out_prob_primary, out_prob_secondary)])
+    return lines
+
+
+def draw_rate(ax, snr_dB, rate_mean_primary_user, rate_mean_secondary_user):
+    """Plots the average achievable rate of the users in the given axes, returning the lines.
+    """
+    lines = [ax.plot(snr_dB, rate_mean_primary_user, "b.-", label="primary user", linewidth=1)[0],
+             ax.plot(snr_dB, rate_mean_secondary_user, "r.-", label="secondary user", linewidth=1)[0]]
+    ax.set_xlabel("SNR (dB)")
+    ax.set_ylabel("Achievable rate (bits/s/Hz)")
+    ax.legend(loc="upper left")
+    ax.set_xlim(snr_dB[0], snr_dB[-1])
+    return lines
+
+
+def outage_limit(out_prob_primary, out_prob_secondary):
+    """Returns the highest index of the SNR values to show in the outage probability figure,
+    excluding the trailing values where both probabilities are 0.
+    """
+    i_max = len(out_prob_primary) - 1
+    for i in range(len(out_prob_primary) - 1, 0, -1):
+        if out_prob_primary[i] == 0 and out_prob_secondary[i] == 0:
+            i_max = i
+        else:
+            break
+    return i_max
+
+
+class FigureTemplate:
+    """Figures of the results of a simulation, created once and updated with the results of
+    each simulation to render.
+    """
+
+    def __init__(self):
+        self.figures = {}
+        self.lines = {}
+        snr_dB, values = np.array([0.0, 1.0]), np.array([1.0, 1.0])
+        for name, draw in zip(figure_names, [draw_outage, draw_rate]):
+            figure = Figure(figsize=(6.4, 4.8))
+            ax = figure.add_subplot()
+            self.figures[name] = figure
+            self.lines[name] = draw(ax, snr_dB, values, values)
+
+    def update(self, columns, title=None):
+        """Updates the figures with a table of results (see `uavnoma.SimulationResult.columns()`).
+        """
+        snr_dB = np.asarray(columns['snr_dB'])
+        data = {'outage': [columns['p_outage_usr1'], columns['p_outage_usr2']],
+                'rate': [columns['avg_arate_usr1'], columns['avg_arate_usr2']]}
+        for name, figure in self.figures.items():
+            ax = figure.axes[0]
+            for line, values in zip(self.lines[name], data[name]):
+                line.set_data(snr_dB, values)
+            ax.relim()
+            ax.autoscale_view()
+            last = outage_limit(*data[name]) if name == 'outage' else len(snr_dB) - 1
+            ax.set_xlim(snr_dB[0], snr_dB[last])
+            ax.set_title(title or '')
+
+    def save(self, basename, file_format='png'):
+        """Saves the figures to files named after `basename`, suffixed with the name of each
+        figure, returning the names of the files.
+        """
+        check_figure_format(file_format)
+        files = []
+        for name, figure in self.figures.items():
+            files.append(f"{basename}_{name}.{file_format}")
+            figure.savefig(files[-1])
+        return files
+
+
+def check_figure_format(file_format):
+    """Raises `ValueError` if a figure format is not supported.
+    """
+    if file_format not in figure_formats:
+        raise ValueError(f"unknown figure format '{file_format}', "
+                         f"it must be one of {', '.join(figure_formats)}")
+
+
+def plot_format(filename):
+    """Returns the format of a figure file, given by its extension, raising `ValueError` if it
+    is not supported.
+    """
+    file_format = os.path.splitext(filename)[1][1:].lower()
+    check_figure_format(file_format)
+    return file_format
+
+
+def render(columns, basename, file_format='png', title=None):
+    """Renders the figures of a table of results to files with the template of the current
+    thread, returning the names of the files.
+    """
+    if not hasattr(templates, 'template'):
+        templates.template = FigureTemplate()
+    templates.template.update(columns, title)
+    return templates.template.save(basename, file_format)
+
+
+def file_basename(directory, name):
+    """Returns the base name of the figure files of a result in a directory, with the characters
+    which aren't safe in file names replaced.
+    """
+    return os.path.join(directory, re.sub(r'[^\w.-]', '_', str(name)))
+
+
+class FigureRenderer:
+    """Renders the figures of many results in the background, in a pool of worker processes.
+    Use it as a context manager, which waits for all the figures when leaving it.
+
+    Arguments:
+
+        file_format -- format of the files: `png`, `svg` or `pdf`.
+
+        workers -- number of worker processes, by default the number of CPUs. With 1 worker,
+        figures are rendered in a thread of the current process.
+
+    Attributes:
+
+        files -- names of the files rendered so far.
+
+        failures -- dictionary with the error message of each base name whose figures failed.
+    """
+
+    def __init__(self, file_format='png', workers=None):
+        check_figure_format(file_format)
+        workers = workers or os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError("Number of workers must be (value >= 1)")
+        self.file_format = file_format
+        self.executor = ThreadPoolExecutor(1) if workers == 1 else ProcessPoolExecutor(workers)
+        self.futures = {}
+        self.files = []
+        self.failures = {}
+
+    def submit(self, columns, basename, title=None):
+        """Schedules the rendering of the figures of a table of results to files named after
+        `basename` (see `FigureTemplate.save()`).
+        """
+        columns = {name: np.asarray(values) for name, values in columns.items()}
+        self.futures[basename] = self.executor.submit(render, columns, basename, self.file_format, title)
+
+    def close(self):
+        """Waits for all the figures to be rendered and stops the workers.
+        """
+        for basename, future in self.futures.items():
+            try:
+                self.files += future.result()
+            except Exception as e:
+                self.failures[basename] = f"{type(e).__name__}: {e}"
+        self.futures = {}
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
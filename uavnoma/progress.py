@@ -0,0 +1,159 @@
+"""
+    This module contains the progress reporting of simulations, which is updated after each
+    chunk of samples, not after each sample, so that its overhead is negligible.
+
+    `run_simulation()` and `iter_simulation()` accept a `progress` callback, which receives a
+    `Progress` after each chunk. Two reporters are provided, which can be used as callbacks:
+    `ProgressLine`, which keeps a progress line updated in a terminal, and `ProgressJSONLines`,
+    which writes a JSON object per update to a file, for monitoring tools:
+
+    ```
+    from uavnoma import SimulationConfig, run_simulation
+    from uavnoma.progress import ProgressLine
+
+    result = run_simulation(SimulationConfig(monte_carlo_samples=100000), progress=ProgressLine())
+    ```
+"""
+
+import json
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass
+class Progress:
+    """Progress of a simulation after a chunk of samples.
+
+    Attributes:
+
+        samples_done -- number of samples performed, including those of a resumed simulation.
+
+        total_samples -- number of samples of the simulation.
+
+        elapsed -- time in seconds since the simulation (or its resumption) started.
+
+        samples_per_second -- throughput since the simulation (or its resumption) started.
+
+        eta -- estimated time in seconds until the simulation finishes, or `None` if unknown.
+
+        peak_rss -- peak resident memory of the process in bytes, or `None` if unknown.
+
+        result -- partial `uavnoma.SimulationResult`, with the current estimates.
+    """
+    samples_done: int
+    total_samples: int
+    elapsed: float
+    samples_per_second: float
+    eta: Optional[float]
+    peak_rss: Optional[int]
+    result: Any
+
+    @property
+    def fraction(self):
+        """Fraction of the samples performed, between 0 and 1.
+        """
+        return self.samples_done / self.total_samples if self.total_samples else 1.0
+
+    def to_dict(self):
+        """Returns the progress as a dictionary which can be serialized as JSON, with the
+        current estimates of the metrics for each SNR value.
+        """
+        return {
+            'samples_done': self.samples_done,
+            'total_samples': self.total_samples,
+            'elapsed': self.elapsed,
+            'samples_per_second': self.samples_per_second,
+            'eta': self.eta,
+            'peak_rss': self.peak_rss,
+            'estimates': {name: values.tolist() for name, values in self.result.columns().items()},
+        }
+
+
+class ProgressTracker:
+    """Measures the throughput of a simulation between progress updates.
+
+    Arguments:
+
+        samples_done -- number of samples already performed when the simulation starts.
+
+        total_samples -- number of samples of the simulation.
+    """
+
+    def __init__(self, samples_done, total_samples):
+        self.initial_samples = samples_done
+        self.total_samples = total_samples
+        self.start = time.perf_counter()
+
+    def update(self, result):
+        """Returns the `Progress` of the simulation with the given partial result.
+        """
+        elapsed = time.perf_counter() - self.start
+        samples_done = int(result.samples)
+        rate = (samples_done - self.initial_samples) / elapsed if elapsed > 0 else 0.0
+        eta = (self.total_samples - samples_done) / rate if rate > 0 else None
+        return Progress(samples_done, self.total_samples, elapsed, rate, eta, peak_rss(), result)
+
+
+class ProgressLine:
+    """Progress reporter which keeps a line with the progress, throughput and ETA updated in a
+    terminal, ending it when the simulation finishes.
+
+    Arguments:
+
+        stream -- text stream where to write, by default the standard error stream.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def __call__(self, progress):
+        stream = self.stream if self.stream is not None else sys.stderr
+        line = (f"{progress.samples_done}/{progress.total_samples} samples "
+                f"({100 * progress.fraction:.0f}%), {progress.samples_per_second:.0f} samples/s, "
+                f"ETA {format_duration(progress.eta)}")
+        if progress.peak_rss is not None:
+            line += f", peak RSS {progress.peak_rss / 2 ** 20:.0f} MiB"
+        end = '\n' if progress.samples_done >= progress.total_samples else ''
+        stream.write('\r' + line + end)
+        stream.flush()
+
+
+class ProgressJSONLines:
+    """Progress reporter which writes each update as a JSON object in a line of a file (see
+    `Progress.to_dict()`).
+
+    Arguments:
+
+        file -- text file where to write.
+    """
+
+    def __init__(self, file):
+        self.file = file
+
+    def __call__(self, progress):
+        self.file.write(json.dumps(progress.to_dict()) + '\n')
+        self.file.flush()
+
+
+def peak_rss():
+    """Returns the peak resident memory of the process in bytes, or `None` if it is unknown.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def format_duration(seconds):
+    """Returns a duration in seconds as `H:MM:SS`, or `?` if it is `None`.
+    """
+    if seconds is None:
+        return '?'
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,142 @@
+"""
+    This module contains functions to generate randomized quasi-Monte Carlo points, i.e.
+    scrambled low-discrepancy sequences, which cover the unit hypercube more evenly than
+    pseudo-random points, so that averages of smooth functions converge faster.
+"""
+
+import numpy as np
+
+# Primitive polynomials (degree, coefficients) and initial direction numbers of the first
+# dimensions of the Sobol sequence, from the tables of Joe and Kuo. The first dimension is the
+# van der Corput sequence.
+sobol_parameters = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+]
+
+# Number of bits of the points
+sobol_bits = 32
+
+def sobol_directions(dimensions):
+    """Returns the direction numbers of the first dimensions of the Sobol sequence, as an
+    array of integers with shape (dimensions, sobol_bits).
+    """
+    if dimensions > len(sobol_parameters) + 1:
+        raise ValueError(f"at most {len(sobol_parameters) + 1} dimensions are supported")
+    directions = np.zeros((dimensions, sobol_bits), dtype=np.uint64)
+    directions[0] = [1 << (sobol_bits - 1 - j) for j in range(sobol_bits)]
+    for d in range(1, dimensions):
+        degree, coefficients, initial = sobol_parameters[d - 1]
+        m = list(initial)
+        for j in range(degree, sobol_bits):
+            value = m[j - degree] ^ (m[j - degree] << degree)
+            for k in range(1, degree):
+                if (coefficients >> (degree - 1 - k)) & 1:
+                    value ^= m[j - k] << k
+            m.append(value)
+        directions[d] = [m[j] << (sobol_bits - 1 - j) for j in range(sobol_bits)]
+    return directions
+
+
+def sobol(num_points, dimensions, scramble=True, rng=None):
+    """Returns the first points of a Sobol sequence, randomized with a linear matrix
+    scrambling and a digital shift drawn from the NumPy generator. Each randomization is a
+    low-discrepancy sequence whose points are uniformly distributed, so independent
+    randomizations give independent unbiased estimates. Powers of 2 points are the most balanced.
+
+    Arguments:
+
+        num_points -- number of points, at most 2**32.
+
+        dimensions -- number of dimensions, at most 12.
+
+        scramble -- whether to randomize the sequence.
+
+        rng -- `np.random.RandomState` of the randomization, by default the global generator.
+
+    Return:
+
+        points -- array with shape (num_points, dimensions), with values in (0, 1).
+    """
+    directions = sobol_directions(dimensions)
+    shift = np.zeros(dimensions, dtype=np.uint64)
+    rng = np.random if rng is None else rng
+    if scramble:
+        for d in range(dimensions):
+            # Lower triangular binary matrix with unit diagonal, applied to each direction number
+            matrix = np.tril(rng.randint(2, size=(sobol_bits, sobol_bits)), -1)
+            matrix |= np.eye(sobol_bits, dtype=matrix.dtype)
+            bits = (directions[d][:, np.newaxis] >> np.arange(sobol_bits - 1, -1, -1, dtype=np.uint64)) & 1
+            bits = (bits.astype(np.int64) @ matrix.T) & 1
+            directions[d] = (bits.astype(np.uint64) << np.arange(sobol_bits - 1, -1, -1, dtype=np.uint64)).sum(axis=1)
+        shift = rng.randint(0, 2 ** sobol_bits, size=dimensions, dtype=np.uint64)
+
+    # Point i is the XOR of the direction numbers of the bits of the Gray code of i
+    gray = np.arange(num_points, dtype=np.uint64)
+    gray ^= gray >> np.uint64(1)
+    points = np.tile(shift, (num_points, 1))
+    for j in range(max(int(num_points - 1).bit_length(), 1)):
+        selected = ((gray >> np.uint64(j)) & np.uint64(1)).astype(bool)
+        points[selected] ^= directions[:, j]
+    return (points.astype(np.float64) + 0.5) / 2.0 ** sobol_bits
+
+
+# Coefficients, from the highest degree, of the rational approximations of the inverse normal
+# distribution function of Wichura's algorithm AS241 (also used by `statistics.NormalDist`), for
+# the central region, the tails and the far tails
+ppf_central = ([2.5090809287301226727e+3, 3.3430575583588128105e+4, 6.7265770927008700853e+4,
+                4.5921953931549871457e+4, 1.3731693765509461125e+4, 1.9715909503065514427e+3,
+                1.3314166789178437745e+2, 3.3871328727963666080e+0],
+               [5.2264952788528545610e+3, 2.8729085735721942674e+4, 3.9307895800092710610e+4,
+                2.1213794301586595867e+4, 5.3941960214247511077e+3, 6.8718700749205790830e+2,
+                4.2313330701600911252e+1, 1.0])
+ppf_tail = ([7.74545014278341407640e-4, 2.27238449892691845833e-2, 2.41780725177450611770e-1,
+             1.27045825245236838258e+0, 3.64784832476320460504e+0, 5.76949722146069140550e+0,
+             4.63033784615654529590e+0, 1.42343711074968357734e+0],
+            [1.05075007164441684324e-9, 5.47593808499534494600e-4, 1.51986665636164571966e-2,
+             1.48103976427480074590e-1, 6.89767334985100004550e-1, 1.67638483018380384940e+0,
+             2.05319162663775882187e+0, 1.0])
+ppf_far_tail = ([2.01033439929228813265e-7, 2.71155556874348757815e-5, 1.24266094738807843860e-3,
+                 2.65321895265761230930e-2, 2.96560571828504891230e-1, 1.78482653991729133580e+0,
+                 5.46378491116411436990e+0, 6.65790464350110377720e+0],
+                [2.04426310338993978564e-15, 1.42151175831644588870e-7, 1.84631831751005468180e-5,
+                 7.86869131145613259100e-4, 1.48753612908506148525e-2, 1.36929880922735805310e-1,
+                 5.99832206555887937690e-1, 1.0])
+
+
+def normal_ppf(u):
+    """Returns the inverse of the standard normal cumulative distribution function, evaluated
+    for all values at once with Wichura's algorithm AS241, which is accurate to about 1e-16.
+
+    Raises `ValueError` if any value is not in the open interval (0, 1).
+    """
+    u = np.asarray(u, dtype=float)
+    if not np.all((u > 0) & (u < 1)):
+        raise ValueError("Probabilities must be (0 < value < 1)")
+    q = u - 0.5
+    central = np.abs(q) <= 0.425
+    x = np.empty_like(u)
+
+    r = 0.180625 - q[central] ** 2
+    x[central] = q[central] * np.polyval(ppf_central[0], r) / np.polyval(ppf_central[1], r)
+
+    # In the tails, the approximations are functions of sqrt(-log(p)), with p the smaller of
+    # the probabilities of both tails
+    tails = ~central
+    r = np.sqrt(-np.log(np.minimum(u[tails], 1.0 - u[tails])))
+    near = r <= 5.0
+    values = np.empty_like(r)
+    values[near] = np.polyval(ppf_tail[0], r[near] - 1.6) / np.polyval(ppf_tail[1], r[near] - 1.6)
+    values[~near] = (np.polyval(ppf_far_tail[0], r[~near] - 5.0)
+                     / np.polyval(ppf_far_tail[1], r[~near] - 5.0))
+    x[tails] = np.where(q[tails] < 0.0, -values, values)
+    return x
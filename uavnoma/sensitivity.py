@@ -0,0 +1,213 @@
+"""
+    This module contains the sensitivity analysis of a configuration: the derivatives of the
+    outage probabilities and average achievable rates with respect to the parameters of the
+    model, for each SNR value, with their standard errors.
+
+    All derivatives are evaluated over the same random draws (common random numbers), so that
+    the variations of the metrics are due to the parameters only, and the derivative of each
+    metric is the average of a derivative for each sample:
+
+    - the achievable rates are smooth functions of the parameters, so their derivatives are
+      pathwise, i.e. the exact derivatives of the rates of each sample, through the SINR and,
+      for `rician_factor` and `path_loss`, the channel gains;
+    - the outage indicators are step functions, so their derivatives are central finite
+      differences between the indicators of each sample with the parameter perturbed up and
+      down by its `step`.
+
+    The standard errors are those of the averages of the derivatives of the samples. The
+    samples are drawn with the pseudo-random generator, regardless of the sampler.
+
+    ```
+    from uavnoma import SimulationConfig
+    from uavnoma.sensitivity import sensitivities
+
+    result = sensitivities(SimulationConfig(monte_carlo_samples=100000, seed=1))
+    print(result.derivative('p_outage_usr1', 'hardw_ip'), result.error('p_outage_usr1', 'hardw_ip'))
+    result.table()  # Jacobian table
+    ```
+"""
+
+import copy
+from dataclasses import dataclass
+from typing import Any, Dict, List
+import numpy as np
+from .generate_values import fading_rician
+from .output import ResultTable
+from .simulation import metric_names, sample_metrics, channel_gains, user_gains
+
+# Parameters whose sensitivities can be analyzed
+sensitivity_params = ['power_coeff_primary', 'hardw_ip', 'sic_ip', 'rician_factor', 'path_loss']
+
+# Default steps of the finite differences of the outage probabilities
+default_steps = {'power_coeff_primary': 0.01, 'hardw_ip': 0.01, 'sic_ip': 0.01,
+                 'rician_factor': 0.25, 'path_loss': 0.01}
+
+# Number of samples whose derivatives are evaluated at once
+chunk_samples = 10000
+
+outage_names = ['p_outage_sys', 'p_outage_usr1', 'p_outage_usr2']
+
+
+@dataclass
+class Sensitivities:
+    """Derivatives of the metrics of a configuration with respect to its parameters.
+
+    Attributes:
+
+        config -- the `uavnoma.SimulationConfig` at which the derivatives are evaluated.
+
+        snr_dB -- SNR values in dB.
+
+        params -- names of the parameters.
+
+        steps -- dictionary with the step of the finite differences of each parameter.
+
+        derivatives -- dictionary with an array of shape (parameters, SNR values) for each
+        metric (see `uavnoma.SimulationResult.columns()`).
+
+        errors -- standard errors of the derivatives, in the same shape.
+    """
+    config: Any
+    snr_dB: np.ndarray
+    params: List[str]
+    steps: Dict[str, float]
+    derivatives: Dict[str, np.ndarray]
+    errors: Dict[str, np.ndarray]
+
+    def derivative(self, metric, param):
+        """Returns the derivative of a metric with respect to a parameter, for each SNR value.
+        """
+        return self.derivatives[metric][self.params.index(param)]
+
+    def error(self, metric, param):
+        """Returns the standard error of the derivative of a metric with respect to a parameter.
+        """
+        return self.errors[metric][self.params.index(param)]
+
+    def table(self):
+        """Returns the Jacobian as a `uavnoma.output.ResultTable`, with the SNR values and, for
+        each metric and parameter, the derivative, `d_<metric>_d_<param>`, and its standard
+        error, `d_<metric>_d_<param>_stderr`.
+        """
+        columns = {'snr_dB': self.snr_dB}
+        for metric in metric_names:
+            for param in self.params:
+                columns[f'd_{metric}_d_{param}'] = self.derivative(metric, param)
+                columns[f'd_{metric}_d_{param}_stderr'] = self.error(metric, param)
+        return ResultTable(columns)
+
+
+def sensitivities(config, params=None, steps=None):
+    """Evaluates the derivatives of the metrics of a configuration with respect to its
+    parameters, over the same Monte Carlo samples.
+
+    Arguments:
+
+        config -- the `uavnoma.SimulationConfig`, whose `monte_carlo_samples` are averaged.
+
+        params -- names of the parameters, by default all of `sensitivity_params`.
+
+        steps -- dictionary with the steps of the finite differences of the outage
+        probabilities, by parameter, replacing those of `default_steps`.
+
+    Return:
+
+        sensitivities -- a `Sensitivities`.
+    """
+    params = list(sensitivity_params if params is None else params)
+    for param in params:
+        if param not in sensitivity_params:
+            raise ValueError(f"Unknown parameter '{param}', it must be one of {', '.join(sensitivity_params)}")
+    steps = dict(default_steps, **(steps or {}))
+    for param in params:
+        if steps[param] <= 0:
+            raise ValueError("Steps must be (value > 0)")
+    snr_dB = config.snr_values()
+    snr_linear = 10.0 ** (snr_dB / 10.0)
+
+    rng = np.random.RandomState(config.seed)
+    samples = config.monte_carlo_samples
+    uniforms = rng.rand(samples, 6)
+    normals = rng.standard_normal((samples, 4))
+
+    # Sums of the derivatives of the samples and of their squares
+    sums = {name: np.zeros((len(params), len(snr_dB))) for name in metric_names}
+    squares = {name: np.zeros((len(params), len(snr_dB))) for name in metric_names}
+    for start in range(0, samples, chunk_samples):
+        chunk = slice(start, start + chunk_samples)
+        for index, param in enumerate(params):
+            derivatives = sample_derivatives(config, param, steps[param], uniforms[chunk],
+                                             normals[chunk], snr_linear)
+            for name, values in derivatives.items():
+                sums[name][index] += values.sum(axis=0)
+                squares[name][index] += (values ** 2).sum(axis=0)
+
+    derivatives = {name: sums[name] / samples for name in metric_names}
+    errors = {name: np.sqrt(np.maximum(squares[name] / samples - derivatives[name] ** 2, 0)
+                            / (samples - 1)) for name in metric_names}
+    return Sensitivities(config, snr_dB, params, {param: steps[param] for param in params},
+                         derivatives, errors)
+
+
+def sample_derivatives(config, param, step, uniforms, normals, snr_linear):
+    """Returns the derivatives of the metrics of each sample given by uniform and normal values
+    (see `uavnoma.simulation.user_gains()`) with respect to a parameter, as a dictionary with
+    an array of shape (samples, SNR values) for each metric.
+    """
+    derivatives = {}
+
+    # Finite differences of the outage indicators, perturbing the parameter without validating
+    # the configurations, which may lie just outside the valid range
+    outages = []
+    for sign in [1, -1]:
+        perturbed = copy.copy(config)
+        setattr(perturbed, param, getattr(config, param) + sign * step)
+        gains_primary, gains_secondary, _ = channel_gains(perturbed, uniforms, normals)
+        metrics = sample_metrics(perturbed, gains_primary, gains_secondary, snr_linear)
+        outages.append(metrics)
+    for name in outage_names:
+        derivatives[name] = (outages[0][name] - outages[1][name]) / (2 * step)
+
+    # Pathwise derivatives of the rates, through the channel gain of each user
+    h_n, controls = user_gains(config, uniforms, normals)
+    gain_derivatives = np.zeros_like(h_n)
+    if param == 'rician_factor':
+        K = config.rician_factor
+        s, sigma = fading_rician(K, config.power_los)
+        in_phase = s + sigma * normals[:, 0::2]
+        quadrature = sigma * normals[:, 1::2]
+        d_in_phase = s / (2 * K * (K + 1)) - sigma / (2 * (K + 1)) * normals[:, 0::2]
+        d_quadrature = -sigma / (2 * (K + 1)) * normals[:, 1::2]
+        # The gain is proportional to the modulus of in_phase^2 + 1j * quadrature^2
+        gain_derivatives = 2 * h_n * ((in_phase ** 3 * d_in_phase + quadrature ** 3 * d_quadrature)
+                                      / (in_phase ** 4 + quadrature ** 4))
+    elif param == 'path_loss':
+        gain_derivatives = -h_n * np.log(controls[:, :2]) / 2
+
+    # The primary user is the one with the lowest gain
+    primary = np.argmin(h_n, axis=1)
+    rows = np.arange(len(h_n))
+    users = [(h_n[rows, primary], gain_derivatives[rows, primary], config.power_coeff_primary,
+              config.power_coeff_secondary + config.hardw_ip ** 2),
+             (h_n[rows, 1 - primary], gain_derivatives[rows, 1 - primary], config.power_coeff_secondary,
+              config.power_coeff_primary * config.sic_ip + config.hardw_ip ** 2)]
+    # Derivatives of the power and of the interference coefficient of each user
+    coefficients = {
+        'power_coeff_primary': [(1.0, 0.0), (0.0, config.sic_ip)],
+        'hardw_ip': [(0.0, 2 * config.hardw_ip), (0.0, 2 * config.hardw_ip)],
+        'sic_ip': [(0.0, 0.0), (0.0, config.power_coeff_primary)],
+    }.get(param, [(0.0, 0.0), (0.0, 0.0)])
+
+    rates = []
+    for (gains, d_gains, power, interference), (d_power, d_interference) in zip(users, coefficients):
+        received = snr_linear * gains[:, np.newaxis]
+        d_received = snr_linear * d_gains[:, np.newaxis]
+        denominator = received * interference + 1
+        sinr = received * power / denominator
+        d_sinr = ((power * d_received + received * d_power)
+                  - sinr * (interference * d_received + received * d_interference)) / denominator
+        rates.append(d_sinr / (1 + sinr))
+    derivatives['avg_arate_sys'] = (rates[0] + rates[1]) / 2
+    derivatives['avg_arate_usr1'] = rates[0]
+    derivatives['avg_arate_usr2'] = rates[1]
+    return derivatives
@@ -0,0 +1,199 @@
+"""
+    This module contains a local HTTP server which performs simulations on request, for
+    interactive tools which evaluate many configurations with small changes. The server keeps
+    the package imported and caches results and channel realizations between requests.
+
+    Requests are JSON objects with the parameters of a `uavnoma.SimulationConfig`, plus the
+    optional `percentiles` (list of percentiles of the achievable rates) and `distributions`
+    (whether to return the CDFs of the achievable rates and channel gains), posted to
+    `/simulate`:
+
+    ```
+    curl -d '{"seed": 123, "power_coeff_primary": 0.7, "power_coeff_secondary": 0.3}' \\
+        http://127.0.0.1:8050/simulate
+    ```
+
+    The response has the number of samples, the results columns (see
+    `uavnoma.SimulationResult.columns()`) and, if requested, the percentiles and distributions.
+    Invalid requests get a 400 response with an `error` message, and failed simulations a 500
+    response.
+
+    Simulations with a seed are deterministic, so their results are cached, and concurrent
+    requests for the same configuration are performed only once. The channel gains of each
+    seed and geometry are also cached, and configurations which share them (e.g. with different
+    SNR values, power coefficients, impairments or target rates) are evaluated for all samples at
+    once over the cached gains, which is much faster than a new simulation and gives the same
+    results. Simulations without a seed are always performed anew.
+
+    Each request is evaluated in its own thread of the server process. Concurrent requests which
+    share channel gains wait for the same generation, but are then evaluated separately: they
+    are not merged into a single evaluation, and no worker processes are kept.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .simulation import SimulationConfig, SimulationResult, run_simulation
+from .simulation import generate_gains, evaluate_gains
+
+# Parameters which determine the channel gains of a simulation
+channel_params = ['monte_carlo_samples', 'power_los', 'rician_factor', 'path_loss', 'radius_uav',
+                  'radius_user', 'uav_height_mean', 'seed', 'number_uav', 'number_user',
+                  'sampler', 'replicates', 'antithetic', 'control_variates', 'geometry']
+
+
+class SimulationServer(ThreadingHTTPServer):
+    """HTTP server which performs simulations on request, caching their results and channel gains.
+
+    Arguments:
+
+        address -- tuple with the host and port where to listen.
+
+        cache_size -- maximum number of results, and of sets of channel gains, kept in memory.
+
+        verbose -- whether to log each request to the standard error stream.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, cache_size=128, verbose=False):
+        super().__init__(address, RequestHandler)
+        self.cache_size = cache_size
+        self.verbose = verbose
+        self.results = OrderedDict()
+        self.gains = OrderedDict()
+        self.pending = {}
+        # Protects the caches and the pending computations
+        self.lock = threading.Lock()
+        # Simulations use the global generator, so only one can draw random values at a time
+        self.rng_lock = threading.Lock()
+
+    def simulate(self, config):
+        """Returns the `SimulationResult` of a configuration, from the cache if possible.
+        """
+        if config.seed is None or config.shard is not None:
+            with self.rng_lock:
+                return run_simulation(config)
+
+        key = ('result', json.dumps(config.params(), sort_keys=True))
+        return self.cached(self.results, key, lambda: self.evaluate(config))
+
+    def evaluate(self, config):
+        """Performs a simulation over its channel gains, generating them if they are not cached.
+        """
+        key = ('gains', json.dumps([getattr(config, name) for name in channel_params]))
+        gains = self.cached(self.gains, key, lambda: self.generate(config))
+        return SimulationResult(config, evaluate_gains(config, *gains))
+
+    def generate(self, config):
+        """Generates the channel gains of a simulation.
+        """
+        with self.rng_lock:
+            return generate_gains(config)
+
+    def cached(self, cache, key, compute):
+        """Returns the value of a key in a cache, computing it if needed. If the same key is
+        being computed for another request, waits for that computation instead.
+        """
+        with self.lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+            future = self.pending.get(key)
+            computing = future is None
+            if computing:
+                future = self.pending[key] = Future()
+        if not computing:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self.lock:
+                del self.pending[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            cache[key] = value
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+            del self.pending[key]
+        future.set_result(value)
+        return value
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Handler of the requests to a `SimulationServer`.
+    """
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.reply(200, {'status': 'ok'})
+        else:
+            self.reply(404, {'error': f"unknown path '{self.path}'"})
+
+    def do_POST(self):
+        if self.path != '/simulate':
+            self.reply(404, {'error': f"unknown path '{self.path}'"})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            if not isinstance(request, dict):
+                raise ValueError("the request must be a JSON object")
+            percentiles = request.pop('percentiles', None)
+            distributions = request.pop('distributions', False)
+            if percentiles is not None and any(p < 0 or p > 100 for p in percentiles):
+                raise ValueError("Percentiles must be (0 <= value <= 100)")
+            sketches = percentiles is not None or bool(distributions)
+            config = SimulationConfig(**dict(request, sketches=sketches))
+            result = self.server.simulate(config)
+            response = {
+                'samples': result.samples,
+                'columns': {name: values.tolist() for name, values in result.columns().items()},
+            }
+            if percentiles is not None:
+                response['percentiles'] = {name: values.tolist() for name, values
+                                           in result.percentiles(percentiles).items()}
+            if distributions:
+                response['distributions'] = {name: values.tolist() for name, values
+                                             in result.distributions().items()}
+        except (ValueError, TypeError) as e:
+            self.reply(400, {'error': str(e)})
+            return
+        except Exception as e:
+            self.log_error("simulation failed: %r", e)
+            self.reply(500, {'error': f"simulation failed: {e}"})
+            return
+        self.reply(200, response)
+
+    def reply(self, status, response):
+        body = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(host='127.0.0.1', port=8050, cache_size=128, verbose=False):
+    """Runs a `SimulationServer` until interrupted.
+
+    Arguments:
+
+        host, port -- address where to listen.
+
+        cache_size -- maximum number of results, and of sets of channel gains, kept in memory.
+
+        verbose -- whether to log each request to the standard error stream.
+    """
+    with SimulationServer((host, port), cache_size, verbose) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,1365 @@
+"""
+    This module contains the simulation engine, which performs the Monte Carlo simulation of the
+    UAV-NOMA system independently of the command line script, so that it can be embedded in
+    other programs and run many times in the same process.
+
+    A simulation is defined by a `SimulationConfig`, which validates its parameters when
+    created, raising `ValueError` for invalid ones, and is performed by `run_simulation()`:
+
+    ```
+    from uavnoma import SimulationConfig, run_simulation
+
+    config = SimulationConfig(monte_carlo_samples=2000, rician_factor=12.0, seed=123)
+    result = run_simulation(config)
+    print(result.snr_dB, result.p_outage_usr1, result.avg_arate_usr1)
+    ```
+
+    Long simulations can report their progress, throughput and estimated remaining time after
+    each chunk of samples through a `progress` callback (see `uavnoma.progress`).
+
+    In asyncio programs, `simulate_async()` and `iter_simulation()` perform simulations in chunks
+    of samples run in an executor, so that many simulations progress concurrently without blocking
+    the event loop, and partial results are available while sampling continues. Each chunk draws
+    from its own generator, restored from the simulation state, never from the global one:
+
+    ```
+    async for partial in iter_simulation(config, chunk_size=500):
+        print(partial.samples, partial.avg_arate_usr1)
+    ```
+
+    The simulation state (a dictionary, see `uavnoma.checkpoint.save_checkpoint()`) holds the
+    accumulated sums of the metrics and the generator state, so a simulation can be checkpointed,
+    resumed, extended with more samples or SNR values, or split in shards and merged.
+"""
+
+import asyncio
+import copy
+import dataclasses
+from dataclasses import dataclass
+import numbers
+from typing import Optional
+import numpy as np
+from .generate_values import seed_stream, sample_generator, random_position_uav, random_position_users
+from .generate_values import fading_rician, generate_channel
+from .performance_metrics import calculate_instantaneous_rate_primary
+from .performance_metrics import calculate_instantaneous_rate_secondary
+from .performance_metrics import average_rate, outage_probability
+from .checkpoint import save_checkpoint, load_checkpoint
+from .output import ResultTable
+from .sketches import LogHistogram, QuantileSketch
+from .qmc import sobol, normal_ppf
+from .progress import ProgressTracker
+
+# Names of the metrics evaluated for each SNR value
+metric_names = ['p_outage_sys', 'p_outage_usr1', 'p_outage_usr2',
+                'avg_arate_sys', 'avg_arate_usr1', 'avg_arate_usr2']
+
+# Samplers of the random values of each Monte Carlo sample
+samplers = ['random', 'sobol', 'counter']
+
+# Ways of drawing the distances between the UAV and the users
+geometries = ['exact', 'table']
+
+# Names of the sketches with one series for each SNR value
+snr_sketch_names = ['hist_rate_usr1', 'hist_rate_usr2', 'quantile_rate_usr1', 'quantile_rate_usr2']
+
+# Memory of each array of a tile of samples of the metric kernel, in bytes: tiles are large
+# enough to amortize the overhead of each operation, while all their arrays stay in the cache
+kernel_tile_memory = 128 * 2 ** 10
+
+
+@dataclass
+class SimulationConfig:
+    """Parameters of a simulation, validated on creation. The defaults are the same as those of
+    the `uavnoma` command. Use `dataclasses.replace()` to derive a modified configuration.
+
+    Attributes:
+
+        monte_carlo_samples -- number of Monte Carlo samples, 100 <= value <= 100000.
+
+        power_los -- power of line-of-sight path and scattered paths, 1.0 <= value <= 2.0.
+
+        rician_factor -- Rician factor, 10 <= value <= 18.
+
+        path_loss -- path loss exponent, 2 <= value <= 3.
+
+        radius_uav -- radius of the UAV flight trajectory in meters, 1 <= value <= 5.
+
+        radius_user -- distribution radius of users in the cell in meters, 1 <= value <= 20.
+
+        uav_height_mean -- average UAV flight height, 10 <= value <= 50.
+
+        target_rate_primary_user, target_rate_secondary_user -- target rates in bits/s/Hz.
+
+        hardw_ip -- residual hardware impairments coefficient, 0 <= value <= 1.
+
+        sic_ip -- residual imperfect SIC coefficient, 0 <= value <= 1.
+
+        power_coeff_primary, power_coeff_secondary -- power coefficients of the users.
+
+        snr_min, snr_max, snr_samples -- range and number of SNR values in dB.
+
+        seed -- seed for the pseudo-random number generator, 0 <= value < 2**32, or `None`.
+
+        number_uav, number_user -- number of UAVs (must be 1) and users (must be 2).
+
+        shard -- `'I/N'` to perform only the I-th of N shards of the simulation, or `None`.
+
+        block_size -- number of samples in each independent random stream of a sharded simulation.
+
+        sketches -- whether to track the distributions of the achievable rates and channel gains.
+
+        sampler -- `'random'` to draw the positions and fading of each sample with the
+        pseudo-random generator, `'sobol'` to map randomized quasi-Monte Carlo points through
+        the same transforms, which gives more accurate averages for the same number of samples,
+        or `'counter'` to draw each sample with a counter-based generator which depends only on
+        the seed and the index of the sample, so that any range of samples can be generated
+        again independently (see `sample_gains()`).
+
+        replicates -- number of independent randomizations of the quasi-Monte Carlo points,
+        among which the samples are split, used to estimate the standard errors of the averages.
+
+        antithetic -- whether to draw the samples in antithetic pairs, where the second sample
+        has mirrored angles, height and radii and negated fading components.
+
+        control_variates -- whether to adjust the averages with control variates with known
+        expected values: the squared distances between the UAV and the users and the squared
+        in-phase fading components.
+
+        geometry -- `'exact'` to draw the positions of the UAV and the users, or `'table'` to
+        draw the squared horizontal distances between them from a precomputed table of their
+        distribution (see `uavnoma.geometry`), which is faster, and whose results are
+        statistically equivalent.
+
+        store_gains -- whether to keep the channel gains of each sample in the simulation state.
+    """
+    monte_carlo_samples: int = 1000
+    power_los: float = 2.0
+    rician_factor: float = 15.0
+    path_loss: float = 2.2
+    radius_uav: float = 2.0
+    radius_user: float = 15.0
+    uav_height_mean: float = 20.0
+    target_rate_primary_user: float = 0.5
+    target_rate_secondary_user: float = 0.5
+    hardw_ip: float = 0.1
+    sic_ip: float = 0.1
+    power_coeff_primary: float = 0.8
+    power_coeff_secondary: float = 0.2
+    snr_min: float = 10
+    snr_max: float = 60
+    snr_samples: int = 26
+    seed: Optional[int] = None
+    number_uav: int = 1
+    number_user: int = 2
+    shard: Optional[str] = None
+    block_size: int = 1000
+    sketches: bool = False
+    sampler: str = 'random'
+    replicates: int = 8
+    antithetic: bool = False
+    control_variates: bool = False
+    geometry: str = 'exact'
+    store_gains: bool = False
+
+    def __post_init__(self):
+        self.validate()
+
+    def validate(self):
+        """Raises `ValueError` if any parameter is invalid.
+        """
+        for name in ['monte_carlo_samples', 'snr_samples', 'number_uav', 'number_user',
+                     'block_size', 'replicates']:
+            value = getattr(self, name)
+            if (isinstance(value, bool) or not isinstance(value, numbers.Integral)):
+                raise ValueError(f"{name} must be an integer")
+        if (self.seed is not None):
+            if (isinstance(self.seed, bool) or not isinstance(self.seed, numbers.Integral)):
+                raise ValueError("Seed must be an integer")
+            if (self.seed < 0 or self.seed >= 2 ** 32):
+                raise ValueError("Seed must be (0 <= value < 2**32)")
+        if (self.monte_carlo_samples < 100 or self.monte_carlo_samples > 100000):
+            raise ValueError("Invalid Monte Carlo samples, the value must be (100 <= monte_carlo_samples <= 100000)")
+        if (self.power_los < 1.0 or self.power_los > 2.0):
+            raise ValueError("The power must be (1.0 <= value <= 2.0)")
+        if (self.rician_factor < 10.0 or self.rician_factor > 18.0):
+            raise ValueError("Rician factor must be (10 <= value <= 18)")
+        if (self.path_loss < 2.0 or self.path_loss > 3.0):
+            raise ValueError("Path loss value must be (2.0 <= value <= 3.0)")
+        if (self.radius_uav < 1 or self.radius_uav > 5.0):
+            raise ValueError("Radius UAV value must be (1.0 <= value <= 5.0)")
+        if (self.radius_user < 1 or self.radius_user > 20.0):
+            raise ValueError("Radius user value must be (1.0 <= value <= 20.0)")
+        if (self.uav_height_mean < 10 or self.uav_height_mean > 50):
+            raise ValueError("Heigth UAV value must be (10 <= value <= 40)")
+        if (self.number_user != 2):
+            raise ValueError("Number of user value must be 2)")
+        if (self.number_uav != 1):
+            raise ValueError("Number UAV value must be 1")
+        if (self.target_rate_primary_user < 0 or self.target_rate_primary_user > 2):
+            raise ValueError("Target rate of primary user must be (0.1<= value <= 2)")
+        if (self.target_rate_secondary_user < 0 or self.target_rate_secondary_user > 2):
+            raise ValueError("Target rate of secondary user must be (0.1 <= value <= 2)")
+        if (self.hardw_ip < 0 or self.hardw_ip > 1):
+            raise ValueError("Residual Hardware impairment must be (0 <= value <= 1.0)")
+        if (self.sic_ip < 0 or self.sic_ip > 1):
+            raise ValueError("Residual imperfect SIC must be (0 <= value <= 1.0)")
+        if (self.snr_min < 0 or self.snr_min > 15):
+            raise ValueError("SNR minimum value must be (0 <= value <= 15)")
+        if (self.snr_max < 30 or self.snr_max > 80):
+            raise ValueError("SNR maximum value must be (30 <= value <= 80)")
+        if (self.snr_samples < 1):
+            raise ValueError("Number of SNR values must be (value >= 1)")
+        if (self.power_coeff_primary < self.power_coeff_secondary):
+            raise ValueError("The power coefficient of the primary user must be greater than that of the Secondary user.")
+        sum_power = self.power_coeff_primary + self.power_coeff_secondary
+        if (sum_power < 0.0 or sum_power > 1.0):
+            raise ValueError("The sum of the power coefficients must be (0.0 < value <= 1.0)")
+        if (self.shard is not None):
+            try:
+                shard_index, shard_count = parse_shard(self.shard)
+            except (ValueError, AttributeError):
+                shard_index, shard_count = -1, 0
+            if (shard_count < 1 or shard_index < 0 or shard_index >= shard_count):
+                raise ValueError("Shard must be I/N, with (0 <= I < N)")
+            if (self.seed is None):
+                raise ValueError("Sharded simulations require a seed")
+        if (self.block_size < 1):
+            raise ValueError("Block size must be (value >= 1)")
+        if (self.sampler not in samplers):
+            raise ValueError(f"Sampler must be one of {', '.join(samplers)}")
+        if (self.geometry not in geometries):
+            raise ValueError(f"Geometry must be one of {', '.join(geometries)}")
+        if (self.replicates < 1):
+            raise ValueError("Number of replicates must be (value >= 1)")
+        if (self.sampler == 'sobol'):
+            if (self.shard is not None):
+                raise ValueError("Sharded simulations require the random sampler")
+            if (self.monte_carlo_samples % self.replicates != 0):
+                raise ValueError("Monte Carlo samples must be a multiple of the number of replicates")
+        if (self.sampler == 'counter' and self.seed is None):
+            raise ValueError("The counter sampler requires a seed")
+        if (self.antithetic or self.control_variates) and self.shard is not None:
+            raise ValueError("Sharded simulations can't use antithetic or control variates")
+        if (self.antithetic):
+            replicates = self.replicates if self.sampler == 'sobol' else 1
+            if (self.monte_carlo_samples % (2 * replicates) != 0):
+                raise ValueError("Antithetic variates require an even number of samples in each replicate")
+
+    def params(self):
+        """Returns the parameters which define the simulation, as saved in checkpoint files.
+        """
+        params = dataclasses.asdict(self)
+        del params['store_gains']
+        return params
+
+    @classmethod
+    def from_params(cls, params, **kwargs):
+        """Creates a configuration from parameters saved in a checkpoint file, ignoring unknown ones.
+        """
+        names = {field.name for field in dataclasses.fields(cls)}
+        return cls(**{name: value for name, value in params.items() if name in names}, **kwargs)
+
+    def snr_values(self):
+        """Returns the SNR values in dB.
+        """
+        return np.linspace(self.snr_min, self.snr_max, self.snr_samples)
+
+
+class SimulationResult:
+    """Results of a simulation: the averages of the metrics for each SNR value.
+
+    Attributes:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        state -- the simulation state, which can be saved with `uavnoma.save_checkpoint()`.
+
+        samples -- number of Monte Carlo samples performed.
+
+        snr_dB -- SNR values in dB.
+
+        p_outage_sys, p_outage_usr1, p_outage_usr2 -- outage probability of the system and of
+        the primary and secondary users.
+
+        avg_arate_sys, avg_arate_usr1, avg_arate_usr2 -- average achievable rate of the system
+        and of the primary and secondary users.
+    """
+
+    def __init__(self, config, state):
+        self.config = config
+        self.state = state
+        self.samples = state['samples_done']
+        self.snr_dB = state['snr_dB']
+        sums = result_sums(state)
+        # The averages of simulations without samples, e.g. empty shards, are NaN
+        with np.errstate(invalid='ignore'):
+            for name in metric_names:
+                setattr(self, name, sums[name] / self.samples)
+
+    def columns(self):
+        """Returns a `uavnoma.output.ResultTable` with the SNR values and the average of each
+        metric, which can be used as a dictionary of columns.
+        """
+        return ResultTable(dict(snr_dB=self.snr_dB, **{name: getattr(self, name) for name in metric_names}))
+
+    def percentiles(self, percentiles):
+        """Returns a dictionary with the given percentiles (0 to 100) of the achievable rate of
+        each user, for each SNR value. Requires a simulation run with `sketches=True`.
+        """
+        sketches = self._sketches()
+        columns = {}
+        for p in percentiles:
+            columns[f'rate_usr1_p{p:g}'] = sketches['quantile_rate_usr1'].quantile(p / 100)
+            columns[f'rate_usr2_p{p:g}'] = sketches['quantile_rate_usr2'].quantile(p / 100)
+        return columns
+
+    def distributions(self):
+        """Returns a dictionary with the CDFs of the achievable rate of each user, for each SNR
+        value, and of the channel gains, evaluated at the `rate` and `gain` values, respectively.
+        Requires a simulation run with `sketches=True`.
+        """
+        sketches = self._sketches()
+        columns = {'rate': sketches['hist_rate_usr1'].edges()}
+        for user in ['usr1', 'usr2']:
+            cdf = sketches['hist_rate_' + user].cdf()
+            for sn in range(len(self.snr_dB)):
+                columns[f'cdf_rate_{user}_{self.snr_dB[sn]:g}dB'] = cdf[sn]
+        columns['gain'] = sketches['hist_gain_usr1'].edges()
+        for user in ['usr1', 'usr2']:
+            columns['cdf_gain_' + user] = sketches['hist_gain_' + user].cdf()[0]
+        return columns
+
+    def standard_errors(self):
+        """Returns a dictionary with the standard error of the average of each metric, for each
+        SNR value, estimated from the independent replicates of a simulation run with the
+        `sobol` sampler (NaN if there is a single replicate).
+        """
+        if self.config.sampler != 'sobol':
+            raise ValueError("Standard errors require a simulation run with the sobol sampler")
+        errors = {}
+        for name in metric_names:
+            means = self.state['block_sums'][name] / (self.samples / self.config.replicates)
+            if len(means) > 1:
+                errors[name] = means.std(axis=0, ddof=1) / np.sqrt(len(means))
+            else:
+                errors[name] = np.full(means.shape[1], np.nan)
+        return errors
+
+    def variance_reduction(self):
+        """Returns a dictionary with the variance reduction factor of the average of each metric,
+        for each SNR value, with respect to the plain average of independent samples, for
+        simulations run with the `sobol` sampler, antithetic or control variates. A factor of
+        10 means that plain sampling would need 10 times more samples for the same precision.
+        """
+        if self.state.get('variance_reduction') is None:
+            raise ValueError("Variance reduction factors require a simulation run with the sobol "
+                             "sampler, antithetic or control variates")
+        return self.state['variance_reduction']
+
+    def _sketches(self):
+        if self.state['sketches'] is None:
+            raise ValueError("Percentiles and distributions require a simulation run with sketches")
+        return self.state['sketches']
+
+
+def run_simulation(config, state=None, writer=None, checkpoint=None, checkpoint_every=1000,
+                   progress=None, progress_every=1000):
+    """Performs a simulation and returns its results.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        state -- state of a simulation to continue (e.g. loaded with `load_state()`), or `None`
+        to start a new one.
+
+        writer -- raw data writer (see `uavnoma.output.raw_writer()`) which receives the channel
+        gains and rates of each sample, or `None`.
+
+        checkpoint -- name of the file where to periodically save the simulation state, or `None`.
+
+        checkpoint_every -- number of samples between checkpoints.
+
+        progress -- function called with the `uavnoma.progress.Progress` of the simulation after
+        each chunk of samples (e.g. a `uavnoma.progress.ProgressLine`), or `None`. If it
+        returns `True`, the simulation stops early (e.g. a `uavnoma.streaming.RowStream` whose
+        estimates converged), and can be resumed later from its state.
+
+        progress_every -- number of samples in each chunk between progress updates.
+
+    Return:
+
+        result -- a `SimulationResult`.
+    """
+    if progress_every < 1:
+        raise ValueError("Number of samples between progress updates must be (value >= 1)")
+    if state is None:
+        state = new_state(config)
+    if progress is None:
+        simulate(config, state, writer, checkpoint, checkpoint_every)
+        return SimulationResult(config, state)
+
+    # The chunks give the same results as a single call, since the state holds the generator
+    first_sample, last_sample = sample_range(config)
+    tracker = ProgressTracker(state['samples_done'], last_sample - first_sample)
+    while True:
+        simulate(config, state, writer, checkpoint, checkpoint_every, progress_every)
+        result = SimulationResult(config, state)
+        if progress(tracker.update(result)) is True:
+            # Save the state where the simulation stopped early, so that it can be resumed
+            if checkpoint is not None and state['samples_done'] < last_sample - first_sample:
+                save_checkpoint(checkpoint, state)
+            return result
+        if state['samples_done'] >= last_sample - first_sample:
+            return result
+
+
+async def iter_simulation(config, state=None, chunk_size=1000, executor=None, progress=None):
+    """Asynchronous iterator which performs a simulation in chunks of samples, run in an
+    executor so that the event loop is not blocked, yielding a partial `SimulationResult`
+    after each chunk. The results after the last chunk are the same as those of
+    `run_simulation()`.
+
+    Several simulations can progress concurrently, their chunks running at once in the threads
+    of the executor, each one on a copy of the state with its own generator. Cancelling the task
+    iterating, e.g. on a timeout, stops the simulation: the chunk being performed finishes, but
+    its results are discarded, and the given state is never changed.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        state -- state of a simulation to continue, or `None` to start a new one.
+
+        chunk_size -- number of samples performed in each chunk.
+
+        executor -- `concurrent.futures` executor where to run the chunks, or `None` for the
+        default executor of the event loop.
+
+        progress -- function called with the `uavnoma.progress.Progress` of the simulation after
+        each chunk, or `None`. If it returns `True`, the simulation stops early.
+    """
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be (value >= 1)")
+    loop = asyncio.get_running_loop()
+    if state is None:
+        state = seeded_state(config)
+    first_sample, last_sample = sample_range(config)
+    tracker = ProgressTracker(state['samples_done'], last_sample - first_sample)
+    while state['samples_done'] < last_sample - first_sample:
+        state = await loop.run_in_executor(executor, simulate_chunk, config, state, chunk_size)
+        result = SimulationResult(config, state)
+        stop = progress(tracker.update(result)) if progress is not None else None
+        yield result
+        if stop is True:
+            return
+
+
+async def simulate_async(config, state=None, chunk_size=1000, executor=None, timeout=None,
+                         progress=None):
+    """Performs a simulation without blocking the event loop, returning its results. See
+    `iter_simulation()` for the description of the arguments.
+
+    Arguments:
+
+        timeout -- maximum time in seconds, after which the simulation is cancelled and
+        `asyncio.TimeoutError` is raised, or `None`.
+    """
+    initial_state = seeded_state(config) if state is None else state
+
+    async def run():
+        result = None
+        async for result in iter_simulation(config, initial_state, chunk_size, executor, progress):
+            pass
+        return result if result is not None else SimulationResult(config, initial_state)
+    return await asyncio.wait_for(run(), timeout)
+
+
+def simulate_chunk(config, state, samples):
+    """Performs at most `samples` of the samples missing in a simulation state, returning a new
+    updated state, without changing the given one. The samples are drawn from a generator of
+    their own, restored from the state, so chunks of several simulations can be performed at
+    once in different threads. Used by `iter_simulation()`, possibly in another process.
+    """
+    state = copy.deepcopy(state)
+    simulate(config, state, samples=samples, rng=np.random.RandomState())
+    return state
+
+
+def parse_shard(shard):
+    """Converts a shard specification, `'I/N'`, to the shard index I and the number of shards N.
+    """
+    index, count = shard.split('/')
+    return int(index), int(count)
+
+
+def sample_range(config):
+    """Returns the first and last (exclusive) Monte Carlo samples to perform, which for sharded
+    simulations are the samples of the blocks belonging to the shard.
+    """
+    if config.shard is None:
+        return 0, config.monte_carlo_samples
+
+    shard_index, shard_count = parse_shard(config.shard)
+    num_blocks = -(-config.monte_carlo_samples // config.block_size)
+    first_block = shard_index * num_blocks // shard_count
+    last_block = (shard_index + 1) * num_blocks // shard_count
+    return (first_block * config.block_size,
+            min(last_block * config.block_size, config.monte_carlo_samples))
+
+
+def new_state(config, snr_dB=None, rng_state=None):
+    """Returns the state of a simulation which has not started yet, seeding the generator.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        snr_dB -- SNR values in dB, by default those given by the configuration.
+
+        rng_state -- generator state to store in the simulation state, instead of seeding the
+        generator.
+    """
+    if snr_dB is None:
+        snr_dB = config.snr_values()
+
+    # If a seed was defined, set it
+    if rng_state is None:
+        if (config.seed is not None):
+            np.random.seed(config.seed)
+        rng_state = np.random.get_state()
+
+    # Sharded simulations keep the sums of each block of samples, which are combined in order,
+    # and quasi-Monte Carlo simulations those of each replicate
+    first_sample, last_sample = sample_range(config)
+    num_blocks = -(-(last_sample - first_sample) // config.block_size)
+    if config.sampler == 'sobol':
+        num_blocks = config.replicates
+
+    return {
+        'params': config.params(),
+        'samples_done': 0,
+        'snr_dB': snr_dB,
+        # Sums of the metrics over the Monte Carlo samples, for each SNR value
+        'sums': {name: np.zeros(len(snr_dB)) for name in metric_names},
+        'rng_state': rng_state,
+        'gains_primary': np.zeros(0) if config.store_gains else None,
+        'gains_secondary': np.zeros(0) if config.store_gains else None,
+        'block_sums': {name: np.zeros((num_blocks, len(snr_dB))) for name in metric_names}
+                      if config.shard is not None or config.sampler == 'sobol' else None,
+        'sketches': create_sketches(len(snr_dB)) if config.sketches else None,
+        'variance_reduction': None,
+    }
+
+
+def seeded_state(config, snr_dB=None):
+    """Returns the state of a simulation which has not started yet, like `new_state()`, with the
+    state of a generator seeded with the seed of the simulation, without seeding the global one.
+    """
+    return new_state(config, snr_dB, np.random.RandomState(config.seed).get_state())
+
+
+def load_state(filename):
+    """Loads a simulation state from a checkpoint file.
+
+    Return:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        state -- the simulation state.
+    """
+    state = load_checkpoint(filename)
+    if state['sketches'] is not None:
+        state['sketches'] = create_sketches(len(state['snr_dB']), state['sketches'])
+    config = SimulationConfig.from_params(state['params'],
+                                          store_gains=state['gains_primary'] is not None)
+    return config, state
+
+
+def create_sketches(num_snr, counts=None):
+    """Returns the sketches of the distributions of the achievable rates, for each SNR value,
+    and of the channel gains, optionally with the given counts.
+    """
+    counts = counts or {}
+    sketches = {}
+    for user in ['usr1', 'usr2']:
+        sketches['hist_rate_' + user] = LogHistogram(num_snr, -6, 2, 160, counts.get('hist_rate_' + user))
+        sketches['quantile_rate_' + user] = QuantileSketch(num_snr, counts=counts.get('quantile_rate_' + user))
+        sketches['hist_gain_' + user] = LogHistogram(1, -10, -2, 160, counts.get('hist_gain_' + user))
+    return sketches
+
+
+def update_sketches(sketches, metrics, channel_gain_primary=None, channel_gain_secondary=None):
+    """Adds the achievable rates and, if given, the channel gains of one sample to the sketches.
+    """
+    sketches['hist_rate_usr1'].add(metrics['avg_arate_usr1'])
+    sketches['hist_rate_usr2'].add(metrics['avg_arate_usr2'])
+    sketches['quantile_rate_usr1'].add(metrics['avg_arate_usr1'])
+    sketches['quantile_rate_usr2'].add(metrics['avg_arate_usr2'])
+    if channel_gain_primary is not None:
+        sketches['hist_gain_usr1'].add(channel_gain_primary)
+        sketches['hist_gain_usr2'].add(channel_gain_secondary)
+
+
+def evaluate_metrics(config, channel_gain_primary, channel_gain_secondary, snr_linear, out=None):
+    """Evaluates the performance metrics of one Monte Carlo sample for various SNR values.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        channel_gain_primary, channel_gain_secondary -- channel gains of the sample.
+
+        snr_linear -- linear SNR values.
+
+        out -- dictionary with an array for each metric where to store the results, which can
+        be reused between samples, or `None` to allocate new arrays.
+
+    Return:
+
+        metrics -- dictionary with the value of each metric for each SNR value.
+    """
+    if out is None:
+        out = {name: np.zeros(len(snr_linear)) for name in metric_names}
+    out_probability_system = out['p_outage_sys']
+    out_probability_primary_user = out['p_outage_usr1']
+    out_probability_secondary_user = out['p_outage_usr2']
+    system_average_rate = out['avg_arate_sys']
+    rate_primary_user = out['avg_arate_usr1']
+    rate_secondary_user = out['avg_arate_usr2']
+
+    for sn in range(0, len(snr_linear)):
+
+        # Calculating achievable rate of primary user
+        rate_primary_user[sn] = calculate_instantaneous_rate_primary(
+            channel_gain_primary,
+            snr_linear[sn],
+            config.power_coeff_primary,
+            config.power_coeff_secondary,
+            config.hardw_ip,
+        )
+        # Calculating achievable rate of secondary user
+        rate_secondary_user[sn] = calculate_instantaneous_rate_secondary(
+            channel_gain_secondary,
+            snr_linear[sn],
+            config.power_coeff_secondary,
+            config.power_coeff_primary,
+            config.hardw_ip,
+            config.sic_ip,
+        )
+
+        system_average_rate[sn] = average_rate(rate_primary_user[sn], rate_secondary_user[sn])
+
+        # Calculating of outage probability of the system
+        out_probability_system[sn], out_probability_primary_user[sn], out_probability_secondary_user[sn] = outage_probability(
+            rate_primary_user[sn],
+            rate_secondary_user[sn],
+            config.target_rate_primary_user,
+            config.target_rate_secondary_user,
+        )
+
+    return out
+
+
+def sample_channel(config, rng=None):
+    """Draws the positions of the UAV and users and the fading of one Monte Carlo sample,
+    returning the channel gains of the primary and secondary users. The values are drawn with
+    the given generator, by default the global one.
+    """
+    # With the table geometry, the users are placed on the x axis, at their horizontal distance
+    # from the UAV, which is at the center
+    if config.geometry == 'table':
+        rng = np.random if rng is None else rng
+        uav_height = rng.uniform(config.uav_height_mean - 5.0, config.uav_height_mean + 5.0)
+        from .geometry import geometry_table
+        table = geometry_table(config.radius_user, config.radius_uav)
+        user_axis_x = np.sqrt(table.squared_distances(rng.random(config.number_user)))
+        s, sigma = fading_rician(config.rician_factor, config.power_los)
+        return generate_channel(s, sigma, config.number_user, user_axis_x, np.zeros(config.number_user),
+                                0.0, 0.0, uav_height, config.path_loss, rng)
+
+    # Position UAV and users
+    uav_axis_x, uav_axis_y, uav_height = random_position_uav(config.number_uav,
+                                                             config.radius_uav,
+                                                             config.uav_height_mean,
+                                                             rng)
+
+    user_axis_x, user_axis_y = random_position_users(config.number_user, config.radius_user, rng)
+
+    s, sigma = fading_rician(config.rician_factor, config.power_los)
+
+    # Generate channel gains
+    return generate_channel(
+        s,
+        sigma,
+        config.number_user,
+        user_axis_x,
+        user_axis_y,
+        uav_axis_x,
+        uav_axis_y,
+        uav_height,
+        config.path_loss,
+        rng,
+    )
+
+
+def sample_rng(config, index, rng=None):
+    """Returns the generator of a Monte Carlo sample: a counter-based one with the `counter`
+    sampler, otherwise `rng` (`None` for the global generator).
+    """
+    return sample_generator(config.seed, index) if config.sampler == 'counter' else rng
+
+
+def batch_sampled(config):
+    """Returns whether all the samples of a simulation are drawn and evaluated at once, which is
+    the case with the `sobol` sampler, antithetic variates or control variates.
+    """
+    return config.sampler == 'sobol' or config.antithetic or config.control_variates
+
+
+def batch_gains(config, rng=None):
+    """Generates the channel gains of all Monte Carlo samples of a simulation at once, from
+    uniform values of the UAV angle and height and the users' angles and radii, and from normal
+    values of the users' fading components. With the `sobol` sampler, the samples of each
+    replicate are the points of an independently randomized Sobol sequence (normal values are
+    obtained through the inverse normal distribution); otherwise they are drawn with the
+    pseudo-random generator. With antithetic variates, each sample is followed by its mirror
+    image, with the complementary uniform values and the negated normal values. The values are
+    drawn with `rng`, an `np.random.RandomState`, by default the global generator.
+
+    Return:
+
+        gains_primary, gains_secondary -- channel gains of the users for each sample.
+
+        controls -- array with the control variates of each sample (see `channel_gains()`).
+    """
+    rng = np.random if rng is None else rng
+    num_points = config.monte_carlo_samples // (2 if config.antithetic else 1)
+    if config.sampler == 'sobol':
+        points = np.concatenate([sobol(num_points // config.replicates, 10, rng=rng)
+                                 for replicate in range(config.replicates)])
+        uniforms, normals = points[:, :6], normal_ppf(points[:, 6:])
+    elif config.sampler == 'counter':
+        uniforms, normals = counter_values(config.seed, 0, num_points)
+    else:
+        uniforms = rng.rand(num_points, 6)
+        normals = rng.standard_normal((num_points, 4))
+    if config.antithetic:
+        uniforms = np.stack([uniforms, 1 - uniforms], axis=1).reshape(-1, 6)
+        normals = np.stack([normals, -normals], axis=1).reshape(-1, 4)
+    return channel_gains(config, uniforms, normals)
+
+
+def counter_values(seed, first, last):
+    """Returns the uniform and normal values (see `user_gains()`) of a range of samples drawn
+    with their counter-based generators, in the same order as `sample_channel()` draws them.
+    """
+    uniforms = np.zeros((last - first, 6))
+    normals = np.zeros((last - first, 4))
+    for index in range(first, last):
+        rng = sample_generator(seed, index)
+        uniforms[index - first] = rng.random(6)
+        normals[index - first] = rng.standard_normal(4)
+    return uniforms, normals
+
+
+def stream_values(config, first, last, rng):
+    """Returns the uniform and normal values (see `user_gains()`) of a range of samples of a
+    sharded simulation, drawn with the `np.random.RandomState` `rng` from the random stream of
+    each block (see `seed_stream()`), or with the counter-based generator of each sample, in the
+    same order as `simulate()` draws them. With the table geometry, only the UAV height and the
+    users' radii are drawn, and the angles are zero.
+    """
+    if config.sampler == 'counter':
+        return counter_values(config.seed, first, last)
+    uniforms = np.zeros((last - first, 6))
+    normals = np.zeros((last - first, 4))
+    # Only the values are drawn sample by sample, in the order of `sample_channel()`
+    columns = [1, 4, 5] if config.geometry == 'table' else slice(None)
+    for index in range(first, last):
+        if index % config.block_size == 0:
+            seed_stream(config.seed, index // config.block_size, rng)
+        uniforms[index - first, columns] = rng.random_sample(3 if config.geometry == 'table' else 6)
+        normals[index - first] = rng.standard_normal(4)
+    return uniforms, normals
+
+
+def sample_gains(config, first, last):
+    """Generates again the channel gains of a range of samples of a simulation with the
+    `counter` sampler, which are the same as in the whole simulation, in time proportional to
+    the number of samples in the range.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        first, last -- first and last (exclusive) indices of the samples.
+
+    Return:
+
+        gains_primary, gains_secondary -- channel gains of the users for each sample.
+    """
+    if config.sampler != 'counter':
+        raise ValueError("Samples can only be generated again with the counter sampler")
+    if first < 0 or last > config.monte_carlo_samples or first > last:
+        raise ValueError(f"Sample range must be (0 <= first <= last <= {config.monte_carlo_samples})")
+    if not batch_sampled(config):
+        gains = [sample_channel(config, sample_generator(config.seed, mc)) for mc in range(first, last)]
+        gains_primary, gains_secondary = np.array(gains).reshape(-1, 2).T
+        return gains_primary, gains_secondary
+
+    # With antithetic variates, the values of each pair of samples are those of a single index
+    pairs = 2 if config.antithetic else 1
+    uniforms, normals = counter_values(config.seed, first // pairs, -(-last // pairs))
+    if config.antithetic:
+        uniforms = np.stack([uniforms, 1 - uniforms], axis=1).reshape(-1, 6)
+        normals = np.stack([normals, -normals], axis=1).reshape(-1, 4)
+    gains_primary, gains_secondary, _ = channel_gains(config, uniforms, normals)
+    offset = first % pairs
+    return gains_primary[offset:offset + last - first], gains_secondary[offset:offset + last - first]
+
+
+def channel_gains(config, uniforms, normals):
+    """Returns the channel gains of samples given by uniform and normal values, which are mapped
+    through the same transforms as in `uavnoma.generate_values`. See `user_gains()` for the
+    description of the arguments.
+
+    Return:
+
+        gains_primary, gains_secondary -- channel gains of the users for each sample.
+
+        controls -- array with shape (num_samples, 4) with the squared distance between the UAV
+        and each user and the squared in-phase fading component of each user, whose expected
+        values are given by `control_means()`.
+    """
+    h_n, controls = user_gains(config, uniforms, normals)
+    return h_n.min(axis=1), h_n.max(axis=1), controls
+
+
+def user_gains(config, uniforms, normals):
+    """Returns the channel gains of each user, before sorting them, of samples given by uniform
+    and normal values.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        uniforms -- array with shape (num_samples, 6) with values in [0, 1]: UAV angle and height,
+        users' angles and users' radii. With the table geometry, the users' radii give their
+        squared horizontal distances to the UAV, and the angles are not used.
+
+        normals -- array with shape (num_samples, 4) with standard normal values: in-phase and
+        quadrature fading components of each user.
+
+    Return:
+
+        h_n -- array with shape (num_samples, 2) with the channel gain of each user.
+
+        controls -- array with shape (num_samples, 4) with the control variates of each sample.
+    """
+    s, sigma = fading_rician(config.rician_factor, config.power_los)
+
+    # Position UAV and users
+    uav_height = (config.uav_height_mean - 5.0) + 10.0 * uniforms[:, 1]
+    if config.geometry == 'table':
+        from .geometry import geometry_table
+        table = geometry_table(config.radius_user, config.radius_uav)
+        squared_distance = table.squared_distances(uniforms[:, 4:6]) + uav_height[:, np.newaxis] ** 2
+    else:
+        theta_uav = uniforms[:, 0] * (np.pi * 2)
+        uav_axis_x = config.radius_uav * np.cos(theta_uav)
+        uav_axis_y = config.radius_uav * np.sin(theta_uav)
+        theta_users = uniforms[:, 2:4] * (np.pi * 2)
+        rho_users = np.sqrt(uniforms[:, 4:6]) * config.radius_user
+        user_axis_x = rho_users * np.cos(theta_users)
+        user_axis_y = rho_users * np.sin(theta_users)
+        squared_distance = ((user_axis_x - uav_axis_x[:, np.newaxis]) ** 2
+                            + (user_axis_y - uav_axis_y[:, np.newaxis]) ** 2
+                            + uav_height[:, np.newaxis] ** 2)
+
+    # Generate channel gains over Rician fading
+    in_phase = s + sigma * normals[:, 0::2]
+    small_scale_fading = np.sqrt(in_phase ** 2 + 1j * (sigma * normals[:, 1::2]) ** 2)
+    large_scale_fading = np.sqrt(np.sqrt(squared_distance) ** config.path_loss)
+    h_n = np.abs(small_scale_fading / large_scale_fading) ** 2
+    controls = np.c_[squared_distance, in_phase ** 2]
+    return h_n, controls
+
+
+def control_means(config):
+    """Returns the expected values of the control variates of each sample (see `channel_gains()`).
+    """
+    s, sigma = fading_rician(config.rician_factor, config.power_los)
+    # The angles are uniform, so the cross terms of the squared distance have zero mean
+    squared_distance = (config.radius_user ** 2 / 2 + config.radius_uav ** 2
+                        + config.uav_height_mean ** 2 + 10.0 ** 2 / 12)
+    return np.array([squared_distance, squared_distance, s ** 2 + sigma ** 2, s ** 2 + sigma ** 2])
+
+
+def generate_gains(config):
+    """Generates the channel gains of all Monte Carlo samples of a (non-sharded) simulation,
+    with the same random draws as `run_simulation()`.
+
+    Return:
+
+        gains_primary, gains_secondary -- channel gains of the users for each sample.
+
+        rng_state -- state of the generator after the last sample.
+
+        controls -- control variates of each sample, for simulations whose samples are drawn
+        at once (see `batch_gains()`), or `None`.
+    """
+    state = new_state(config)
+    np.random.set_state(state['rng_state'])
+    if batch_sampled(config):
+        gains_primary, gains_secondary, controls = batch_gains(config)
+        return gains_primary, gains_secondary, np.random.get_state(), controls
+    gains_primary = np.zeros(config.monte_carlo_samples)
+    gains_secondary = np.zeros(config.monte_carlo_samples)
+    for mc in range(config.monte_carlo_samples):
+        gains_primary[mc], gains_secondary[mc] = sample_channel(config, sample_rng(config, mc))
+    return gains_primary, gains_secondary, np.random.get_state(), None
+
+
+def sample_metrics(config, gains_primary, gains_secondary, snr_linear):
+    """Evaluates the performance metrics of many Monte Carlo samples at once, giving the same
+    values as `evaluate_metrics()` for each sample.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        gains_primary, gains_secondary -- channel gains of the users for each sample.
+
+        snr_linear -- linear SNR values.
+
+    Return:
+
+        metrics -- dictionary with the value of each metric for each sample and SNR value.
+    """
+    rate_primary_user = calculate_instantaneous_rate_primary(
+        gains_primary[:, np.newaxis], snr_linear, config.power_coeff_primary,
+        config.power_coeff_secondary, config.hardw_ip)
+    rate_secondary_user = calculate_instantaneous_rate_secondary(
+        gains_secondary[:, np.newaxis], snr_linear, config.power_coeff_secondary,
+        config.power_coeff_primary, config.hardw_ip, config.sic_ip)
+    outage_primary = rate_primary_user < config.target_rate_primary_user
+    outage_secondary = rate_secondary_user < config.target_rate_secondary_user
+    return {
+        'p_outage_sys': (outage_primary | outage_secondary).astype(float),
+        'p_outage_usr1': outage_primary.astype(float),
+        'p_outage_usr2': outage_secondary.astype(float),
+        'avg_arate_sys': average_rate(rate_primary_user, rate_secondary_user),
+        'avg_arate_usr1': rate_primary_user,
+        'avg_arate_usr2': rate_secondary_user,
+    }
+
+
+class MetricKernel:
+    """Fused evaluation of the sums of the performance metrics of many Monte Carlo samples,
+    giving the same sums as those of `sample_metrics()`, but without its (samples x SNR values)
+    arrays. The rates of both users, the average rate and the outage indicators of a tile of
+    samples are evaluated in place in preallocated arrays which fit in the cache, and added to
+    the running sums in the order of the samples, before evaluating the next tile.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        snr_linear -- linear SNR values.
+
+        tile_size -- number of samples of each tile, by default as many as fit in
+        `kernel_tile_memory` bytes for each array.
+    """
+
+    def __init__(self, config, snr_linear, tile_size=None):
+        self.config = config
+        self.snr_linear = np.asarray(snr_linear, dtype=float)
+        num_snr = len(self.snr_linear)
+        self.tile_size = tile_size or max(1, kernel_tile_memory // (8 * max(num_snr, 1)))
+        # The first row of each metric holds its running sums, followed by the values of the tile
+        self.values = np.zeros((len(metric_names), self.tile_size + 1, num_snr))
+        self.totals = np.zeros((len(metric_names), num_snr))
+        self.products = np.zeros((self.tile_size, num_snr))
+        self.denominators = np.zeros((self.tile_size, num_snr))
+        self.outages = np.zeros((2, self.tile_size, num_snr), dtype=bool)
+
+    def sums(self, gains_primary, gains_secondary, out=None):
+        """Returns the sums of the metrics over the given samples, as an array of shape
+        (metrics, SNR values) in the order of `metric_names`. If `out` is given, the sums are
+        added to its values, as if they were the sums of the previous samples, and stored in it.
+        """
+        config = self.config
+        values, totals = self.values, self.totals
+        outage_primary, outage_secondary = self.outages
+        values[:, 0] = 0 if out is None else out
+        for start in range(0, len(gains_primary), self.tile_size):
+            size = min(self.tile_size, len(gains_primary) - start)
+            tile = values[:, 1:size + 1]
+            products, denominators = self.products[:size], self.denominators[:size]
+            outages = outage_primary[:size], outage_secondary[:size]
+
+            # SINR and rates of the users, with the operations of `calculate_instantaneous_rate_*`
+            users = [(gains_primary, 4, config.power_coeff_primary,
+                      config.power_coeff_secondary + config.hardw_ip ** 2, config.target_rate_primary_user),
+                     (gains_secondary, 5, config.power_coeff_secondary,
+                      config.power_coeff_primary * config.sic_ip + config.hardw_ip ** 2,
+                      config.target_rate_secondary_user)]
+            for (gains, index, power, interference, target), outage in zip(users, outages):
+                rate = tile[index]
+                np.multiply(self.snr_linear, gains[start:start + size, np.newaxis], out=products)
+                np.multiply(products, interference, out=denominators)
+                denominators += 1
+                np.multiply(products, power, out=rate)
+                rate /= denominators
+                rate += 1
+                np.log(rate, out=rate)
+                np.less(rate, target, out=outage)
+
+            np.add(tile[4], tile[5], out=tile[3])
+            tile[3] /= 2
+            tile[1] = outages[0]
+            tile[2] = outages[1]
+            np.logical_or(outages[0], outages[1], out=outages[0])
+            tile[0] = outages[0]
+
+            # Summing along the samples adds them in order, after the running sums
+            np.sum(values[:, :size + 1], axis=1, out=totals)
+            values[:, 0] = totals
+        if out is None:
+            return values[:, 0].copy()
+        out[...] = values[:, 0]
+        return out
+
+
+def evaluate_gains(config, gains_primary, gains_secondary, rng_state, controls=None, writer=None):
+    """Returns the finished state of a (non-sharded) simulation whose channel gains were already
+    generated, e.g. with `generate_gains()`, evaluating the metrics of all samples and SNR values
+    at once. The results are the same as those of `run_simulation()`, since only the channel
+    gains are random, so gains can be reused for configurations which differ only in the SNR
+    values, power coefficients, impairments or target rates. If only the sums of the metrics are
+    needed, i.e. without sketches, raw data or variance reduction, they are evaluated with a
+    `MetricKernel`, without the arrays of the metrics of all samples.
+
+    With control variates, the metrics of each sample are adjusted by subtracting the
+    deviations of the controls from their expected values, weighted with the coefficients which
+    minimize the variance (estimated by least squares from the same samples).
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        gains_primary, gains_secondary -- channel gains of the users for each sample.
+
+        rng_state -- state of the generator after the last sample.
+
+        controls -- control variates of each sample, required with control variates.
+
+        writer -- raw data writer which receives the channel gains and rates of each sample.
+    """
+    state = new_state(config, rng_state=rng_state)
+    snr_linear = 10.0 ** (state['snr_dB'] / 10.0)
+
+    # Without sketches, raw data or variance reduction, only the sums of the metrics are needed
+    if state['sketches'] is None and writer is None and not batch_sampled(config):
+        kernel = MetricKernel(config, snr_linear)
+        if state['block_sums'] is None:
+            sums = kernel.sums(gains_primary, gains_secondary)
+            for m, name in enumerate(metric_names):
+                state['sums'][name] += sums[m]
+        else:
+            for block in range(len(state['block_sums'][metric_names[0]])):
+                samples = slice(block * config.block_size, (block + 1) * config.block_size)
+                sums = kernel.sums(gains_primary[samples], gains_secondary[samples])
+                for m, name in enumerate(metric_names):
+                    state['block_sums'][name][block] = sums[m]
+    else:
+        metrics = sample_metrics(config, gains_primary, gains_secondary, snr_linear)
+        if state['sketches'] is not None:
+            update_sketches(state['sketches'], metrics, gains_primary, gains_secondary)
+        if writer is not None:
+            for mc in range(config.monte_carlo_samples):
+                writer.write(gains_primary[mc], gains_secondary[mc],
+                             metrics['avg_arate_usr1'][mc], metrics['avg_arate_usr2'][mc])
+
+        adjusted = metrics
+        if config.control_variates:
+            # With antithetic variates, the coefficients minimize the variance of the pair averages
+            deviations = controls - control_means(config)
+            pairs = 2 if config.antithetic else 1
+            pair_deviations = deviations.reshape(-1, pairs, deviations.shape[1]).mean(axis=1)
+            centered = pair_deviations - pair_deviations.mean(axis=0)
+            adjusted = {}
+            for name, values in metrics.items():
+                pair_values = values.reshape(-1, pairs, values.shape[1]).mean(axis=1)
+                coefficients = np.linalg.lstsq(centered, pair_values - pair_values.mean(axis=0), rcond=None)[0]
+                adjusted[name] = values - deviations @ coefficients
+        if batch_sampled(config):
+            state['variance_reduction'] = {name: variance_reduction(config, metrics[name], adjusted[name])
+                                           for name in metric_names}
+
+        # Summing along the samples adds them in order, as the sample by sample simulation does
+        for name in metric_names:
+            if state['block_sums'] is None:
+                state['sums'][name] += adjusted[name].sum(axis=0)
+            else:
+                blocks = state['block_sums'][name]
+                blocks[:] = adjusted[name].reshape(len(blocks), -1, len(snr_linear)).sum(axis=1)
+    if config.store_gains:
+        state['gains_primary'] = gains_primary.copy()
+        state['gains_secondary'] = gains_secondary.copy()
+    state['samples_done'] = config.monte_carlo_samples
+    return state
+
+
+def variance_reduction(config, plain, adjusted):
+    """Returns the variance reduction factor of the estimator of the average of a metric, for
+    each SNR value: the ratio between the variance of the plain average of independent samples
+    and the variance of the estimator used, which takes into account the control variates,
+    the antithetic pairs and the replicates of the `sobol` sampler.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        plain -- values of the metric for each sample and SNR value.
+
+        adjusted -- values adjusted with the control variates (the same as `plain` without them).
+    """
+    plain_variance = plain.var(axis=0, ddof=1) / len(plain)
+    if config.sampler == 'sobol':
+        means = adjusted.reshape(config.replicates, -1, adjusted.shape[1]).mean(axis=1)
+        variance = means.var(axis=0, ddof=1) / config.replicates if config.replicates > 1 else np.nan
+    elif config.antithetic:
+        pairs = adjusted.reshape(-1, 2, adjusted.shape[1]).mean(axis=1)
+        variance = pairs.var(axis=0, ddof=1) / len(pairs)
+    else:
+        variance = adjusted.var(axis=0, ddof=1) / len(adjusted)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return plain_variance / variance
+
+
+def simulate(config, state, writer=None, checkpoint=None, checkpoint_every=1000, samples=None,
+             rng=None):
+    """Performs the Monte Carlo samples missing in the simulation state, or at most `samples`
+    of them, updating it in place. The samples are drawn with `rng`, an `np.random.RandomState`
+    whose state is restored from the simulation state, by default the global generator. See
+    `run_simulation()` for the description of the other arguments.
+    """
+    rng = np.random if rng is None else rng
+
+    # Quasi-Monte Carlo samples and variance-reduced samples are all generated and evaluated at once
+    if batch_sampled(config):
+        if state['samples_done'] < config.monte_carlo_samples:
+            rng.set_state(state['rng_state'])
+            gains_primary, gains_secondary, controls = batch_gains(config, rng)
+            state.update(evaluate_gains(config, gains_primary, gains_secondary,
+                                        rng.get_state(), controls, writer))
+            if checkpoint is not None:
+                save_checkpoint(checkpoint, state)
+        return
+    snr_linear = 10.0 ** (state['snr_dB'] / 10.0)  # SNR linear
+    sums = state['sums']
+    block_sums = state['block_sums']
+    metrics = {name: np.zeros(len(snr_linear)) for name in metric_names}
+    rng.set_state(state['rng_state'])
+    first_sample, last_sample = sample_range(config)
+
+    # Make room for the channel gains of the new samples, if they are being stored
+    store_gains = state['gains_primary'] is not None
+    if store_gains and len(state['gains_primary']) < last_sample - first_sample:
+        missing = np.zeros(last_sample - first_sample - len(state['gains_primary']))
+        state['gains_primary'] = np.concatenate([state['gains_primary'], missing])
+        state['gains_secondary'] = np.concatenate([state['gains_secondary'], missing])
+
+    stop_sample = last_sample
+    if samples is not None:
+        stop_sample = min(last_sample, first_sample + state['samples_done'] + samples)
+
+    for mc in range(first_sample + state['samples_done'], stop_sample):
+        # In sharded simulations each block of samples has an independent random stream, while
+        # with the counter sampler each sample has its own
+        if block_sums is not None and mc % config.block_size == 0 and config.sampler != 'counter':
+            seed_stream(config.seed, mc // config.block_size, rng)
+
+        channel_gain_primary, channel_gain_secondary = sample_channel(config, sample_rng(config, mc, rng))
+        if store_gains:
+            state['gains_primary'][mc - first_sample] = channel_gain_primary
+            state['gains_secondary'][mc - first_sample] = channel_gain_secondary
+
+        # Analyzes system performance metrics for various SNR values and accumulate them
+        evaluate_metrics(config, channel_gain_primary, channel_gain_secondary, snr_linear, metrics)
+        for name in sums:
+            sums[name] += metrics[name]
+        if state['sketches'] is not None:
+            update_sketches(state['sketches'], metrics, channel_gain_primary, channel_gain_secondary)
+        if writer is not None:
+            writer.write(channel_gain_primary, channel_gain_secondary,
+                         metrics['avg_arate_usr1'], metrics['avg_arate_usr2'])
+
+        # At the end of a block, move its sums to the block sums
+        if block_sums is not None and ((mc + 1) % config.block_size == 0 or mc + 1 == last_sample):
+            for name in sums:
+                block_sums[name][(mc - first_sample) // config.block_size] = sums[name]
+                sums[name][:] = 0
+
+        # Periodically save the simulation state, including after the last sample
+        state['samples_done'] = mc + 1 - first_sample
+        if checkpoint is not None and ((mc + 1) % checkpoint_every == 0 or mc + 1 == last_sample):
+            state['params'] = config.params()
+            state['rng_state'] = rng.get_state()
+            save_checkpoint(checkpoint, state)
+
+    state['params'] = config.params()
+    state['rng_state'] = rng.get_state()
+
+    # Shards without any block have no samples to checkpoint, but their state is needed to merge
+    # the shards
+    if checkpoint is not None and first_sample == last_sample:
+        save_checkpoint(checkpoint, state)
+
+
+def result_sums(state):
+    """Returns the sums of the metrics over all samples done, for each SNR value.
+    """
+    if state['block_sums'] is None:
+        return state['sums']
+
+    # Add the block sums always in the same order, so that the result does not depend on how
+    # the blocks were distributed among shards, and then the sums of the unfinished block
+    sums = {}
+    for name, blocks in state['block_sums'].items():
+        sums[name] = np.zeros(blocks.shape[1])
+        for block in blocks:
+            sums[name] += block
+        sums[name] += state['sums'][name]
+    return sums
+
+
+def extend_state(config, state, samples=0, snr_points=()):
+    """Prepares a finished simulation to be extended with more samples and/or SNR values. The
+    new SNR values are evaluated immediately over the stored channel gains, while the new samples
+    are performed by calling `run_simulation()` with the returned configuration and the state.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the finished simulation.
+
+        state -- the simulation state, which is updated in place.
+
+        samples -- number of additional Monte Carlo samples.
+
+        snr_points -- additional SNR values in dB, which require stored channel gains.
+
+    Return:
+
+        config -- the `SimulationConfig` of the extended simulation.
+    """
+    if config.shard is not None:
+        raise ValueError("Sharded simulations can't be extended")
+    if batch_sampled(config):
+        raise ValueError("Simulations with the sobol sampler, antithetic or control variates can't be extended")
+    if state['samples_done'] != config.monte_carlo_samples:
+        raise ValueError("The stored simulation is not finished, resume it to complete it")
+    if samples < 0:
+        raise ValueError("Number of additional samples must be (value >= 0)")
+
+    new_snr_dB = np.setdiff1d(snr_points, state['snr_dB'])
+    if len(new_snr_dB) > 0 and state['gains_primary'] is None:
+        raise ValueError("New SNR values require a simulation stored with the channel gains")
+
+    # The SNR range now spans all SNR values, old and new
+    snr_dB = np.union1d(state['snr_dB'], new_snr_dB)
+    config = dataclasses.replace(config, snr_min=float(snr_dB[0]), snr_max=float(snr_dB[-1]),
+                                 snr_samples=len(snr_dB),
+                                 monte_carlo_samples=config.monte_carlo_samples + samples)
+
+    # Evaluate the new SNR values over the stored channel gains
+    if len(new_snr_dB) > 0:
+        new_sums = {name: np.zeros(len(new_snr_dB)) for name in state['sums']}
+        new_sketches = create_sketches(len(new_snr_dB))
+        metrics = {name: np.zeros(len(new_snr_dB)) for name in metric_names}
+        if state['sketches'] is None:
+            sums = MetricKernel(config, 10.0 ** (new_snr_dB / 10.0)).sums(
+                state['gains_primary'][:state['samples_done']], state['gains_secondary'][:state['samples_done']])
+            for m, name in enumerate(metric_names):
+                new_sums[name] += sums[m]
+        else:
+            for mc in range(state['samples_done']):
+                evaluate_metrics(config, state['gains_primary'][mc], state['gains_secondary'][mc],
+                                 10.0 ** (new_snr_dB / 10.0), metrics)
+                for name in new_sums:
+                    new_sums[name] += metrics[name]
+                update_sketches(new_sketches, metrics)
+
+        # Merge the old and new values, keeping the SNR values sorted
+        index_old = np.searchsorted(snr_dB, state['snr_dB'])
+        index_new = np.searchsorted(snr_dB, new_snr_dB)
+        def insert(old, new):
+            values = np.zeros((len(snr_dB),) + old.shape[1:], dtype=old.dtype)
+            values[index_old] = old
+            values[index_new] = new
+            return values
+        for name in state['sums']:
+            state['sums'][name] = insert(state['sums'][name], new_sums[name])
+        if state['sketches'] is not None:
+            for name in snr_sketch_names:
+                state['sketches'][name].counts = insert(state['sketches'][name].counts,
+                                                        new_sketches[name].counts)
+        state['snr_dB'] = snr_dB
+
+    state['params'] = config.params()
+    return config
+
+
+def merge_states(states):
+    """Merges the states of all shards of a simulation into the state of the same simulation
+    performed as a single shard (`'0/1'`), whose results are exactly the same.
+
+    Arguments:
+
+        states -- list with the states of the finished shards, in any order.
+
+    Return:
+
+        config -- the `SimulationConfig` of the merged simulation.
+
+        state -- the merged simulation state.
+    """
+    # Check that the shards are all the finished parts of the same simulation
+    shard_count = None
+    shards = {}
+    for i, state in enumerate(states):
+        params = dict(state['params'], shard=None)
+        if state['params'].get('shard') is None or params != dict(states[0]['params'], shard=None):
+            raise ValueError(f"State {i} is not a shard of the same simulation")
+        config = SimulationConfig.from_params(state['params'])
+        shard_index, count = parse_shard(config.shard)
+        shard_count = count if shard_count is None else shard_count
+        if count != shard_count or shard_index in shards:
+            raise ValueError(f"State {i} is not a shard of the same simulation")
+        first_sample, last_sample = sample_range(config)
+        if state['samples_done'] != last_sample - first_sample:
+            raise ValueError(f"Shard {shard_index} is not finished, resume it to complete it")
+        shards[shard_index] = state
+    if len(shards) != shard_count:
+        raise ValueError(f"Missing shards, {len(shards)} of {shard_count} given")
+
+    # The merged simulation is the same as a simulation with a single shard
+    config = dataclasses.replace(config, shard='0/1')
+    ordered = [shards[i] for i in range(shard_count)]
+    state = new_state(config, ordered[0]['snr_dB'])
+    state['samples_done'] = config.monte_carlo_samples
+    state['block_sums'] = {name: np.concatenate([shard['block_sums'][name] for shard in ordered])
+                           for name in metric_names}
+    state['rng_state'] = ordered[-1]['rng_state']
+    if all(shard['gains_primary'] is not None for shard in ordered):
+        config = dataclasses.replace(config, store_gains=True)
+        state['gains_primary'] = np.concatenate([shard['gains_primary'] for shard in ordered])
+        state['gains_secondary'] = np.concatenate([shard['gains_secondary'] for shard in ordered])
+    if state['sketches'] is not None:
+        for shard in ordered:
+            for name, sketch in state['sketches'].items():
+                sketch.merge(shard['sketches'][name])
+    return config, state
@@ -0,0 +1,130 @@
+"""
+    This module contains streaming sketches which summarize the distribution of a quantity,
+    such as the instantaneous rate at each SNR value, in bounded memory.
+
+    Each sketch tracks several series (e.g. one per SNR value) with a fixed-size array of
+    counts, so sketches built over different chunks of samples, or by different workers, are
+    merged exactly by adding their counts.
+"""
+
+import numpy as np
+
+class LogHistogram:
+    """Histogram with fixed bins equally spaced in log10 scale, from which the cumulative
+    distribution function (CDF) of each series is obtained.
+
+    Values below the first bin (including zero) and above the last bin are counted in an
+    underflow and an overflow bin, respectively.
+
+    Arguments:
+
+        num_series -- number of series (e.g. SNR values) tracked.
+
+        low, high -- log10 of the lowest and highest bin edges.
+
+        bins -- number of bins.
+
+        counts -- initial counts, with shape (num_series, bins + 2), e.g. loaded from a file.
+    """
+
+    def __init__(self, num_series, low, high, bins, counts=None):
+        self.low = low
+        self.high = high
+        self.bins = bins
+        self.counts = np.zeros((num_series, bins + 2), dtype=np.int64) if counts is None else counts
+
+    def add(self, values):
+        """Adds values to the histogram.
+
+        Arguments:
+
+            values -- array with shape (num_series,) or (num_samples, num_series).
+        """
+        values = np.reshape(values, (-1, self.counts.shape[0]))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            position = (np.log10(values) - self.low) * (self.bins / (self.high - self.low))
+        index = np.clip(np.floor(np.nan_to_num(position, nan=-1.0, neginf=-1.0)), -1, self.bins) + 1
+        index = index.astype(np.int64) + np.arange(self.counts.shape[0]) * (self.bins + 2)
+        self.counts += np.bincount(index.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+
+    def merge(self, other):
+        """Adds the counts of another histogram with the same bins.
+        """
+        self.counts += other.counts
+
+    def edges(self):
+        """Returns the bin edges, with length bins + 1.
+        """
+        return 10.0 ** np.linspace(self.low, self.high, self.bins + 1)
+
+    def cdf(self):
+        """Returns the CDF of each series at each bin edge, i.e. the fraction of values lower
+        than the edge, with shape (num_series, bins + 1).
+        """
+        total = np.maximum(self.counts.sum(axis=1, keepdims=True), 1)
+        return np.cumsum(self.counts, axis=1)[:, :-1] / total
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative accuracy guarantees, based on logarithmically
+    spaced buckets (as in DDSketch). Quantiles of values between `min_value` and `max_value`
+    are estimated within the given relative accuracy; lower values are reported as zero.
+
+    Arguments:
+
+        num_series -- number of series (e.g. SNR values) tracked.
+
+        relative_accuracy -- maximum relative error of the estimated quantiles.
+
+        min_value, max_value -- range of values tracked with the given accuracy.
+
+        counts -- initial counts, e.g. loaded from a file.
+    """
+
+    def __init__(self, num_series, relative_accuracy=0.01, min_value=1e-12, max_value=1e6,
+                 counts=None):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.offset = int(np.ceil(np.log(min_value) / np.log(self.gamma)))
+        num_buckets = int(np.ceil(np.log(max_value) / np.log(self.gamma))) - self.offset + 1
+        # The first bucket holds the values lower than min_value
+        self.counts = np.zeros((num_series, num_buckets + 1), dtype=np.int64) if counts is None else counts
+
+    def add(self, values):
+        """Adds values to the sketch.
+
+        Arguments:
+
+            values -- array with shape (num_series,) or (num_samples, num_series).
+        """
+        values = np.reshape(values, (-1, self.counts.shape[0]))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bucket = np.ceil(np.log(values) / np.log(self.gamma)) - self.offset
+        bucket = np.clip(np.nan_to_num(bucket, nan=-1.0, neginf=-1.0), -1, self.counts.shape[1] - 2) + 1
+        index = bucket.astype(np.int64) + np.arange(self.counts.shape[0]) * self.counts.shape[1]
+        self.counts += np.bincount(index.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+
+    def merge(self, other):
+        """Adds the counts of another sketch with the same accuracy and range.
+        """
+        self.counts += other.counts
+
+    def quantile(self, q):
+        """Returns the estimated q-quantile of each series.
+
+        Arguments:
+
+            q -- quantile, 0 <= q <= 1.
+
+        Return:
+
+            values -- array with the estimated quantile of each series (NaN for empty series).
+        """
+        cumulative = np.cumsum(self.counts, axis=1)
+        total = cumulative[:, -1]
+        rank = q * (total - 1)
+        bucket = np.array([np.searchsorted(cumulative[i], rank[i], side="right")
+                           for i in range(self.counts.shape[0])])
+        index = bucket - 1 + self.offset
+        values = 2 * self.gamma ** index / (self.gamma + 1)
+        values = np.where(bucket == 0, 0.0, values)
+        return np.where(total > 0, values, np.nan)
@@ -0,0 +1,172 @@
+"""
+    This module contains the streaming output of the running estimates of a simulation, a row
+    per SNR value after each chunk of samples, so that downstream programs (e.g. plots) can use
+    them long before the simulation finishes.
+
+    `RowStream` is a progress callback of `run_simulation()` (see `uavnoma.progress`), which
+    computes the confidence intervals of the estimates by the method of batch means, each chunk
+    of samples being a batch, and passes the rows to an output function, such as `RowsCSV` or
+    `RowsJSONLines`:
+
+    ```
+    from uavnoma import SimulationConfig, run_simulation
+    from uavnoma.streaming import RowStream, RowsCSV
+
+    with open('rows.csv', 'w') as fh:
+        stream = RowStream(RowsCSV(fh), tolerance=0.01)
+        result = run_simulation(SimulationConfig(monte_carlo_samples=100000), progress=stream,
+                                progress_every=2000)
+    ```
+
+    Each row has the number of samples so far, the SNR value, the estimate of each metric and
+    the half width of its confidence interval (`<metric>_ci`), and whether the row is final.
+    With a `tolerance`, the row of an SNR value is final as soon as the half widths of all its
+    metrics are within `tolerance` times their estimates, after at least `min_batches` chunks,
+    and is not emitted again, and the simulation stops early when the rows of all SNR values are
+    final. Otherwise, or if the samples run out first, the remaining rows are final when the
+    simulation finishes. All SNR values are evaluated over the same samples, so a final row
+    keeps its estimates at the time it was finalized, while the results of the simulation have
+    all the samples performed.
+"""
+
+import csv
+import json
+from statistics import NormalDist
+import numpy as np
+from .simulation import metric_names, result_sums
+
+stream_formats = ['csv', 'jsonl']
+
+
+class RowStream:
+    """Progress callback which streams the running estimates of each SNR value, with their
+    confidence intervals, as rows, finalizing the rows of the SNR values as they converge.
+    It returns `True` when the rows of all SNR values are final, which stops the simulation.
+
+    Arguments:
+
+        output -- function called with the list of rows (dictionaries) of each update.
+
+        tolerance -- relative half width of the confidence intervals at which the row of an SNR
+        value is final, or `None` to finalize the rows when the simulation finishes.
+
+        confidence -- confidence level of the intervals.
+
+        min_batches -- minimum number of chunks before a row can be final.
+    """
+
+    def __init__(self, output, tolerance=None, confidence=0.95, min_batches=10):
+        if tolerance is not None and tolerance <= 0:
+            raise ValueError("Tolerance must be (value > 0)")
+        if not 0 < confidence < 1:
+            raise ValueError("Confidence must be (0 < value < 1)")
+        if min_batches < 2:
+            raise ValueError("Minimum number of batches must be (value >= 2)")
+        self.output = output
+        self.tolerance = tolerance
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.min_batches = min_batches
+        self.batches = 0
+        self.samples = 0
+        self.sums = None
+        self.squares = None
+        self.final = None
+
+    def __call__(self, progress):
+        result = progress.result
+        sums = result_sums(result.state)
+        batch_samples = result.samples - self.samples
+        if self.sums is None:
+            self.sums = {name: np.zeros_like(values) for name, values in sums.items()}
+            self.squares = {name: np.zeros_like(values) for name, values in sums.items()}
+            self.final = np.zeros(len(result.snr_dB), dtype=bool)
+
+        # Batch means: the sums of the squared batch means, weighted by the batch sizes
+        if batch_samples > 0:
+            for name in metric_names:
+                self.squares[name] += (sums[name] - self.sums[name]) ** 2 / batch_samples
+                self.sums[name] = sums[name].copy()
+            self.batches += 1
+            self.samples = result.samples
+
+        estimates = {name: getattr(result, name) for name in metric_names}
+        half_widths = self.half_widths(estimates)
+        converged = np.zeros(len(result.snr_dB), dtype=bool)
+        if self.tolerance is not None and self.batches >= self.min_batches:
+            converged[:] = True
+            for name in metric_names:
+                converged &= half_widths[name] <= self.tolerance * np.abs(estimates[name])
+        finished = progress.samples_done >= progress.total_samples
+        newly_final = ~self.final & (converged | finished)
+
+        rows = []
+        for sn in np.flatnonzero(~self.final):
+            row = {'samples': int(result.samples), 'snr_dB': float(result.snr_dB[sn]),
+                   'final': bool(newly_final[sn])}
+            for name in metric_names:
+                row[name] = float(estimates[name][sn])
+                row[name + '_ci'] = float(half_widths[name][sn])
+            rows.append(row)
+        self.final |= newly_final
+        if rows:
+            self.output(rows)
+        return bool(self.final.all())
+
+    def half_widths(self, estimates):
+        """Returns the half widths of the confidence intervals of the estimates of the metrics,
+        NaN with less than two batches.
+        """
+        if self.batches < 2:
+            return {name: np.full_like(values, np.nan) for name, values in estimates.items()}
+        widths = {}
+        for name, values in estimates.items():
+            # Variance of the samples, estimated from that of the batch means
+            variance = (self.squares[name] - self.samples * values ** 2) / (self.batches - 1)
+            widths[name] = self.z * np.sqrt(np.maximum(variance, 0) / self.samples)
+        return widths
+
+
+def missing(row, value):
+    """Returns a row with the NaN values (e.g. unknown confidence intervals) replaced.
+    """
+    return {name: value if isinstance(field, float) and np.isnan(field) else field
+            for name, field in row.items()}
+
+
+class RowsCSV:
+    """Output of a `RowStream` which writes the rows to a CSV file, with a header. NaN values
+    are written as empty fields.
+
+    Arguments:
+
+        file -- text file where to write.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.writer = None
+
+    def __call__(self, rows):
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(rows[0]), lineterminator='\n')
+            self.writer.writeheader()
+        self.writer.writerows(missing(row, '') for row in rows)
+        self.file.flush()
+
+
+class RowsJSONLines:
+    """Output of a `RowStream` which writes each row as a JSON object in a line of a file.
+    NaN values are written as `null`.
+
+    Arguments:
+
+        file -- text file where to write.
+    """
+
+    def __init__(self, file):
+        self.file = file
+
+    def __call__(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(missing(row, None)) + '\n')
+        self.file.flush()
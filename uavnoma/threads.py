@@ -0,0 +1,138 @@
+"""
+    This module contains the thread-pool engine, which performs a simulation in several threads
+    of the calling process, for applications where worker processes can't be forked. Each thread
+    performs a contiguous group of blocks of `block_size` samples, drawing their random values
+    from its own generator, derived from the seed, the number of threads and the index of the
+    thread, into its own buffers, and evaluating the channel gains and sums of the metrics of
+    all samples of a block at once (see `uavnoma.simulation.user_gains()`). NumPy releases the
+    GIL while filling and evaluating arrays, so the threads run on different cores.
+
+    The global `np.random` generator is neither used nor seeded, so simulations can run in
+    several threads at once, alongside other code. Threads don't share any state while running:
+    each one keeps the sums of its blocks and its distribution sketches, which are merged in the
+    order of the threads when all of them finish. So the results only depend on the seed, the
+    block size and the number of threads, not on their timing. The random values are drawn in a
+    different order than in the other engines, so the results are statistically equivalent to
+    theirs, but not equal.
+
+    ```
+    from uavnoma import SimulationConfig
+    from uavnoma.threads import run_threads
+
+    result = run_threads(SimulationConfig(monte_carlo_samples=100000, seed=1), threads=4)
+    ```
+"""
+
+import dataclasses
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .simulation import SimulationResult, metric_names, seeded_state, batch_sampled
+from .simulation import channel_gains, sample_metrics, create_sketches, update_sketches, MetricKernel
+
+
+def run_threads(config, threads=None):
+    """Performs a simulation in a pool of threads.
+
+    Simulations without a seed are given a random one. Sharded simulations and those with the
+    `sobol` or `counter` samplers, antithetic or control variates can't be run in threads.
+
+    Arguments:
+
+        config -- the `SimulationConfig` of the simulation.
+
+        threads -- number of threads, by default the number of CPUs, at most the number of
+        blocks of samples.
+
+    Return:
+
+        result -- a `SimulationResult`, whose configuration has the seed used.
+    """
+    if config.shard is not None:
+        raise ValueError("Threaded simulations can't be sharded")
+    if config.sampler != 'random' or batch_sampled(config):
+        raise ValueError("Threaded simulations require the random sampler, without antithetic "
+                         "or control variates")
+    threads = threads or os.cpu_count() or 1
+    if threads < 1:
+        raise ValueError("Number of threads must be (value >= 1)")
+    if config.seed is None:
+        config = dataclasses.replace(config, seed=int(np.random.default_rng().integers(2 ** 31 - 1)))
+
+    state = seeded_state(config)
+    num_samples, block_size = config.monte_carlo_samples, config.block_size
+    num_blocks = -(-num_samples // block_size)
+    threads = min(threads, num_blocks)
+    if config.store_gains:
+        state['gains_primary'] = np.zeros(num_samples)
+        state['gains_secondary'] = np.zeros(num_samples)
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [executor.submit(run_blocks, config, state, thread, threads, stop)
+                   for thread in range(threads)]
+        try:
+            accumulators = [future.result() for future in futures]
+        finally:
+            # Stop the other threads if one failed
+            stop.set()
+
+    state['block_sums'] = {name: np.concatenate([sums[m] for sums, _ in accumulators])
+                           for m, name in enumerate(metric_names)}
+    if config.sketches:
+        state['sketches'] = create_sketches(len(state['snr_dB']), {
+            name: sum(sketches[name].counts for _, sketches in accumulators)
+            for name in state['sketches']})
+    state['samples_done'] = num_samples
+    return SimulationResult(config, state)
+
+
+def run_blocks(config, state, thread, threads, stop):
+    """Performs the blocks of samples of a thread, storing their channel gains, if requested,
+    in its part of the arrays of the state.
+
+    Return:
+
+        block_sums -- array with shape (metrics, blocks, SNR values) with the sums of the
+        metrics of each block of the thread, in the order of `metric_names`.
+
+        sketches -- the sketches of the samples of the thread, or `None`.
+    """
+    num_samples, block_size = config.monte_carlo_samples, config.block_size
+    num_blocks = -(-num_samples // block_size)
+    first_block = thread * num_blocks // threads
+    last_block = (thread + 1) * num_blocks // threads
+    snr_linear = 10.0 ** (state['snr_dB'] / 10.0)
+
+    rng = thread_generator(config.seed, thread, threads)
+    uniforms, normals = np.zeros((block_size, 6)), np.zeros((block_size, 4))
+    kernel = MetricKernel(config, snr_linear)
+    block_sums = np.zeros((len(metric_names), last_block - first_block, len(snr_linear)))
+    sketches = create_sketches(len(snr_linear)) if config.sketches else None
+    for block in range(first_block, last_block):
+        if stop.is_set():
+            break
+        first = block * block_size
+        size = min(block_size, num_samples - first)
+        rng.random(out=uniforms[:size])
+        rng.standard_normal(out=normals[:size])
+        gains_primary, gains_secondary, _ = channel_gains(config, uniforms[:size], normals[:size])
+        if sketches is None:
+            kernel.sums(gains_primary, gains_secondary, out=block_sums[:, block - first_block])
+        else:
+            metrics = sample_metrics(config, gains_primary, gains_secondary, snr_linear)
+            for m, name in enumerate(metric_names):
+                block_sums[m, block - first_block] = metrics[name].sum(axis=0)
+            update_sketches(sketches, metrics, gains_primary, gains_secondary)
+        if config.store_gains:
+            state['gains_primary'][first:first + size] = gains_primary
+            state['gains_secondary'][first:first + size] = gains_secondary
+    return block_sums, sketches
+
+
+def thread_generator(seed, thread, threads):
+    """Returns the generator of the random values of a thread of a threaded simulation,
+    derived from the seed, the number of threads and the index of the thread.
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(threads, thread)))